@@ -1,17 +1,23 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from langchain.vectorstores import Chroma
 from langchain.chains import RetrievalQA
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.llms import HuggingFacePipeline
 from langchain.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-import torch
 import os
+import json
 import logging
 
+from src.components.rag_model import ModelConfig, RagModel, model_registry
+from src.components.context_packer import build_retriever
+from src.components.data_transformation import get_embedding_model
+from src.components.database import assign_chunk_ids, metadata_filter, upsert_documents
+from src.components.vector_backends import ChromaBackend
+from src.pipelines.prediction_pipeline import stream_retrieval_qa
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -29,25 +35,26 @@ if not os.path.exists(KEYS_FILE):
 def load_pipeline(pipeline_id: str) -> dict:
     """Load a specific pipeline by ID."""
     try:
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+        embeddings = embedding_model()
         vectorstore = Chroma(
             persist_directory=PERSIST_DIR + pipeline_id,
             embedding_function=embeddings
         )
 
+        llm = llm_model()
         chain = RetrievalQA.from_chain_type(
-            llm=llm_model(),
+            llm=llm,
             chain_type="stuff",
-            retriever=vectorstore.as_retriever(search_kwargs={"k": 2}),
+            retriever=build_retriever(vectorstore, llm, {"k": 2}),
             return_source_documents=True,
             verbose=True
         )
 
         pipeline_data = {
             "chain": chain,
-            "vectorstore": vectorstore
+            "vectorstore": vectorstore,
+            "llm": llm,
+            "sources": stored_sources(vectorstore)
         }
         pipelines[pipeline_id] = pipeline_data
         logger.info(f"Successfully loaded pipeline: {pipeline_id}")
@@ -58,33 +65,39 @@ def load_pipeline(pipeline_id: str) -> dict:
         raise
 
 
+def stored_sources(vectorstore) -> set:
+    """Sources of a store's chunks, read once when its pipeline is loaded."""
+    stored = vectorstore.get(include=["metadatas"])
+    return {metadata["source"] for metadata in stored["metadatas"] if metadata and metadata.get("source")}
+
+
 def pipeline_exists(pipeline_id: str) -> bool:
     """Check if a pipeline exists in the keys file."""
     with open(KEYS_FILE, 'r') as file:
         return any(line.strip() == pipeline_id for line in file)
 
 
-def llm_model():
-    """Initialize and return the LLM model."""
-    model_name = "meta-llama/Llama-3.2-1B-Instruct"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForCausalLM.from_pretrained(
-        model_name,
-        torch_dtype=torch.float16,
-        device_map='auto'
-    )
+rag_model = RagModel(ModelConfig(
+    model_name="meta-llama/Llama-3.2-1B-Instruct",
+    max_new_tokens=512,
+    do_sample=True,
+    temperature=0.7,
+    top_k=50,
+    enable_batching=True
+))
+
 
-    pipe = pipeline(
-        "text-generation",
-        model=model,
-        tokenizer=tokenizer,
-        max_new_tokens=512,
-        do_sample=True,
-        temperature=0.7,
-        top_k=50,
-        num_return_sequences=1
+def embedding_model():
+    """Return the shared embedding model, loaded once per process."""
+    return get_embedding_model(
+        model_name="sentence-transformers/all-MiniLM-L6-v2",
+        normalize=False
     )
-    return HuggingFacePipeline(pipeline=pipe)
+
+
+def llm_model():
+    """Return the shared LLM model from the process-wide registry."""
+    return rag_model.load_model()
 
 
 def process_pdf(file_path):
@@ -92,7 +105,7 @@ def process_pdf(file_path):
     try:
         loader = PyPDFLoader(file_path)
         docs = loader.load()
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
         return splitter.split_documents(docs)
     except Exception as e:
         logger.error(f"Error processing PDF: {str(e)}")
@@ -101,6 +114,36 @@ def process_pdf(file_path):
 
 class QueryRequest(BaseModel):
     question: str
+    sources: Optional[List[str]] = None  # Only search these uploaded files
+    page_from: Optional[int] = None  # 1-based, inclusive
+    page_to: Optional[int] = None
+
+
+def query_chain(pipeline_data: dict, query: QueryRequest) -> RetrievalQA:
+    """The pipeline's chain, or one whose retriever is restricted to the query's sources and pages."""
+    if not query.sources and query.page_from is None and query.page_to is None:
+        return pipeline_data["chain"]
+
+    vectorstore = pipeline_data["vectorstore"]
+    sources = query.sources
+    if sources:
+        # Uploads are stored under their temporary file name
+        known = sorted(pipeline_data["sources"])
+        sources = [
+            next((source for source in known if os.path.basename(source) in (name, f"temp_{name}")), name)
+            for name in sources
+        ]
+    search_filter = metadata_filter(sources, (query.page_from, query.page_to))
+
+    # The pipeline's own LLM, so per-query chains take no extra registry reference
+    llm = pipeline_data["llm"]
+    return RetrievalQA.from_chain_type(
+        llm=llm,
+        chain_type="stuff",
+        retriever=build_retriever(vectorstore, llm, {"k": 2, "filter": search_filter}),
+        return_source_documents=True,
+        verbose=True
+    )
 
 
 @app.post("/create_pipeline/{pipeline_id}")
@@ -122,22 +165,22 @@ async def create_pipeline(pipeline_id: str, file: UploadFile = File(...)):
             temp_file.write(content)
 
         docs = process_pdf(file_path)
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+        embeddings = embedding_model()
 
         # Create and persist the vectorstore
         vectorstore = Chroma.from_documents(
             documents=docs,
             embedding=embeddings,
+            ids=assign_chunk_ids(docs),
             persist_directory=PERSIST_DIR + pipeline_id
         )
 
         # Create the chain
+        llm = llm_model()
         chain = RetrievalQA.from_chain_type(
-            llm=llm_model(),
+            llm=llm,
             chain_type="stuff",
-            retriever=vectorstore.as_retriever(search_kwargs={"k": 2}),
+            retriever=build_retriever(vectorstore, llm, {"k": 2}),
             return_source_documents=True,
             verbose=True
         )
@@ -145,7 +188,9 @@ async def create_pipeline(pipeline_id: str, file: UploadFile = File(...)):
         # Save pipeline to memory and persist ID
         pipelines[pipeline_id] = {
             "chain": chain,
-            "vectorstore": vectorstore
+            "vectorstore": vectorstore,
+            "llm": llm,
+            "sources": {doc.metadata["source"] for doc in docs if doc.metadata.get("source")}
         }
         with open(KEYS_FILE, "a") as file_key:
             file_key.write(f"{pipeline_id}\n")
@@ -160,6 +205,37 @@ async def create_pipeline(pipeline_id: str, file: UploadFile = File(...)):
             os.remove(file_path)
 
 
+@app.post("/clone_pipeline/{source_id}/{pipeline_id}")
+async def clone_pipeline(source_id: str, pipeline_id: str):
+    """Create a pipeline from an existing one's store, without re-embedding."""
+    if not pipeline_id.strip():
+        raise HTTPException(status_code=400, detail="Pipeline ID cannot be empty")
+
+    if pipeline_exists(pipeline_id):
+        raise HTTPException(
+            status_code=400,
+            detail="Pipeline ID already exists. Please select another ID."
+        )
+
+    if not pipeline_exists(source_id):
+        raise HTTPException(
+            status_code=404,
+            detail="Source pipeline not found"
+        )
+
+    try:
+        stats = await run_in_threadpool(ChromaBackend().clone, PERSIST_DIR + source_id, PERSIST_DIR + pipeline_id)
+        await run_in_threadpool(load_pipeline, pipeline_id)
+        with open(KEYS_FILE, "a") as file_key:
+            file_key.write(f"{pipeline_id}\n")
+
+        return {"message": "Pipeline cloned successfully", "stats": stats}
+
+    except Exception as e:
+        logger.error(f"Pipeline clone error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/append_data/{pipeline_id}")
 async def append_data(pipeline_id: str, file: UploadFile = File(...)):
     """Add more data to an existing pipeline."""
@@ -184,26 +260,14 @@ async def append_data(pipeline_id: str, file: UploadFile = File(...)):
 
             new_docs = process_pdf(file_path)
 
-            # Add new documents to existing vectorstore
+            # Upsert into the existing vectorstore, embedding only new or
+            # changed chunks; the chain's retriever reads from the same
+            # store so it needs no rebuild
             vectorstore = pipeline_data["vectorstore"]
-            vectorstore.add_documents(new_docs)
-
-            # Update the chain with new retriever
-            chain = RetrievalQA.from_chain_type(
-                llm=llm_model(),
-                chain_type="stuff",
-                retriever=vectorstore.as_retriever(search_kwargs={"k": 2}),
-                return_source_documents=True,
-                verbose=True
-            )
-
-            # Update pipeline in memory
-            pipelines[pipeline_id] = {
-                "chain": chain,
-                "vectorstore": vectorstore
-            }
+            counts = upsert_documents(vectorstore, new_docs)
+            pipeline_data["sources"].update(doc.metadata["source"] for doc in new_docs if doc.metadata.get("source"))
 
-            return {"message": "Data appended successfully"}
+            return {"message": "Data appended successfully", "counts": counts}
 
         finally:
             if os.path.exists(file_path):
@@ -228,7 +292,9 @@ async def query_pipeline(pipeline_id: str, query: QueryRequest):
         if not pipeline_data:
             pipeline_data = load_pipeline(pipeline_id)
 
-        result = pipeline_data["chain"]({"query": query.question})
+        # Run off the event loop so concurrent queries can share a batch
+        chain = await run_in_threadpool(query_chain, pipeline_data, query)
+        result = await run_in_threadpool(chain, {"query": query.question})
         return {
             "answer": result["result"],
             "sources": [doc.page_content for doc in result.get("source_documents", [])]
@@ -239,12 +305,55 @@ async def query_pipeline(pipeline_id: str, query: QueryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/query_stream/{pipeline_id}")
+async def query_pipeline_stream(pipeline_id: str, query: QueryRequest):
+    """Stream sources, then answer tokens, as server-sent events."""
+    if not pipeline_exists(pipeline_id):
+        raise HTTPException(
+            status_code=404,
+            detail="Pipeline not found"
+        )
+
+    try:
+        pipeline_data = pipelines.get(pipeline_id)
+        if not pipeline_data:
+            pipeline_data = load_pipeline(pipeline_id)
+    except Exception as e:
+        logger.error(f"Query error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    def event_stream():
+        try:
+            for item in stream_retrieval_qa(query_chain(pipeline_data, query), query.question):
+                yield f"event: {item['event']}\ndata: {json.dumps(item['data'])}\n\n"
+        except Exception as e:
+            logger.error(f"Streaming query error: {str(e)}")
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.get("/metrics/generation")
+async def generation_metrics():
+    """Report model registry and batching scheduler metrics."""
+    return {
+        "registry": model_registry.stats(),
+        "schedulers": {
+            str(key): stats for key, stats in model_registry.scheduler_stats().items()
+        },
+        "assisted": {
+            str(key): stats for key, stats in model_registry.assisted_stats().items()
+        }
+    }
+
+
 @app.delete("/pipeline/{pipeline_id}")
 async def delete_pipeline(pipeline_id: str):
     try:
-        # Remove from memory
+        # Remove from memory and release its model reference
         if pipeline_id in pipelines:
             del pipelines[pipeline_id]
+            rag_model.release_model()
 
         # Remove from keys file
         with open(KEYS_FILE, 'r') as file:
@@ -5,8 +5,10 @@ from src.components.data_transformation import DataTransformation
 from src.components.database import DataBase
 from src.pipelines.training_pipeline import Pipeline
 from src.pipelines.prediction_pipeline import PredictPipeline
+from src.components.rag_model import ModelConfig
 from src.exception import CustomException
 from src.logger import logging
+import itertools
 import sys
 import time
 import traceback
@@ -138,7 +140,8 @@ if 'debug_mode' not in st.session_state:
 try:
     # Initialize pipelines with error handling
     pipeline = Pipeline()
-    predict_pipeline = PredictPipeline()
+    # Concurrent chat sessions share batched generation on one model
+    predict_pipeline = PredictPipeline(ModelConfig(enable_batching=True))
     initialization_success = True
 except Exception as e:
     initialization_success = False
@@ -160,7 +163,7 @@ def process_document(uploaded_file, pipeline_id, action):
         logging.error(f"Error in process_document: {str(e)}")
         raise CustomException(e, sys)
 
-def handle_chat(prompt):
+def handle_chat(prompt, container):
     """Handle chat message processing with enhanced error handling and debug info."""
     try:
         logging.info(f"Processing chat prompt: {prompt}")
@@ -173,25 +176,51 @@ def handle_chat(prompt):
             })
             return
 
-        with st.spinner("💭 Thinking..."):
-            if st.session_state.debug_mode:
-                st.info(f"Querying pipeline {st.session_state.current_pipeline_id}")
-            
-            response = predict_pipeline.query_pipeline(int(st.session_state.current_pipeline_id), prompt)
-            
-            if response == -1:
+        if st.session_state.debug_mode:
+            st.info(f"Querying pipeline {st.session_state.current_pipeline_id}")
+
+        with container:
+            with st.spinner("🔍 Searching documents..."):
+                events = predict_pipeline.stream_query(int(st.session_state.current_pipeline_id), prompt)
+                # Retrieval only runs once the first (sources) event is pulled
+                first_events = [] if events == -1 else list(itertools.islice(events, 1))
+
+            if events == -1:
                 st.session_state.messages.append({
                     "role": "assistant",
                     "content": "Pipeline not found. Please check the pipeline ID."
                 })
-            else:
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response["answer"],
-                    "sources": response.get("sources", [])
-                })
-            
-            logging.info("Chat response processed successfully")
+                return
+
+            # Render the answer incrementally as tokens arrive, next to the chat history
+            answer = ""
+            sources = []
+            with st.chat_message("user"):
+                st.write(prompt)
+            with st.chat_message("assistant"):
+                answer_placeholder = st.empty()
+                answer_placeholder.markdown("💭 Thinking...")
+                for event in itertools.chain(first_events, events):
+                    if event["event"] == "sources":
+                        sources = event["data"]
+                    elif event["event"] == "token":
+                        answer += event["data"]
+                        answer_placeholder.markdown(answer + "▌")
+                    elif event["event"] == "done":
+                        answer = event["data"]
+                answer_placeholder.markdown(answer)
+                if sources:
+                    with st.expander("📚 Sources", expanded=False):
+                        for idx, source in enumerate(sources, 1):
+                            st.markdown(f"**Source {idx}:**\n{source}")
+
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": answer,
+            "sources": sources
+        })
+
+        logging.info("Chat response processed successfully")
             
     except Exception as e:
         error_msg = f"Error processing chat: {str(e)}\n{traceback.format_exc()}"
@@ -306,16 +335,20 @@ def main():
         
         if st.session_state.debug_mode:
             st.markdown("🔍 **Debug Information**")
+            query_cache = predict_pipeline.data_base.query_cache_stats()
+            store_pool = predict_pipeline.data_base.store_pool_stats()
             st.code(f"""
 Pipeline ID: {st.session_state.current_pipeline_id}
 Messages: {len(st.session_state.messages)}
+Query cache: {query_cache['size']} entries, {query_cache['hit_rate']:.0%} hit rate, {query_cache['evictions']} evictions
+Store pool: {store_pool['open']} open, {store_pool['hit_rate']:.0%} hit rate, {store_pool['evictions']} evictions
 Status: Active
             """)
         st.markdown('</div>', unsafe_allow_html=True)
 
     # Chat input
     if prompt := st.chat_input("💭 Ask your question..."):
-        handle_chat(prompt)
+        handle_chat(prompt, col1)
 
 if __name__ == "__main__":
     try:
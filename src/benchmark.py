@@ -0,0 +1,735 @@
+import gc
+import json
+import sys
+import time
+from difflib import SequenceMatcher
+from typing import Dict, List, Sequence
+
+from src.logger import logging
+from src.exception import CustomException
+
+DEFAULT_PROMPTS = [
+    "Explain what the attention mechanism in a transformer does.",
+    "Summarize the main contribution of the paper 'Attention Is All You Need'.",
+    "What is the difference between encoder and decoder layers?",
+]
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is a peak value in KiB on Linux, good enough as a fallback
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _generate_timed(llm, prompts: Sequence[str]) -> Dict:
+    tokenizer = llm.pipeline.tokenizer
+    answers = []
+    new_tokens = 0
+    start = time.perf_counter()
+    for prompt in prompts:
+        output = llm.pipeline(prompt, return_full_text=False, do_sample=False)[0]["generated_text"]
+        answers.append(output)
+        new_tokens += len(tokenizer(output, add_special_tokens=False)["input_ids"])
+    elapsed = time.perf_counter() - start
+    return {
+        "answers": answers,
+        "new_tokens": new_tokens,
+        "seconds": elapsed,
+        "tokens_per_sec": new_tokens / elapsed if elapsed else 0.0,
+    }
+
+
+def benchmark_quantization(
+    prompts: Sequence[str] = DEFAULT_PROMPTS,
+    modes: Sequence[str] = ("fp32", "int8", "bf16"),
+    model_name: str = None,
+    max_new_tokens: int = 64,
+) -> Dict[str, Dict]:
+    """
+    Compare CPU inference precisions against the fp32 baseline.
+
+    Each mode is loaded fresh (outside the model registry) and decodes the
+    prompts greedily, so answer drift reflects precision only.
+
+    Args:
+        prompts: Prompts to generate for
+        modes: Any of "fp32", "int8" and "bf16"; fp32 is always run first
+        model_name: Model to benchmark, defaults to ModelConfig.model_name
+        max_new_tokens: Tokens generated per prompt
+
+    Returns:
+        Dict mapping mode to tokens/sec, resident memory delta and drift
+    """
+    from src.components.rag_model import ModelConfig, RagModel
+
+    try:
+        modes = ["fp32"] + [mode for mode in modes if mode != "fp32"]
+        results = {}
+        baseline_answers: List[str] = []
+
+        for mode in modes:
+            config = ModelConfig(
+                max_new_tokens=max_new_tokens,
+                quantization=None if mode == "fp32" else mode
+            )
+            rag_model = RagModel(config)
+            gc.collect()
+            rss_before = current_rss_bytes()
+            llm = rag_model._build_model(model_name or config.model_name)
+            rss_loaded = current_rss_bytes()
+
+            run = _generate_timed(llm, prompts)
+            if mode == "fp32":
+                baseline_answers = run["answers"]
+            drift = [
+                1.0 - SequenceMatcher(None, base, answer).ratio()
+                for base, answer in zip(baseline_answers, run["answers"])
+            ]
+
+            results[mode] = {
+                "precision": rag_model.precision(),
+                "tokens_per_sec": run["tokens_per_sec"],
+                "new_tokens": run["new_tokens"],
+                "resident_bytes": rss_loaded - rss_before,
+                "answer_drift": sum(drift) / len(drift) if drift else 0.0,
+            }
+            logging.info(f"Quantization benchmark {mode}: {results[mode]}")
+
+            del llm
+            gc.collect()
+
+        baseline = results["fp32"]
+        for mode, result in results.items():
+            result["speedup"] = (
+                result["tokens_per_sec"] / baseline["tokens_per_sec"] if baseline["tokens_per_sec"] else 0.0
+            )
+            result["memory_ratio"] = (
+                baseline["resident_bytes"] / result["resident_bytes"] if result["resident_bytes"] else 0.0
+            )
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def benchmark_prefix_cache(
+    questions: Sequence[str] = DEFAULT_PROMPTS,
+    context: str = None,
+    model_name: str = None,
+    max_new_tokens: int = 1,
+    repeats: int = 3,
+) -> Dict[str, float]:
+    """
+    Compare query latency with and without the prompt prefix KV-cache.
+
+    With max_new_tokens=1 the measurement is dominated by prefill, which is
+    the part the prefix cache removes; raise it to see end-to-end latency.
+
+    Args:
+        questions: Questions formatted into the RetrievalQA "stuff" prompt
+        context: Retrieved context to use, defaults to a short placeholder
+        model_name: Model to benchmark, defaults to ModelConfig.model_name
+        max_new_tokens: Tokens generated per query
+        repeats: Passes over the questions per variant
+
+    Returns:
+        Dict with mean baseline and cached latency in ms and the speedup
+    """
+    from src.components.rag_model import (
+        ModelConfig, RagModel, PrefixCache, STUFF_QA_PROMPT, prompt_prefix
+    )
+
+    try:
+        config = ModelConfig(max_new_tokens=max_new_tokens)
+        llm = RagModel(config)._build_model(model_name or config.model_name)
+        context = context or "The Transformer relies entirely on attention, dispensing with recurrence."
+        prompts = [STUFF_QA_PROMPT.format(context=context, question=question) for question in questions]
+
+        prefix_cache = PrefixCache(llm)
+        prefix_cache.register(prompt_prefix(STUFF_QA_PROMPT.template))
+        generation_kwargs = {"max_new_tokens": max_new_tokens, "do_sample": False}
+
+        # Warm up both paths once so lazy initialisation is not timed
+        llm.pipeline(prompts[0], return_full_text=False, **generation_kwargs)
+        prefix_cache.generate(prompts[0], **generation_kwargs)
+
+        timings = {"baseline": [], "cached": []}
+        for _ in range(repeats):
+            for prompt in prompts:
+                start = time.perf_counter()
+                llm.pipeline(prompt, return_full_text=False, **generation_kwargs)
+                timings["baseline"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                prefix_cache.generate(prompt, **generation_kwargs)
+                timings["cached"].append(time.perf_counter() - start)
+
+        baseline_ms = 1000 * sum(timings["baseline"]) / len(timings["baseline"])
+        cached_ms = 1000 * sum(timings["cached"]) / len(timings["cached"])
+        results = {
+            "baseline_ms": baseline_ms,
+            "cached_ms": cached_ms,
+            "speedup": baseline_ms / cached_ms if cached_ms else 0.0,
+            **prefix_cache.stats(),
+        }
+        logging.info(f"Prefix cache benchmark: {results}")
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def benchmark_assisted_generation(
+    model_name: str,
+    draft_model_name: str,
+    prompts: Sequence[str] = DEFAULT_PROMPTS,
+    max_new_tokens: int = 64,
+) -> Dict[str, Dict]:
+    """
+    Compare plain and assisted (draft model) decoding speed on this machine.
+
+    Both model names may be local checkpoint directories, so tiny compatible
+    models can be used to exercise the code path on CPU.
+
+    Args:
+        model_name: Main (verifying) model
+        draft_model_name: Small draft model sharing the main model's tokenizer
+        prompts: Prompts to generate for
+        max_new_tokens: Tokens generated per prompt
+
+    Returns:
+        Dict with tokens/sec for both variants, speedup and acceptance metrics
+    """
+    from src.components.rag_model import ModelConfig, RagModel
+
+    try:
+        baseline_llm = RagModel(ModelConfig(max_new_tokens=max_new_tokens))._build_model(model_name)
+        baseline = _generate_timed(baseline_llm, prompts)
+        del baseline_llm
+        gc.collect()
+
+        assisted_llm = RagModel(ModelConfig(
+            max_new_tokens=max_new_tokens,
+            draft_model_name=draft_model_name,
+            enable_assisted_generation=True
+        ))._build_model(model_name)
+        assisted = _generate_timed(assisted_llm, prompts)
+        assisted_stats = assisted_llm.pipeline.assisted_generation_stats
+        assisted_stats.record(assisted["new_tokens"], assisted["seconds"])
+
+        results = {
+            "baseline_tokens_per_sec": baseline["tokens_per_sec"],
+            "assisted_tokens_per_sec": assisted["tokens_per_sec"],
+            "speedup": (
+                assisted["tokens_per_sec"] / baseline["tokens_per_sec"] if baseline["tokens_per_sec"] else 0.0
+            ),
+            "assisted": assisted_stats.stats(),
+        }
+        logging.info(f"Assisted generation benchmark: {results}")
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def _artifact_chunks(ingestion_dir: str = None) -> List:
+    """Split every PDF under the ingestion artifacts into chunks."""
+    import glob
+    import os
+    from src.components.data_transformation import DataTransformation
+
+    ingestion_dir = ingestion_dir or os.path.join("artifacts", "ingestion")
+    data_transform = DataTransformation()
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(ingestion_dir, "**", "*.pdf"), recursive=True)):
+        chunks.extend(data_transform.load_data(path))
+    return chunks
+
+
+def benchmark_embedding_workers(
+    worker_counts: Sequence[int] = (1, 2, 4, 8),
+    texts: Sequence[str] = None,
+    batch_size: int = 32,
+) -> Dict[int, Dict[str, float]]:
+    """
+    Measure embedding throughput (chunks/sec) against worker process count.
+
+    Defaults to the chunks of every PDF in artifacts/ingestion. Each worker
+    count gets a fresh model outside the shared registry, and its vectors are
+    compared with the single-process ones to confirm order is preserved.
+
+    Args:
+        worker_counts: Worker counts to try; 1 means in-process
+        texts: Texts to embed, defaults to the artifact PDF chunks
+        batch_size: Encode batch size
+
+    Returns:
+        Dict mapping worker count to chunks/sec, speedup and max deviation
+    """
+    import numpy as np
+    from src.components.data_transformation import DataTransformationConfig, SharedEmbeddings
+
+    try:
+        texts = list(texts or [chunk.page_content for chunk in _artifact_chunks()])
+        model_name = DataTransformationConfig().model_name
+        results = {}
+        reference = None
+
+        for workers in sorted(set(worker_counts)):
+            embeddings = SharedEmbeddings(
+                model_name, "cpu", batch_size, normalize=True,
+                num_workers=workers, parallel_min_texts=1
+            )
+            embeddings.embed_documents(texts[:batch_size])  # warm up model and pool
+            start = time.perf_counter()
+            vectors = np.asarray(embeddings.embed_documents(texts))
+            elapsed = time.perf_counter() - start
+            embeddings.close()
+
+            if reference is None:
+                reference = vectors
+            results[workers] = {
+                "chunks": len(texts),
+                "seconds": elapsed,
+                "chunks_per_sec": len(texts) / elapsed if elapsed else 0.0,
+                "max_abs_deviation": float(np.abs(vectors - reference).max()),
+            }
+            logging.info(f"Embedding benchmark with {workers} workers: {results[workers]}")
+
+        base = results[min(results)]["chunks_per_sec"]
+        for result in results.values():
+            result["speedup"] = result["chunks_per_sec"] / base if base else 0.0
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def benchmark_embedding_backends(
+    texts: Sequence[str] = None,
+    queries: Sequence[str] = DEFAULT_PROMPTS,
+    repeats: int = 20,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare the PyTorch and ONNX Runtime (fp32 and int8) embedding backends.
+
+    Reports per-query embedding latency, ingestion throughput on the
+    artifact PDF chunks and the minimum cosine similarity to PyTorch.
+
+    Args:
+        texts: Documents to embed, defaults to the artifact PDF chunks
+        queries: Queries for the latency measurement
+        repeats: Passes over the queries
+
+    Returns:
+        Dict mapping backend to query latency, chunks/sec and min cosine
+    """
+    import numpy as np
+    from src.components.data_transformation import DataTransformationConfig, SharedEmbeddings
+    from src.components.onnx_embeddings import OnnxEmbeddings
+
+    try:
+        config = DataTransformationConfig()
+        texts = list(texts or [chunk.page_content for chunk in _artifact_chunks()])
+        backends = {
+            "torch": lambda: SharedEmbeddings(config.model_name, "cpu", config.embed_batch_size, normalize=True),
+            "onnx-fp32": lambda: OnnxEmbeddings(config.model_name, config.onnx_cache_dir, quantize=False),
+            "onnx-int8": lambda: OnnxEmbeddings(config.model_name, config.onnx_cache_dir, quantize=True),
+        }
+        results = {}
+        reference = None
+
+        for name, build in backends.items():
+            embeddings = build()
+            embeddings.embed_query(queries[0])  # warm up
+
+            start = time.perf_counter()
+            for _ in range(repeats):
+                for query in queries:
+                    embeddings.embed_query(query)
+            query_ms = 1000 * (time.perf_counter() - start) / (repeats * len(queries))
+
+            start = time.perf_counter()
+            vectors = np.asarray(embeddings.embed_documents(texts))
+            elapsed = time.perf_counter() - start
+
+            if reference is None:
+                reference = vectors
+            results[name] = {
+                "query_ms": query_ms,
+                "chunks_per_sec": len(texts) / elapsed if elapsed else 0.0,
+                "min_cosine_to_torch": float(np.min(np.sum(reference * vectors, axis=1))),
+            }
+            logging.info(f"Embedding backend benchmark {name}: {results[name]}")
+
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def benchmark_splitters(ingestion_dir: str = None) -> Dict[str, Dict[str, float]]:
+    """
+    Compare the recursive character splitter with the token splitter.
+
+    Pages of every PDF under artifacts/ingestion are loaded once, then split
+    by both splitters. Chunk token counts are measured with the embedding
+    model's tokenizer to show how much of MiniLM's 256-token window each uses.
+
+    Args:
+        ingestion_dir: Directory searched for PDFs, defaults to artifacts/ingestion
+
+    Returns:
+        Dict mapping splitter to time, chunk count and token count statistics
+    """
+    import glob
+    import os
+    import numpy as np
+    from langchain.document_loaders import PyPDFLoader
+    from src.components.data_transformation import (
+        DataTransformation, DataTransformationConfig, get_tokenizer
+    )
+
+    try:
+        ingestion_dir = ingestion_dir or os.path.join("artifacts", "ingestion")
+        pages = []
+        for path in sorted(glob.glob(os.path.join(ingestion_dir, "**", "*.pdf"), recursive=True)):
+            pages.extend(PyPDFLoader(path).load())
+
+        tokenizer = get_tokenizer(DataTransformationConfig().model_name)
+        window = 256 - 2  # [CLS] and [SEP]
+        results = {}
+        for splitter_name in ("recursive", "token"):
+            splitter = DataTransformation(DataTransformationConfig(splitter=splitter_name)).get_splitter()
+            start = time.perf_counter()
+            chunks = splitter.split_documents(pages)
+            elapsed = time.perf_counter() - start
+
+            token_counts = np.array([
+                len(ids) for ids in tokenizer([chunk.page_content for chunk in chunks], add_special_tokens=False)["input_ids"]
+            ])
+            results[splitter_name] = {
+                "pages": len(pages),
+                "chunks": len(chunks),
+                "seconds": elapsed,
+                "pages_per_sec": len(pages) / elapsed if elapsed else 0.0,
+                "mean_tokens": float(token_counts.mean()) if len(token_counts) else 0.0,
+                "std_tokens": float(token_counts.std()) if len(token_counts) else 0.0,
+                "max_tokens": int(token_counts.max()) if len(token_counts) else 0,
+                "truncated_fraction": float((token_counts > window).mean()) if len(token_counts) else 0.0,
+            }
+            logging.info(f"Splitter benchmark {splitter_name}: {results[splitter_name]}")
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def _dir_bytes(path: str) -> int:
+    import os
+
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def benchmark_compact_storage(
+    pipeline_id: int = 0,
+    k: int = 4,
+    queries: Sequence[str] = None,
+    rescore_factor: int = 4,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Measure recall@k and disk size of compact stores against a pipeline's Chroma store.
+
+    The pipeline's float32 vectors are read back from Chroma and copied into
+    float16 and int8 compact stores without re-embedding, with each side
+    file dtype used for rescoring (or none). Ground truth is an
+    exact cosine scan of the float32 vectors; Chroma itself is measured too,
+    since its HNSW index is approximate. Queries default to the leading text
+    of a sample of the stored chunks.
+
+    Args:
+        pipeline_id: Pipeline whose store is measured
+        k: Results per query
+        queries: Query texts
+        rescore_factor: Candidates rescored per result in the compact stores
+
+    Returns:
+        Dict mapping store variant to recall@k, query latency and size
+    """
+    import tempfile
+    import numpy as np
+    from src.components.data_transformation import DataTransformationConfig, get_embedding_model
+    from src.components.database import DataBase
+    from src.components.vector_store import CompactVectorStore
+
+    try:
+        k, rescore_factor = int(k), int(rescore_factor)
+        database = DataBase()
+        persist_path = database.get_persist_dir(pipeline_id)
+        embeddings = get_embedding_model(DataTransformationConfig().model_name, normalize=True)
+        chroma = database.load_database(pipeline_id, embeddings)
+        stored = chroma.get(include=["embeddings", "documents", "metadatas"])
+        ids, texts = stored["ids"], stored["documents"]
+        vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+        if not queries:
+            sample = np.random.RandomState(0).permutation(len(texts))[:64]
+            queries = [texts[i][:200] for i in sample]
+        query_vectors = np.asarray([embeddings.embed_query(query) for query in queries], dtype=np.float32)
+        truth = [set(np.argsort(-(vectors @ query))[:k]) for query in query_vectors]
+        text_rows = {text: row for row, text in enumerate(texts)}
+
+        def measure(search) -> Dict[str, float]:
+            hits = 0
+            start = time.perf_counter()
+            for query, expected in zip(query_vectors, truth):
+                found = {text_rows.get(doc.page_content) for doc in search(query.tolist())}
+                hits += len(found & expected)
+            elapsed = time.perf_counter() - start
+            return {
+                f"recall@{k}": hits / (k * len(truth)) if truth else 0.0,
+                "query_ms": 1000 * elapsed / len(truth) if truth else 0.0,
+            }
+
+        chroma_bytes = _dir_bytes(persist_path)
+        results = {"chroma": {**measure(lambda q: chroma.similarity_search_by_vector(q, k=k)), "bytes": chroma_bytes}}
+
+        variants = [("float16", None), ("float16", "float32"), ("int8", None), ("int8", "float16"), ("int8", "float32")]
+        for dtype, rescore_dtype in variants:
+            variant = f"{dtype}_rescore_{rescore_dtype or 'none'}"
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                store = CompactVectorStore(tmp_dir, embeddings, dtype, rescore_factor, rescore_dtype)
+                store.add_embeddings(texts, vectors, stored["metadatas"], ids)
+                store.persist()
+
+                result = measure(lambda q: store.similarity_search_by_vector(q, k=k))
+                store.rescore_factor = 1
+                result[f"recall@{k}_without_rescoring"] = measure(
+                    lambda q: store.similarity_search_by_vector(q, k=k)
+                )[f"recall@{k}"]
+                # Bytes of the configuration as written, side file included
+                result["bytes"] = store.disk_bytes()
+                result["size_reduction"] = 1 - result["bytes"] / chroma_bytes
+                results[variant] = result
+            logging.info(f"Compact storage benchmark {variant}: {results[variant]}")
+
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def benchmark_store_layouts(
+    pipeline_counts: Sequence[int] = (1000, 10000),
+    chunks_per_pipeline: int = 16,
+    dim: int = 384,
+    sample: int = 100,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare the per-pipeline and shared storage layouts at many pipelines.
+
+    Each layout is filled with random unit vectors for every pipeline, then
+    measured for build time, disk usage and file count. Load time is the
+    cold open of `sample` random pipelines followed by one search each,
+    which forces the pipeline's index to be read.
+
+    Args:
+        pipeline_counts: Numbers of pipelines to build, e.g. "1000,10000" on the command line
+        chunks_per_pipeline: Chunks stored per pipeline
+        dim: Vector dimension
+        sample: Pipelines opened for the load time measurement
+
+    Returns:
+        Dict mapping "<layout>@<count>" to build seconds, bytes, files and load ms
+    """
+    import os
+    import shutil
+    import tempfile
+    import numpy as np
+    from langchain.vectorstores import Chroma
+    from src.components.database import collection_name, drop_shared_client, get_shared_client
+
+    def clear_client_cache(root: str) -> None:
+        drop_shared_client(root)
+        try:
+            from chromadb.api.client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+        except ImportError:
+            pass
+
+    def open_store(root: str, layout: str, pipeline: int):
+        if layout == "shared":
+            return Chroma(
+                collection_name=collection_name(pipeline), client=get_shared_client(root), persist_directory=root
+            )
+        return Chroma(persist_directory=os.path.join(root, str(pipeline)))
+
+    try:
+        if isinstance(pipeline_counts, str):
+            pipeline_counts = [int(count) for count in pipeline_counts.split(",")]
+        chunks_per_pipeline, dim, sample = int(chunks_per_pipeline), int(dim), int(sample)
+        rng = np.random.RandomState(0)
+        results = {}
+
+        for count in pipeline_counts:
+            for layout in ("per_pipeline", "shared"):
+                root = tempfile.mkdtemp(prefix=f"layout-{layout}-")
+                try:
+                    start = time.perf_counter()
+                    for pipeline in range(count):
+                        vectors = rng.randn(chunks_per_pipeline, dim).astype(np.float32)
+                        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                        open_store(root, layout, pipeline)._collection.add(
+                            ids=[f"{pipeline}-{i}" for i in range(chunks_per_pipeline)],
+                            embeddings=vectors.tolist(),
+                            documents=[f"chunk {i} of pipeline {pipeline}" for i in range(chunks_per_pipeline)]
+                        )
+                    build_seconds = time.perf_counter() - start
+
+                    size, files = _dir_bytes(root), sum(len(names) for _, _, names in os.walk(root))
+                    clear_client_cache(root)
+                    load_ms = []
+                    query = rng.randn(dim).astype(np.float32).tolist()
+                    for pipeline in rng.choice(count, size=min(sample, count), replace=False):
+                        start = time.perf_counter()
+                        open_store(root, layout, int(pipeline)).similarity_search_by_vector(query, k=4)
+                        load_ms.append(1000 * (time.perf_counter() - start))
+
+                    key = f"{layout}@{count}"
+                    results[key] = {
+                        "build_seconds": build_seconds,
+                        "bytes": size,
+                        "files": files,
+                        "load_ms_mean": float(np.mean(load_ms)),
+                        "load_ms_p95": float(np.percentile(load_ms, 95)),
+                    }
+                    logging.info(f"Store layout benchmark {key}: {results[key]}")
+                finally:
+                    clear_client_cache(root)
+                    shutil.rmtree(root, ignore_errors=True)
+
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def benchmark_vector_backends(
+    pipeline_id: int = 0,
+    k: int = 4,
+    repeats: int = 20,
+    queries: Sequence[str] = None,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare open time, query latency and recall of the vector store backends.
+
+    The pipeline's stored vectors are copied into a NumPy store (exact scan)
+    and a NumPy store with an IVF index forced on, without re-embedding.
+    Open time is measured on a fresh client or map each time; recall@k is
+    against the exact scan. Queries default to the leading text of a sample
+    of the stored chunks.
+
+    Args:
+        pipeline_id: Pipeline whose store is measured
+        k: Results per query
+        repeats: Opens timed per backend
+        queries: Query texts
+
+    Returns:
+        Dict mapping backend to open ms, query ms and recall@k
+    """
+    import os
+    import tempfile
+    import numpy as np
+    from src.components.data_transformation import DataTransformationConfig, get_embedding_model
+    from src.components.database import DataBase
+    from src.components.numpy_vector_store import NumpyVectorStore
+    from src.components.vector_backends import detect_backend
+
+    try:
+        k, repeats = int(k), int(repeats)
+        database = DataBase()
+        persist_path = database.get_persist_dir(pipeline_id)
+        embeddings = get_embedding_model(DataTransformationConfig().model_name, normalize=True)
+        source_backend = detect_backend(persist_path, database.backends)
+        stored = source_backend.open(persist_path, None).get(include=["embeddings", "documents", "metadatas"])
+        texts = stored["documents"]
+
+        if not queries:
+            sample = np.random.RandomState(0).permutation(len(texts))[:64]
+            queries = [texts[i][:200] for i in sample]
+        query_vectors = [embeddings.embed_query(query) for query in queries]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            exact_path, ivf_path = os.path.join(tmp_dir, "exact"), os.path.join(tmp_dir, "ivf")
+            for path, ivf_min_vectors in ((exact_path, len(texts) + 1), (ivf_path, 0)):
+                store = NumpyVectorStore(path, None, ivf_min_vectors=ivf_min_vectors)
+                store.add_embeddings(texts, np.asarray(stored["embeddings"]), stored["metadatas"], stored["ids"])
+                store.persist()
+
+            variants = {
+                source_backend.name: lambda: source_backend.open(persist_path, None),
+                "numpy": lambda: NumpyVectorStore(exact_path, None, ivf_min_vectors=len(texts) + 1),
+                "numpy-ivf": lambda: NumpyVectorStore(ivf_path, None, ivf_min_vectors=0),
+            }
+            exact = [
+                {doc.page_content for doc in variants["numpy"]().similarity_search_by_vector(vector, k=k)}
+                for vector in query_vectors
+            ]
+
+            results = {}
+            for name, open_store in variants.items():
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    store = open_store()
+                open_ms = 1000 * (time.perf_counter() - start) / repeats
+
+                hits = 0
+                start = time.perf_counter()
+                for vector, expected in zip(query_vectors, exact):
+                    found = {doc.page_content for doc in store.similarity_search_by_vector(vector, k=k)}
+                    hits += len(found & expected)
+                query_ms = 1000 * (time.perf_counter() - start) / len(query_vectors)
+
+                results[name] = {
+                    "open_ms": open_ms,
+                    "query_ms": query_ms,
+                    f"recall@{k}": hits / (k * len(exact)) if exact else 0.0,
+                }
+                logging.info(f"Vector backend benchmark {name}: {results[name]}")
+
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+BENCHMARKS = {
+    "quantization": benchmark_quantization,
+    "prefix_cache": benchmark_prefix_cache,
+    "assisted_generation": benchmark_assisted_generation,
+    "embedding_workers": benchmark_embedding_workers,
+    "embedding_backends": benchmark_embedding_backends,
+    "splitters": benchmark_splitters,
+    "compact_storage": benchmark_compact_storage,
+    "store_layouts": benchmark_store_layouts,
+    "vector_backends": benchmark_vector_backends,
+}
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "quantization"
+    print(json.dumps(BENCHMARKS[name](*sys.argv[2:]), indent=2, default=str))
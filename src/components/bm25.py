@@ -0,0 +1,226 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from src.components.embedding_cache import text_hash
+from src.components.numpy_vector_store import where_to_sql
+from src.logger import logging
+from src.exception import CustomException
+
+# Words, plus codes such as "PV-17", "E-4012" or "v2.1.3" kept whole
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+
+@dataclass
+class BM25Config:
+    enabled: bool = True
+    k1: float = 1.5
+    b: float = 0.75
+    index_file: str = "bm25.sqlite"  # Kept in the pipeline's persist directory
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens for the keyword index.
+
+    A compound code is indexed whole and as its parts, so "PV-17" matches
+    both a query for "PV-17" and one for "PV 17".
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = re.split(r"[-_./]", token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def chunk_key(doc: Document) -> str:
+    """Id of a chunk in the keyword index: its chunk_id, else a hash of its text."""
+    return doc.metadata.get("chunk_id") or text_hash(doc.page_content)
+
+
+class BM25Index:
+    """
+    Persistent BM25 inverted index of one pipeline's chunks.
+
+    Postings and chunk texts live in a SQLite file next to the vector store
+    and are updated incrementally as chunks are added or removed. A search
+    reads only the postings of the query terms. Source and page are kept as
+    indexed columns, so a metadata filter restricts postings in SQL.
+    """
+
+    def __init__(self, persist_path: str, config: BM25Config = None):
+        self.config = config or BM25Config()
+        self.index_path = os.path.join(persist_path, self.config.index_file)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, length INTEGER NOT NULL, "
+            "text TEXT NOT NULL, metadata TEXT NOT NULL, source TEXT, page INTEGER)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "source" not in columns:
+            # Indexes written before metadata filtering: backfill the columns from the stored metadata
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN source TEXT")
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN page INTEGER")
+            self._conn.execute(
+                "UPDATE chunks SET source = json_extract(metadata, '$.source'), page = json_extract(metadata, '$.page')"
+            )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_source_page ON chunks (source, page)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (term, id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_id ON postings (id)")
+
+    @staticmethod
+    def exists(persist_path: str, config: BM25Config = None) -> bool:
+        return os.path.exists(os.path.join(persist_path, (config or BM25Config()).index_file))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add(self, docs: Iterable[Document]) -> int:
+        """Index chunks; chunks already indexed under the same id are skipped."""
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                added = 0
+                for doc in docs:
+                    tokens = tokenize(doc.page_content)
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            chunk_key(doc), len(tokens), doc.page_content, json.dumps(doc.metadata),
+                            doc.metadata.get("source"), doc.metadata.get("page")
+                        )
+                    )
+                    if not cursor.rowcount:
+                        continue
+                    self._conn.executemany(
+                        "INSERT INTO postings VALUES (?, ?, ?)",
+                        [(term, chunk_key(doc), tf) for term, tf in Counter(tokens).items()]
+                    )
+                    added += 1
+                self._conn.execute("COMMIT")
+            return added
+
+        except Exception as e:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise CustomException(e, sys)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """Remove chunks and their postings."""
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(f"DELETE FROM postings WHERE id IN ({placeholders})", batch)
+                self._conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", batch)
+            self._conn.execute("COMMIT")
+
+    def update_metadatas(self, ids: List[str], metadatas: List[dict]) -> None:
+        """Replace the stored metadata of chunks; their postings are unchanged."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "UPDATE chunks SET metadata = ?, source = ?, page = ? WHERE id = ?",
+                [
+                    (json.dumps(metadata), metadata.get("source"), metadata.get("page"), chunk_id)
+                    for chunk_id, metadata in zip(ids, metadatas)
+                ]
+            )
+            self._conn.execute("COMMIT")
+
+    def sources(self) -> List[str]:
+        """Distinct sources of the indexed chunks, read from the source index."""
+        with self._lock:
+            return [
+                row[0] for row in self._conn.execute(
+                    "SELECT DISTINCT source FROM chunks WHERE source IS NOT NULL ORDER BY source"
+                )
+            ]
+
+    def search(self, query: str, k: int = 4, where: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """
+        Top-k chunks by BM25 score.
+
+        Args:
+            query: Query text
+            k: Number of results
+            where: Chroma-style metadata filter; only matching chunks are scored
+
+        Returns:
+            List of (document, score), best first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            total, avg_length = self._conn.execute("SELECT COUNT(*), AVG(length) FROM chunks").fetchone()
+            if not total:
+                return []
+            placeholders = ",".join("?" * len(terms))
+            postings = self._conn.execute(
+                f"SELECT p.term, p.id, p.tf, c.length FROM postings p JOIN chunks c ON c.id = p.id "
+                f"WHERE p.term IN ({placeholders})",
+                terms
+            ).fetchall()
+            # Document frequencies stay collection-wide so scores do not depend on the filter
+            doc_freq = Counter(term for term, _, _, _ in postings)
+            if where:
+                condition, params = where_to_sql(where)
+                allowed = {
+                    row[0] for row in self._conn.execute(
+                        f"SELECT DISTINCT p.id FROM postings p JOIN chunks c ON c.id = p.id "
+                        f"WHERE p.term IN ({placeholders}) AND {condition}",
+                        terms + params
+                    )
+                }
+                postings = [posting for posting in postings if posting[1] in allowed]
+
+            scores: Dict[str, float] = {}
+            k1, b = self.config.k1, self.config.b
+            for term, chunk_id, tf, length in postings:
+                idf = math.log(1 + (total - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                norm = tf + k1 * (1 - b + b * length / (avg_length or 1))
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / norm
+
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            if not top:
+                return []
+            placeholders = ",".join("?" * len(top))
+            records = {
+                chunk_id: (text, metadata) for chunk_id, text, metadata in self._conn.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})",
+                    [chunk_id for chunk_id, _ in top]
+                )
+            }
+        return [
+            (Document(page_content=records[chunk_id][0], metadata=json.loads(records[chunk_id][1])), score)
+            for chunk_id, score in top
+        ]
+
+    def rebuild(self, docs: Iterable[Document]) -> None:
+        """Replace the whole index with the given chunks."""
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM chunks")
+        added = self.add(docs)
+        logging.info(f"Rebuilt keyword index {self.index_path} with {added} chunks")
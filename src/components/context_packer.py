@@ -0,0 +1,182 @@
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain.schema import BaseRetriever, Document
+
+from src.components.hybrid_retriever import HybridRetrieverConfig, build_base_retriever
+from src.logger import logging
+from src.exception import CustomException
+
+
+@dataclass
+class ContextPackerConfig:
+    enabled: bool = True
+    token_budget: int = 768  # Tokens of retrieved context allowed in the prompt
+    fetch_k: int = 6  # Candidates retrieved before packing
+    min_overlap_chars: int = 20  # Shorter shared runs are not treated as chunk overlap
+    max_overlap_chars: int = 400  # Splitter overlap is 200 chars, leave some slack
+    separator_tokens: int = 2  # Cost of the blank line joining documents
+    min_fragment_tokens: int = 32  # Smallest truncated chunk worth including
+
+
+def _overlap_length(left: str, right: str, min_chars: int, max_chars: int) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`."""
+    for length in range(min(max_chars, len(left), len(right)), min_chars - 1, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+class ContextPacker:
+    """
+    Packs retrieved chunks into a fixed token budget in relevance order.
+
+    Regions a chunk shares with an already selected chunk of the same source
+    (the splitter's overlap) are trimmed first, so the budget is not spent on
+    repeated text. Character offsets from the token splitter are used when
+    present, otherwise overlaps are found by matching text. A chunk that
+    does not fit whole is truncated to the remaining budget, and packing
+    stops there.
+    """
+
+    def __init__(self, tokenizer, config: Optional[ContextPackerConfig] = None):
+        self.tokenizer = tokenizer
+        self.config = config or ContextPackerConfig()
+
+    @staticmethod
+    def _trim_by_offsets(doc: Document, selected: List[Document]) -> Optional[str]:
+        """Trim using start_char/end_char metadata when every chunk carries it."""
+        start, end = doc.metadata.get("start_char"), doc.metadata.get("end_char")
+        if start is None or end is None:
+            return None
+        for other in selected:
+            if (other.metadata.get("source"), other.metadata.get("page")) != (
+                doc.metadata.get("source"), doc.metadata.get("page")
+            ):
+                continue
+            other_start, other_end = other.metadata.get("start_char"), other.metadata.get("end_char")
+            if other_start is None or other_end is None:
+                return None
+            if other_start <= start and end <= other_end:
+                return ""
+            if other_start <= start < other_end:
+                start = other_end
+            elif start < other_start < end <= other_end:
+                end = other_start
+        offset = doc.metadata["start_char"]
+        return doc.page_content[start - offset:end - offset].strip()
+
+    def _trim_overlap(self, doc: Document, selected: List[Document]) -> str:
+        trimmed = self._trim_by_offsets(doc, selected)
+        if trimmed is not None:
+            return trimmed
+
+        text = doc.page_content
+        for other in selected:
+            if other.metadata.get("source") != doc.metadata.get("source"):
+                continue
+            if text in other.page_content:
+                return ""
+            # Drop a leading region repeated from the end of a selected chunk
+            head = _overlap_length(
+                other.page_content, text, self.config.min_overlap_chars, self.config.max_overlap_chars
+            )
+            text = text[head:]
+            # Drop a trailing region repeated at the start of a selected chunk
+            tail = _overlap_length(
+                text, other.page_content, self.config.min_overlap_chars, self.config.max_overlap_chars
+            )
+            if tail:
+                text = text[:-tail]
+        return text.strip()
+
+    def pack(self, docs: List[Document]) -> List[Document]:
+        """
+        Select and trim documents to fit the token budget.
+
+        Args:
+            docs: Retrieved documents, most relevant first
+
+        Returns:
+            List of new Documents whose total token count fits the budget
+        """
+        try:
+            remaining = self.config.token_budget
+            packed: List[Document] = []
+            dropped = 0
+
+            for doc in docs:
+                text = self._trim_overlap(doc, packed)
+                if not text:
+                    dropped += 1
+                    continue
+
+                available = remaining - (self.config.separator_tokens if packed else 0)
+                if available < self.config.min_fragment_tokens:
+                    break
+
+                token_ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+                if len(token_ids) > available:
+                    text = self.tokenizer.decode(token_ids[:available], skip_special_tokens=True)
+                    token_ids = token_ids[:available]
+
+                packed.append(Document(
+                    page_content=text,
+                    metadata={**doc.metadata, "packed_tokens": len(token_ids)}
+                ))
+                remaining = available - len(token_ids)
+
+            used = self.config.token_budget - remaining
+            logging.info(
+                f"Packed {len(packed)}/{len(docs)} chunks into {used}/{self.config.token_budget} tokens "
+                f"({dropped} fully overlapping chunks dropped)"
+            )
+            return packed
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+class PackedRetriever(BaseRetriever):
+    """Retriever that fetches fetch_k candidates and packs them to the token budget."""
+
+    retriever: BaseRetriever
+    packer: Any
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        docs = self.retriever.get_relevant_documents(query)
+        return self.packer.pack(docs)
+
+
+def build_retriever(
+    vectorstore,
+    llm,
+    search_kwargs: Dict[str, Any],
+    config: Optional[ContextPackerConfig] = None,
+    keyword_index=None,
+    hybrid_config: Optional[HybridRetrieverConfig] = None,
+) -> BaseRetriever:
+    """
+    Build the retriever used by the RetrievalQA chains.
+
+    Args:
+        vectorstore: Vector store of the pipeline
+        llm: LLM of the chain, whose tokenizer measures the context
+        search_kwargs: Search arguments used when packing is disabled
+        config: Packing configuration
+        keyword_index: BM25Index of the pipeline, fused with dense search when given
+        hybrid_config: Fusion configuration
+
+    Returns:
+        BaseRetriever: A PackedRetriever, or the dense or hybrid retriever
+    """
+    config = config or ContextPackerConfig()
+    if not config.enabled:
+        return build_base_retriever(vectorstore, search_kwargs, keyword_index, hybrid_config)
+
+    candidate_kwargs = {**search_kwargs, "k": max(config.fetch_k, search_kwargs.get("k", 0))}
+    return PackedRetriever(
+        retriever=build_base_retriever(vectorstore, candidate_kwargs, keyword_index, hybrid_config),
+        packer=ContextPacker(llm.pipeline.tokenizer, config)
+    )
@@ -1,9 +1,10 @@
 import os
+import shutil
 from dataclasses import dataclass
 from src.exception import CustomException
 from src.logger import logging
 import sys
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 @dataclass
 class DataIngestionConfig:
@@ -86,6 +87,45 @@ class DataIngestion:
         
         return processed_paths
     
+    def link_files(self, source_id: int, pipeline_id: int) -> Dict[str, str]:
+        """
+        Share the stored documents of one pipeline with another.
+        
+        Files are hardlinked, or copied where links are not supported, so a
+        cloned pipeline keeps its documents if the source is cleaned up.
+        
+        Args:
+            source_id: Pipeline whose documents are shared
+            pipeline_id: Pipeline receiving them
+            
+        Returns:
+            Dict[str, str]: Path of each shared document -> its path in the new pipeline
+        """
+        try:
+            source_dir = os.path.join(self.config.base_path, str(source_id))
+            target_dir = os.path.join(self.config.base_path, str(pipeline_id))
+            if not os.path.isdir(source_dir):
+                return {}
+            
+            os.makedirs(target_dir, exist_ok=True)
+            linked_paths = {}
+            for name in sorted(os.listdir(source_dir)):
+                source_path = os.path.join(source_dir, name)
+                target_path = os.path.join(target_dir, name)
+                if not os.path.isfile(source_path) or os.path.exists(target_path):
+                    continue
+                try:
+                    os.link(source_path, target_path)
+                except OSError:
+                    shutil.copy2(source_path, target_path)
+                linked_paths[source_path] = target_path
+            
+            logging.info(f"Shared {len(linked_paths)} documents of pipeline {source_id} with pipeline {pipeline_id}")
+            return linked_paths
+            
+        except Exception as e:
+            raise CustomException(e, sys)
+    
     def clear_processed_files(self):
         """Reset the processed files counter"""
         self.processed_files = []
@@ -1,14 +1,25 @@
+import atexit
+import functools
+import multiprocessing
 import os
 import sys
+import threading
+import time
+from multiprocessing.connection import wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from src.logger import logging
 from src.exception import CustomException
 from dataclasses import dataclass
 from langchain.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from transformers import pipeline
+from transformers import AutoTokenizer, pipeline
+from langchain.schema import Document
 from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.embeddings.base import Embeddings
 
+from src.components.embedding_cache import CachedEmbeddings, get_embedding_cache
+from src.components.onnx_embeddings import OnnxEmbeddings
 from src.utils import validate_file_path
 
 
@@ -17,10 +28,249 @@ class DataTransformationConfig:
     model_name:str ="sentence-transformers/all-MiniLM-L6-v2"
     chunk_size :int = 1000
     chunk_overlap:int = 200
+    splitter: str = "recursive"  # "recursive" (characters) or "token" (embedding tokenizer tokens)
+    chunk_tokens: int = 254  # MiniLM reads 256 tokens including [CLS] and [SEP]
+    chunk_overlap_tokens: int = 32
+    device: Optional[str] = None  # None picks cuda when available, else cpu
+    embed_batch_size: int = 32
+    embed_num_workers: int = 0  # Worker processes for large ingestions, 0 or 1 disables
+    parallel_min_texts: int = 512  # Smaller inputs are embedded in-process
+    embed_chunk_size: Optional[int] = None  # Texts per worker task, None lets sentence-transformers pick
+    stream_batch_size: int = 64  # Chunks per batch in streaming ingestion
+    embedding_backend: str = "torch"  # "torch" (sentence-transformers) or "onnx" (onnxruntime)
+    onnx_quantize: bool = True  # Serve the int8 dynamically quantized ONNX graph
+    onnx_cache_dir: str = os.path.join("artifacts", "onnx_models")
+    parse_workers: int = max(1, min(8, os.cpu_count() or 1))  # Processes for bulk PDF parsing
+    parse_timeout: float = 300.0  # Seconds before a single PDF's parser is killed
+    embedding_cache: bool = True  # Reuse vectors of chunks embedded before
+    embedding_cache_dir: str = os.path.join("artifacts", "embedding_cache")
+
+
+@functools.lru_cache(maxsize=None)
+def get_tokenizer(model_name: str):
+    """Load a (fast) tokenizer once per process."""
+    return AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+
+class TokenOffsetSplitter:
+    """
+    Splits documents into fixed windows of tokenizer tokens.
+
+    Documents are tokenized in batches with offset mappings, so each chunk
+    is an exact slice of the source text. The page (from the loader) plus
+    start_char, end_char and token_count are recorded in chunk metadata.
+    """
+
+    def __init__(self, tokenizer, chunk_tokens: int = 254, overlap_tokens: int = 32, batch_size: int = 64):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.tokenizer = tokenizer
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.batch_size = batch_size
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        chunks = []
+        step = self.chunk_tokens - self.overlap_tokens
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            encoded = self.tokenizer(
+                [doc.page_content for doc in batch],
+                add_special_tokens=False,
+                return_offsets_mapping=True
+            )
+            for doc, offsets in zip(batch, encoded["offset_mapping"]):
+                n_tokens = len(offsets)
+                for first in range(0, n_tokens, step):
+                    last = min(first + self.chunk_tokens, n_tokens)
+                    start_char, end_char = offsets[first][0], offsets[last - 1][1]
+                    chunks.append(Document(
+                        page_content=doc.page_content[start_char:end_char],
+                        metadata={
+                            **doc.metadata,
+                            "start_char": start_char,
+                            "end_char": end_char,
+                            "token_count": last - first
+                        }
+                    ))
+                    if last == n_tokens:
+                        break
+        return chunks
+
+
+class SharedEmbeddings(Embeddings):
+    """
+    Process-wide embedding model that is safe to call from several threads.
+
+    The sentence-transformers model is loaded once; encode calls are
+    serialized with a lock because the fast tokenizer is not re-entrant.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str,
+        batch_size: int,
+        normalize: bool,
+        num_workers: int = 0,
+        parallel_min_texts: int = 512,
+        chunk_size: Optional[int] = None
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.num_workers = num_workers
+        self.parallel_min_texts = parallel_min_texts
+        self.chunk_size = chunk_size
+        # Vectors depend on the model and normalization, not on device or batch size
+        self.cache_namespace = f"{model_name}-normalized" if normalize else model_name
+        self.client = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={"device": device},
+            encode_kwargs={"normalize_embeddings": normalize, "batch_size": batch_size}
+        )
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            if self.num_workers > 1 and len(texts) >= self.parallel_min_texts:
+                return self._embed_parallel(texts)
+            return self.client.embed_documents(texts)
+
+    def _start_pool(self):
+        """Start the worker pool, splitting CPU threads evenly between workers."""
+        threads = str(max(1, (os.cpu_count() or 1) // self.num_workers))
+        previous = os.environ.get("OMP_NUM_THREADS")
+        os.environ["OMP_NUM_THREADS"] = threads
+        try:
+            devices = [self.device] * self.num_workers
+            self._pool = self.client.client.start_multi_process_pool(target_devices=devices)
+        finally:
+            if previous is None:
+                os.environ.pop("OMP_NUM_THREADS", None)
+            else:
+                os.environ["OMP_NUM_THREADS"] = previous
+        atexit.register(self.close)
+        logging.info(f"started {self.num_workers} embedding worker processes ({threads} threads each)")
+
+    def _embed_parallel(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts across the worker pool.
+
+        sentence-transformers hands out contiguous chunks and reassembles
+        them by chunk index, so output order matches input order and a given
+        input and configuration always produce the same batches.
+        """
+        import numpy as np
+
+        if self._pool is None:
+            self._start_pool()
+        texts = [text.replace("\n", " ") for text in texts]
+        vectors = self.client.client.encode_multi_process(
+            texts, self._pool, batch_size=self.batch_size, chunk_size=self.chunk_size
+        )
+        if self.normalize:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.clip(norms, 1e-12, None)
+        return vectors.tolist()
+
+    def close(self) -> None:
+        """Stop the worker pool if one was started."""
+        if self._pool is not None:
+            self.client.client.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            return self.client.embed_query(text)
+
+
+_embedding_models: Dict[Tuple, SharedEmbeddings] = {}
+_embedding_models_lock = threading.Lock()
+
+
+def get_embedding_model(
+    model_name: str,
+    device: Optional[str] = None,
+    batch_size: int = 32,
+    normalize: bool = True,
+    num_workers: int = 0,
+    parallel_min_texts: int = 512,
+    chunk_size: Optional[int] = None,
+    backend: str = "torch",
+    onnx_quantize: bool = True,
+    onnx_cache_dir: str = os.path.join("artifacts", "onnx_models")
+) -> Embeddings:
+    """
+    Get the shared embedding model for a configuration, loading it on first use.
+
+    Args:
+        model_name: Sentence-transformers model name
+        device: Device to run on, None picks cuda when available
+        batch_size: Encode batch size
+        normalize: Whether to L2-normalize the vectors
+        num_workers: Worker processes for large embed_documents calls
+        parallel_min_texts: Minimum number of texts to use the workers
+        chunk_size: Texts per worker task
+        backend: "torch" for sentence-transformers, "onnx" for onnxruntime
+        onnx_quantize: Use the int8 quantized ONNX graph
+        onnx_cache_dir: Where exported ONNX graphs are kept
+
+    Returns:
+        Embeddings: SharedEmbeddings or OnnxEmbeddings shared across the process
+    """
+    if device is None:
+        import torch
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    if backend == "onnx":
+        key = (model_name, backend, onnx_quantize, batch_size, normalize)
+    elif backend == "torch":
+        key = (model_name, device, batch_size, normalize, num_workers, parallel_min_texts, chunk_size)
+    else:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+
+    with _embedding_models_lock:
+        if key not in _embedding_models:
+            logging.info(f"loading embedding model {model_name} ({backend}) on {device}")
+            if backend == "onnx":
+                _embedding_models[key] = OnnxEmbeddings(
+                    model_name, onnx_cache_dir, quantize=onnx_quantize,
+                    normalize=normalize, batch_size=batch_size
+                )
+            else:
+                _embedding_models[key] = SharedEmbeddings(
+                    model_name, device, batch_size, normalize, num_workers, parallel_min_texts, chunk_size
+                )
+            logging.info("embedding model loaded")
+        return _embedding_models[key]
+
+def _parse_pdf_worker(path:str,transform_config:DataTransformationConfig,conn)->None:
+    """Parse and split one PDF in a child process, sending the result back over conn."""
+    try:
+        docs=PyPDFLoader(path).load()
+        chunks=DataTransformation(transform_config).get_splitter().split_documents(docs)
+        conn.send(("ok",chunks,len(docs)))
+    except Exception as e:
+        conn.send(("error",str(e),0))
+    finally:
+        conn.close()
+
+
+def _parser_context():
+    """forkserver avoids forking a parent that holds model threads, spawn elsewhere."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context=multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
 
 class DataTransformation:
-    def __init__(self):
-        self.transform_config=DataTransformationConfig()
+    def __init__(self,transform_config:Optional[DataTransformationConfig]=None):
+        self.transform_config=transform_config or DataTransformationConfig()
 
     def load_data(self,path:str):
         """
@@ -36,10 +286,7 @@ class DataTransformation:
             loader=PyPDFLoader(path)
             docs=loader.load()
             logging.info("data has been loaded")
-            splitter=RecursiveCharacterTextSplitter(
-                chunk_size=self.transform_config.chunk_size,
-                chunk_overlap=self.transform_config.chunk_overlap
-            )
+            splitter=self.get_splitter()
             chunks = splitter.split_documents(
                 documents=docs
             )
@@ -47,21 +294,75 @@ class DataTransformation:
             return chunks
         except Exception as e:
             raise CustomException(e,sys)
+    def get_splitter(self):
+        """Return the text splitter configured for this transformation."""
+        if self.transform_config.splitter=="token":
+            return TokenOffsetSplitter(
+                get_tokenizer(self.transform_config.model_name),
+                chunk_tokens=self.transform_config.chunk_tokens,
+                overlap_tokens=self.transform_config.chunk_overlap_tokens
+            )
+        return RecursiveCharacterTextSplitter(
+            chunk_size=self.transform_config.chunk_size,
+            chunk_overlap=self.transform_config.chunk_overlap,
+            add_start_index=True  # Offsets make chunk ids stable across re-uploads
+        )
+    def iter_chunks(self,path:str,batch_size:Optional[int]=None)->Iterator[List]:
+        """
+        Lazily load a PDF page by page and yield its chunks in batches.
+        Only the current page and one batch of chunks are held in memory,
+        so memory stays flat regardless of document length. Chunks never
+        span a page boundary in this mode.
+        Args:
+            path: Path to the PDF file
+            batch_size: Chunks per yielded batch, defaults to stream_batch_size
+        Yields:
+            List of document chunks
+        Raises:
+            CustomException: If document loading or splitting fails
+        """
+        try:
+            batch_size=batch_size or self.transform_config.stream_batch_size
+            splitter=self.get_splitter()
+            batch=[]
+            pages=0
+            for page in PyPDFLoader(path).lazy_load():
+                pages+=1
+                batch.extend(splitter.split_documents([page]))
+                while len(batch)>=batch_size:
+                    yield batch[:batch_size]
+                    batch=batch[batch_size:]
+            if batch:
+                yield batch
+            logging.info(f"streamed {pages} pages from {path}")
+        except Exception as e:
+            raise CustomException(e,sys)
     def transform_data(self):
         """
-                Initialize and return the embedding model.
+                Return the shared embedding model, loading it only once per process.
                 Returns:
                     Configured HuggingFace embeddings model
                 Raises:
                     CustomException: If embedding model initialization fails
                 """
         try:
-            logging.info("loading embedding model")
-            embeddings=HuggingFaceEmbeddings(
+            embeddings=get_embedding_model(
                 model_name=self.transform_config.model_name,
-               encode_kwargs = {"normalize_embeddings": True}
+                device=self.transform_config.device,
+                batch_size=self.transform_config.embed_batch_size,
+                num_workers=self.transform_config.embed_num_workers,
+                parallel_min_texts=self.transform_config.parallel_min_texts,
+                chunk_size=self.transform_config.embed_chunk_size,
+                backend=self.transform_config.embedding_backend,
+                onnx_quantize=self.transform_config.onnx_quantize,
+                onnx_cache_dir=self.transform_config.onnx_cache_dir
             )
-            logging.info("embedding model loaded")
+            if self.transform_config.embedding_cache:
+                cache=get_embedding_cache(
+                    namespace=embeddings.cache_namespace,
+                    cache_dir=self.transform_config.embedding_cache_dir
+                )
+                return CachedEmbeddings(embeddings,cache)
             return embeddings
 
         except Exception as e:
@@ -88,3 +389,101 @@ class DataTransformation:
                 raise FileNotFoundError(f"Document not found at: {path}")
         except Exception as e:
             raise CustomException(e,sys)
+    def stream_pdf(self,path:str):
+        """
+        Streaming variant of process_pdf.
+        Args:
+            path: Path to the PDF file
+        Returns:
+            Tuple of (iterator of chunk batches, embeddings model)
+        """
+        try:
+            if not validate_file_path(path):
+                logging.info("file path not found")
+                raise FileNotFoundError(f"Document not found at: {path}")
+            return self.iter_chunks(path),self.transform_data()
+        except Exception as e:
+            raise CustomException(e,sys)
+    def parallel_load_data(self,paths:List[str])->Tuple[List,Dict[str,Any]]:
+        """
+        Parse and split many PDFs concurrently, one child process per file.
+        Each file runs in its own process, so a PDF that crashes the parser
+        or exceeds parse_timeout is killed and reported without affecting
+        the others. Chunks come back in the order of `paths`.
+        Args:
+            paths: Paths to the PDF files
+        Returns:
+            Tuple of (document chunks, stats with files/sec, pages/sec and failures)
+        Raises:
+            CustomException: If the parser processes cannot be managed
+        """
+        try:
+            context=_parser_context()
+            workers=max(1,self.transform_config.parse_workers)
+            timeout=self.transform_config.parse_timeout
+            pending=[(index,path) for index,path in enumerate(paths) if validate_file_path(path)]
+            failures={path:"not a readable PDF" for path in paths if not validate_file_path(path)}
+            results:Dict[int,List]={}
+            pages=0
+            running={}
+            start=time.perf_counter()
+
+            while pending or running:
+                while pending and len(running)<workers:
+                    index,path=pending.pop(0)
+                    parent_conn,child_conn=context.Pipe(duplex=False)
+                    process=context.Process(
+                        target=_parse_pdf_worker,
+                        args=(path,self.transform_config,child_conn),
+                        daemon=True
+                    )
+                    process.start()
+                    child_conn.close()
+                    running[parent_conn]=(index,path,process,time.monotonic())
+
+                for conn in wait(list(running),timeout=0.5):
+                    index,path,process,_=running.pop(conn)
+                    try:
+                        status,payload,page_count=conn.recv()
+                    except EOFError:
+                        process.join()
+                        status,payload,page_count="error",f"parser exited with code {process.exitcode}",0
+                    conn.close()
+                    process.join()
+                    if status=="ok":
+                        results[index]=payload
+                        pages+=page_count
+                    else:
+                        failures[path]=payload
+                        logging.error(f"failed to parse {path}: {payload}")
+
+                now=time.monotonic()
+                for conn,(index,path,process,started) in list(running.items()):
+                    if now-started>timeout:
+                        process.terminate()
+                        process.join()
+                        conn.close()
+                        del running[conn]
+                        failures[path]=f"timed out after {timeout}s"
+                        logging.error(f"parsing {path} timed out after {timeout}s")
+
+            elapsed=time.perf_counter()-start
+            chunks=[chunk for index in sorted(results) for chunk in results[index]]
+            stats={
+                "files":len(results),
+                "failed":len(failures),
+                "pages":pages,
+                "chunks":len(chunks),
+                "seconds":elapsed,
+                "files_per_sec":len(results)/elapsed if elapsed else 0.0,
+                "pages_per_sec":pages/elapsed if elapsed else 0.0,
+                "failures":failures
+            }
+            logging.info(
+                f"parsed {stats['files']} files ({stats['pages']} pages) with {workers} workers: "
+                f"{stats['files_per_sec']:.2f} files/sec, {stats['pages_per_sec']:.2f} pages/sec, "
+                f"{stats['failed']} failed"
+            )
+            return chunks,stats
+        except Exception as e:
+            raise CustomException(e,sys)
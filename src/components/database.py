@@ -1,13 +1,24 @@
 import os
+import re
 import sys
+import queue
+import hashlib
 import shutil
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from langchain.vectorstores import Chroma
 from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.schema import Document
 
 from src.components.data_transformation import DataTransformation
+from src.components.embedding_cache import QueryCachedEmbeddings, QueryEmbeddingCache, text_hash
+from src.components.deduplication import MinHashDeduplicator
+from src.components.bm25 import BM25Config, BM25Index, chunk_key
+from src.components.vector_backends import build_backends, clone_directory, detect_backend
 from src.logger import logging
 from src.exception import CustomException
 from src.utils import validate_file_path
@@ -17,31 +28,592 @@ from src.utils import validate_file_path
 class DataBaseConfig:
     """Configuration for database persistence"""
     PERSIST_DIR: str = os.path.join("artifacts", "chroma_db")
+    stream_queue_size: int = 4  # Chunk batches buffered between parsing and embedding
+    query_cache_size: int = 1024  # Query vectors kept in the process-wide LRU
+    query_cache_ttl: Optional[float] = 3600.0  # Seconds, None keeps entries until evicted
+    query_cache_case_insensitive: bool = False  # Only for uncased models; queries are embedded case-folded
+    vector_storage: str = "chroma"  # Backend of new pipelines: "chroma", "numpy", or compact "float16" / "int8"
+    rescore_factor: int = 4  # Compact stores rescore rescore_factor * k candidates exactly
+    # Compact stores rescore candidates from a side file of this dtype when it is wider than
+    # the codes: int8 + float16 is 3 bytes per dimension; "float32" rescores exactly, None not at all
+    compact_rescore_dtype: Optional[str] = "float16"
+    ivf_min_vectors: int = 50000  # NumPy backend builds an IVF index from this many vectors
+    ivf_nprobe: int = 8  # IVF lists scanned per query
+    keyword_index: bool = True  # Maintain a BM25 index next to each store for hybrid retrieval
+    store_pool_memory_budget_mb: int = 1024  # On-disk size of open stores, a proxy for their resident index
+    store_pool_max_handles: int = 256  # Files of open stores, a proxy for the handles they hold
+    store_pool_idle_ttl: Optional[float] = 600.0  # Seconds before an unused store is closed, None disables
+    storage_layout: str = "per_pipeline"  # "per_pipeline" directories, or "shared": one Chroma store, a collection per pipeline
+    SHARED_DIR: str = os.path.join("artifacts", "chroma_db", "_shared")
+
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache(config: DataBaseConfig) -> QueryEmbeddingCache:
+    """Return the process-wide query embedding cache, creating it on first use."""
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache(config.query_cache_size, config.query_cache_ttl)
+        return _query_cache
+
+
+class _PooledStore:
+    def __init__(self, store, size_bytes: int, handles: int):
+        self.store = store
+        self.size_bytes = size_bytes
+        self.handles = handles
+        self.last_used = time.monotonic()
+
+
+def _close_store(store) -> None:
+    close = getattr(store, "close", None)
+    if callable(close):
+        close()
+
+
+class StorePool:
+    """
+    Process-wide LRU of open pipeline vector stores.
+
+    Opening a store reads its SQLite and index files, so recently used
+    stores are kept open and shared. Entries are evicted least recently used
+    first once the open stores exceed the memory or file budget, and closed
+    once idle longer than the TTL (checked lazily on each access).
+
+    The budget bounds only what the pool itself keeps alive. A store that a
+    caller still references, such as the chain of a pipeline loaded in
+    PredictPipeline.pipelines or Pipeline.pipeline_dict, stays in memory
+    after eviction until that caller unloads it; eviction only releases
+    what the store can reopen lazily, like a compact store's memory map.
+
+    Chroma stores have no close(), so evicting one only drops the pool's
+    reference and the file handle budget does not bound them. In the shared
+    layout the process-wide client keeps the segment files of every
+    collection it has loaded open until drop_shared_client(); collections
+    are counted by size only, and their handles are not in the budget.
+    """
+
+    def __init__(self, memory_budget_mb: int = 1024, max_handles: int = 256, idle_ttl: Optional[float] = 600.0):
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
+        self.max_handles = max_handles
+        self.idle_ttl = idle_ttl
+        self._entries: "OrderedDict[Tuple[str, str], _PooledStore]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.opens = 0
+        self.hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def dir_footprint(path: str) -> Tuple[int, int]:
+        """Bytes and file count under a directory."""
+        size, files = 0, 0
+        for root, _, names in os.walk(path):
+            for name in names:
+                size += os.path.getsize(os.path.join(root, name))
+                files += 1
+        return size, files
+
+    def _expire(self) -> None:
+        if self.idle_ttl is None:
+            return
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if now - entry.last_used > self.idle_ttl]:
+            _close_store(self._entries.pop(key).store)
+            self.expirations += 1
+
+    def _enforce_budget(self, keep: Tuple[str, str]) -> None:
+        while len(self._entries) > 1:
+            size = sum(entry.size_bytes for entry in self._entries.values())
+            handles = sum(entry.handles for entry in self._entries.values())
+            if size <= self.memory_budget_bytes and handles <= self.max_handles:
+                return
+            key = next(iter(self._entries))
+            if key == keep:
+                self._entries.move_to_end(key)
+                key = next(iter(self._entries))
+            _close_store(self._entries.pop(key).store)
+            self.evictions += 1
+
+    def get(
+        self,
+        location: str,
+        namespace: str,
+        open_store: Callable[[], Any],
+        footprint: Optional[Callable[[Any], Tuple[int, int]]] = None
+    ):
+        """
+        Return the pooled store for a location and embedding model, opening it on a miss.
+
+        Args:
+            location: Store directory, or directory#collection in the shared layout
+            namespace: Embedding model namespace
+            open_store: Opens the store on a miss
+            footprint: Bytes and files attributed to the opened store, defaults to the directory's
+        """
+        key = (location, namespace)
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.store
+
+        # Open outside the lock so one slow open does not stall other pipelines
+        store = open_store()
+        size, handles = footprint(store) if footprint else self.dir_footprint(location)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Another thread opened it meanwhile, share that one
+                _close_store(store)
+                return entry.store
+            self._entries[key] = _PooledStore(store, size, handles)
+            self.opens += 1
+            self._enforce_budget(key)
+        return store
+
+    def put(
+        self,
+        location: str,
+        namespace: str,
+        store,
+        footprint: Optional[Callable[[Any], Tuple[int, int]]] = None
+    ):
+        """Add a freshly created store, replacing any pooled one of the same location."""
+        size, handles = footprint(store) if footprint else self.dir_footprint(location)
+        self.discard(location)
+        key = (location, namespace)
+        with self._lock:
+            self._entries[key] = _PooledStore(store, size, handles)
+            self.opens += 1
+            self._enforce_budget(key)
+        return store
+
+    def discard(self, location: str) -> None:
+        """Close and forget every pooled store of a location."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == location]:
+                _close_store(self._entries.pop(key).store)
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self._entries.values():
+                _close_store(entry.store)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.opens
+            return {
+                "open": len(self._entries),
+                "size_mb": sum(entry.size_bytes for entry in self._entries.values()) / (1024 * 1024),
+                "handles": sum(entry.handles for entry in self._entries.values()),
+                "opens": self.opens,
+                "hits": self.hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_store_pool: Optional[StorePool] = None
+_store_pool_lock = threading.Lock()
+
+
+def get_store_pool(config: DataBaseConfig) -> StorePool:
+    """Return the process-wide store pool, creating it on first use."""
+    global _store_pool
+    with _store_pool_lock:
+        if _store_pool is None:
+            _store_pool = StorePool(
+                config.store_pool_memory_budget_mb, config.store_pool_max_handles, config.store_pool_idle_ttl
+            )
+        return _store_pool
+
+
+def collection_name(pipeline_id) -> str:
+    """
+    Chroma collection holding a pipeline in the shared layout.
+
+    Collection names allow 3-63 characters of [A-Za-z0-9._-] starting and
+    ending alphanumeric; other ids are mapped to a readable prefix plus a hash.
+    """
+    pipeline_id = str(pipeline_id)
+    if re.fullmatch(r"[A-Za-z0-9_-]{0,53}[A-Za-z0-9]", pipeline_id):
+        return f"pipeline_{pipeline_id}"
+    digest = hashlib.sha256(pipeline_id.encode("utf-8")).hexdigest()[:12]
+    return f"pipeline_{re.sub(r'[^A-Za-z0-9_-]', '_', pipeline_id)[:32]}_{digest}"
+
+
+# Rough resident cost of one stored chunk (384-dim float32 vector, HNSW links, text)
+_SHARED_BYTES_PER_CHUNK = 4096
+
+
+_shared_clients: Dict[str, Any] = {}
+_shared_clients_lock = threading.Lock()
+
+
+def get_shared_client(shared_dir: str):
+    """
+    The process-wide Chroma client of a shared store directory.
+
+    Every collection of the shared store goes through this one client: with
+    chromadb < 0.4, separate clients on one directory overwrite each other's
+    persisted parquet files.
+    """
+    import chromadb
+
+    key = os.path.abspath(shared_dir)
+    with _shared_clients_lock:
+        if key not in _shared_clients:
+            if hasattr(chromadb, "PersistentClient"):
+                _shared_clients[key] = chromadb.PersistentClient(path=shared_dir)
+            else:
+                from chromadb.config import Settings
+                _shared_clients[key] = chromadb.Client(
+                    Settings(chroma_db_impl="duckdb+parquet", persist_directory=shared_dir)
+                )
+        return _shared_clients[key]
+
+
+def drop_shared_client(shared_dir: str) -> None:
+    """Forget the client of a shared store directory; the next use opens a new one."""
+    with _shared_clients_lock:
+        _shared_clients.pop(os.path.abspath(shared_dir), None)
+
+
+def copy_collection(source, target, batch_size: int = 1000) -> int:
+    """
+    Upsert every stored vector, text and metadata of one Chroma store into another.
+
+    Nothing is re-embedded, and an interrupted copy can simply be run again.
+
+    Returns:
+        int: Number of chunks in the source
+    """
+    total = source._collection.count()
+    for offset in range(0, total, batch_size):
+        batch = source.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        if batch["ids"]:
+            target._collection.upsert(
+                ids=batch["ids"],
+                embeddings=batch["embeddings"],
+                documents=batch["documents"],
+                metadatas=batch["metadatas"]
+            )
+    return total
+
+
+def _collection_footprint(store) -> Tuple[int, int]:
+    # Files belong to the shared client, which eviction cannot close
+    return store._collection.count() * _SHARED_BYTES_PER_CHUNK, 0
+
+
+_keyword_indexes: Dict[str, BM25Index] = {}
+_keyword_indexes_lock = threading.Lock()
+
+
+def _get_keyword_index(persist_path: str) -> BM25Index:
+    with _keyword_indexes_lock:
+        if persist_path not in _keyword_indexes:
+            _keyword_indexes[persist_path] = BM25Index(persist_path, BM25Config())
+        return _keyword_indexes[persist_path]
+
+
+def _drop_keyword_index(persist_path: str) -> None:
+    with _keyword_indexes_lock:
+        _keyword_indexes.pop(persist_path, None)
+
+
+def _embedding_namespace(embeddings) -> str:
+    if embeddings is None:
+        return "none"
+    return getattr(embeddings, "cache_namespace", getattr(embeddings, "model_name", type(embeddings).__name__))
+
+
+def assign_chunk_ids(docs: List) -> List[str]:
+    """
+    Give each chunk a deterministic id and record it as metadata["chunk_id"].
+
+    The id is "<source hash>-<page>:<offset>-<text hash>". The first two parts
+    name the chunk's slot in its document, so a re-uploaded chunk whose text
+    changed keeps its slot but gets a new id. Offsets come from the splitter
+    (start_char or start_index), falling back to the chunk's ordinal on its page.
+    """
+    ids = []
+    ordinals: Dict[tuple, int] = {}
+    for doc in docs:
+        source = str(doc.metadata.get("source", ""))
+        page = doc.metadata.get("page", "")
+        ordinal = ordinals.get((source, page), 0)
+        ordinals[(source, page)] = ordinal + 1
+
+        offset = doc.metadata.get("start_char", doc.metadata.get("start_index"))
+        if offset is None or offset < 0:
+            offset = f"n{ordinal}"
+        source_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+        chunk_id = f"{source_hash}-{page}:{offset}-{text_hash(doc.page_content)[:16]}"
+        doc.metadata["chunk_id"] = chunk_id
+        ids.append(chunk_id)
+    return ids
+
+
+def rewrite_sources(store, sources: Dict[str, str], keyword_index: Optional[BM25Index] = None) -> int:
+    """
+    Point chunks stored under old source paths at new ones, in place.
+
+    Only the "source" metadata changes: chunk ids, vectors and postings are
+    kept, so a hardlinked clone keeps sharing its vector files. Chroma
+    updates the metadata in its collection, the NumPy and compact stores in
+    their side tables.
+
+    Args:
+        store: Vector store holding the chunks
+        sources: Old source path -> new source path
+        keyword_index: BM25Index of the same chunks, if any
+
+    Returns:
+        int: Number of chunks rewritten
+    """
+    rewritten = 0
+    for old_source, new_source in sources.items():
+        stored = store.get(where={"source": old_source}, include=["documents", "metadatas"])
+        if not stored["ids"]:
+            continue
+        metadatas = [{**(metadata or {}), "source": new_source} for metadata in stored["metadatas"]]
+        if hasattr(store, "update_metadatas"):
+            store.update_metadatas(stored["ids"], metadatas)
+        else:
+            store._collection.update(ids=stored["ids"], metadatas=metadatas)
+        if keyword_index is not None:
+            keys = [
+                chunk_key(Document(page_content=text, metadata=metadata))
+                for text, metadata in zip(stored["documents"], metadatas)
+            ]
+            keyword_index.update_metadatas(keys, metadatas)
+        rewritten += len(stored["ids"])
+    if rewritten:
+        store.persist()
+    logging.info(f"Rewrote the source of {rewritten} chunks from {len(sources)} documents")
+    return rewritten
+
+
+def _chunk_slot(chunk_id: str) -> str:
+    return chunk_id.rsplit("-", 1)[0]
+
+
+def metadata_filter(
+    sources: Optional[Iterable[str]] = None,
+    pages: Optional[Tuple[Optional[int], Optional[int]]] = None,
+    known_sources: Optional[Iterable[str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Chroma-style metadata filter restricting a search to sources and a page range.
+
+    Every backend accepts the result as the "filter" search argument and
+    applies it before vector scoring: Chroma and the NumPy store through
+    their SQLite metadata indexes, the keyword index through its
+    (source, page) index.
+
+    Args:
+        sources: Source documents to search, by stored path or file name
+        pages: (first, last) page range, 1-based and inclusive; either end may be None
+        known_sources: Stored sources of the pipeline, used to resolve file names
+
+    Returns:
+        The filter, or None when nothing is restricted
+    """
+    conditions = []
+    if sources:
+        known_sources = list(known_sources or [])
+        resolved = []
+        for source in sources:
+            matches = [
+                known for known in known_sources
+                if known == source or os.path.basename(known).lower() == os.path.basename(source).lower()
+            ]
+            resolved.extend(matches or [source])
+        resolved = list(dict.fromkeys(resolved))
+        conditions.append({"source": resolved[0]} if len(resolved) == 1 else {"source": {"$in": resolved}})
+    if pages:
+        # Loaders number pages from 0
+        first, last = pages
+        if first is not None:
+            conditions.append({"page": {"$gte": int(first) - 1}})
+        if last is not None:
+            conditions.append({"page": {"$lte": int(last) - 1}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def upsert_documents(
+    store,
+    docs: List,
+    deduplicate: Optional[Callable[[List, List[str]], List]] = None,
+    keyword_index: Optional[BM25Index] = None
+) -> Dict[str, int]:
+    """
+    Sync a store with freshly split versions of whole documents.
+
+    Chunks whose id is already stored are skipped, chunks whose text changed
+    replace the old chunk in their slot, and stored chunks of the same sources
+    that no longer appear are removed. Only added and changed chunks are
+    embedded, so re-syncing costs work proportional to what changed.
+
+    Args:
+        store: Vector store of any backend
+        docs: Every chunk of the documents being synced
+        deduplicate: Optional filter called with (new chunks, ids being removed)
+        keyword_index: Optional BM25Index kept in step with the store
+
+    Returns:
+        Dict with added, updated, unchanged, removed and duplicate counts
+    """
+    ids = assign_chunk_ids(docs)
+    id_set = set(ids)
+    existing = set()
+    for source in {doc.metadata.get("source") for doc in docs}:
+        existing.update(store.get(where={"source": source})["ids"])
+
+    new_docs, seen = [], set()
+    for doc, chunk_id in zip(docs, ids):
+        if chunk_id in existing or chunk_id in seen:
+            continue
+        seen.add(chunk_id)
+        new_docs.append(doc)
+
+    stale = list(existing - id_set)
+    duplicates = 0
+    if deduplicate is not None:
+        kept = deduplicate(new_docs, stale)
+        duplicates = len(new_docs) - len(kept)
+        new_docs = kept
+
+    # Counted from the chunks actually stored, after near-duplicates were dropped
+    stale_slots = {_chunk_slot(chunk_id) for chunk_id in stale}
+    new_slots = {_chunk_slot(doc.metadata["chunk_id"]) for doc in new_docs}
+    counts = {
+        "added": sum(_chunk_slot(doc.metadata["chunk_id"]) not in stale_slots for doc in new_docs),
+        "updated": len(new_slots & stale_slots),
+        "unchanged": len(id_set & existing),
+        "removed": sum(_chunk_slot(chunk_id) not in new_slots for chunk_id in stale),
+        "duplicates": duplicates,
+    }
+    if stale:
+        store.delete(ids=stale)
+    if new_docs:
+        store.add_documents(new_docs, ids=[doc.metadata["chunk_id"] for doc in new_docs])
+    if stale or new_docs:
+        store.persist()
+    if keyword_index is not None:
+        keyword_index.delete(stale)
+        keyword_index.add(new_docs)
+    logging.info(f"Upserted {len(docs)} chunks: {counts}")
+    return counts
 
 
 class DataBase:
     """Handles vector database operations while maintaining existing structure"""
 
-    def __init__(self):
+    def __init__(self, data_base_config: Optional[DataBaseConfig] = None):
         """Initialize database with configuration"""
-        self.data_base = DataBaseConfig()
+        self.data_base = data_base_config or DataBaseConfig()
+        self.deduplicator = MinHashDeduplicator()
+        self.last_add_counts: Dict[str, int] = {}
+        self.backends = build_backends(self.data_base)
+        if self.data_base.vector_storage not in self.backends:
+            raise CustomException(ValueError(f"Unknown vector storage: {self.data_base.vector_storage}"), sys)
+        if self.data_base.storage_layout == "shared" and self.data_base.vector_storage != "chroma":
+            raise CustomException(ValueError("The shared storage layout only supports Chroma storage"), sys)
         os.makedirs(self.data_base.PERSIST_DIR, exist_ok=True)
         logging.info(f"Initialized database with persist directory: {self.data_base.PERSIST_DIR}")
 
+    def _with_query_cache(self, embeddings):
+        """Wrap an embedding model so repeated queries skip the encoder."""
+        if embeddings is None or self.data_base.query_cache_size <= 0:
+            return embeddings
+        return QueryCachedEmbeddings(
+            embeddings,
+            get_query_cache(self.data_base),
+            self.data_base.query_cache_case_insensitive
+        )
+
+    def query_cache_stats(self) -> dict:
+        """Size, hit rate and eviction counters of the query embedding cache."""
+        return get_query_cache(self.data_base).stats()
+
+    def store_pool_stats(self) -> dict:
+        """Open stores and open/hit/eviction counters of the store pool."""
+        return get_store_pool(self.data_base).stats()
+
+    @staticmethod
+    def _log_embedding_cache_stats(embeddings, pipeline_id: int) -> None:
+        """Log the embedding cache hit ratio of the ingestion just completed."""
+        stats = getattr(embeddings, "last_stats", None)
+        if stats:
+            logging.info(
+                f"Embedding cache hit ratio for pipeline {pipeline_id}: "
+                f"{stats['hit_ratio']:.2%} ({stats['hits']}/{stats['chunks']} chunks)"
+            )
+
+    @property
+    def shared(self) -> bool:
+        return self.data_base.storage_layout == "shared"
+
+    def _shared_store(self, pipeline_id: int, embeddings):
+        return Chroma(
+            collection_name=collection_name(pipeline_id),
+            client=get_shared_client(self.data_base.SHARED_DIR),
+            persist_directory=self.data_base.SHARED_DIR,
+            embedding_function=embeddings,
+            collection_metadata={"pipeline_id": str(pipeline_id)}
+        )
+
+    def _empty_store(self, pipeline_id: int, embeddings):
+        """New store for a pipeline, in the configured layout and storage format."""
+        if self.shared:
+            return self._shared_store(pipeline_id, embeddings)
+        backend = self.backends[self.data_base.vector_storage]
+        return backend.create(self.get_persist_dir(pipeline_id), embeddings)
+
+    def _open_store(self, pipeline_id: int, embeddings):
+        """Existing store of a pipeline, in whichever format it was created."""
+        if self.shared:
+            return self._shared_store(pipeline_id, embeddings)
+        persist_path = self.get_persist_dir(pipeline_id)
+        return detect_backend(persist_path, self.backends).open(persist_path, embeddings)
+
+    def _pool_location(self, pipeline_id: int) -> str:
+        if self.shared:
+            return f"{self.data_base.SHARED_DIR}#{collection_name(pipeline_id)}"
+        return self.get_persist_dir(pipeline_id)
+
+    def _pool_footprint(self) -> Optional[Callable[[Any], Tuple[int, int]]]:
+        return _collection_footprint if self.shared else None
+
     def get_persist_dir(self, pipeline_id: int) -> str:
         """
         Get the persistence directory for a specific pipeline
 
+        In the shared layout the vectors live in a collection of the shared
+        store, and this directory only holds the pipeline's side state.
+
         Args:
             pipeline_id: Unique identifier for the pipeline
 
         Returns:
-            str: Full path for the pipeline's storage
+            str: Full path for the pipeline's storage, which may not exist yet
         """
-        logging.info(f"Creating persistent path for pipeline {pipeline_id}")
-        persist_path = os.path.join(self.data_base.PERSIST_DIR, str(pipeline_id))
-        os.makedirs(persist_path, exist_ok=True)
-        return persist_path
+        if self.shared:
+            return os.path.join(self.data_base.SHARED_DIR, "pipelines", str(pipeline_id))
+        return os.path.join(self.data_base.PERSIST_DIR, str(pipeline_id))
 
     def create_database(self, pipeline_id: int, docs, embeddings: Optional[HuggingFaceEmbeddings]):
         """
@@ -53,21 +625,27 @@ class DataBase:
             embeddings: Embedding model (optional)
 
         Returns:
-            Chroma: Initialized vector store
+            VectorStore: Initialized store of the configured backend
 
         Raises:
             CustomException: If database creation fails
         """
         try:
             final_path = self.get_persist_dir(pipeline_id)
+            os.makedirs(final_path, exist_ok=True)
+            assign_chunk_ids(docs)
+            docs = self.deduplicator.deduplicate(final_path, docs, reset=True)
 
-            logging.info("Creating the database")
-            vectorstore = Chroma.from_documents(
-                documents=docs,
-                embedding=embeddings,
-                persist_directory=final_path
-            )
+            logging.info(f"Creating the database ({self.data_base.vector_storage} storage)")
+            vectorstore = self._empty_store(pipeline_id, self._with_query_cache(embeddings))
+            vectorstore.add_documents(docs, ids=[doc.metadata["chunk_id"] for doc in docs])
             vectorstore.persist()
+            if self.data_base.keyword_index:
+                _get_keyword_index(final_path).rebuild(docs)
+            get_store_pool(self.data_base).put(
+                self._pool_location(pipeline_id), _embedding_namespace(embeddings), vectorstore, self._pool_footprint()
+            )
+            self._log_embedding_cache_stats(embeddings, pipeline_id)
             logging.info(f"Database creation complete for pipeline {pipeline_id}")
             return vectorstore
 
@@ -75,6 +653,109 @@ class DataBase:
             logging.error(f"Error in database creation: {str(e)}")
             raise CustomException(e, sys)
 
+    def ingest_stream(self, pipeline_id: int, chunk_batches: Iterable[List], embeddings: Optional[HuggingFaceEmbeddings]):
+        """
+        Insert chunk batches into a pipeline's store as they are produced
+
+        Parsing and splitting run on a producer thread that feeds a bounded
+        queue; this thread embeds and inserts one batch at a time and persists
+        after each, so the first chunks are searchable before the last page
+        is parsed and at most stream_queue_size batches are held in memory.
+
+        Args:
+            pipeline_id: Unique identifier for the pipeline
+            chunk_batches: Iterable of document chunk lists, e.g. DataTransformation.iter_chunks
+            embeddings: Embedding model (optional)
+
+        Returns:
+            VectorStore: Vector store holding the ingested chunks
+
+        Raises:
+            CustomException: If parsing, embedding or insertion fails
+        """
+        try:
+            persist_path = self.get_persist_dir(pipeline_id)
+            os.makedirs(persist_path, exist_ok=True)
+            store = self._empty_store(pipeline_id, self._with_query_cache(embeddings))
+            keyword_index = _get_keyword_index(persist_path) if self.data_base.keyword_index else None
+            if keyword_index is not None:
+                keyword_index.rebuild([])
+            batches: "queue.Queue" = queue.Queue(maxsize=self.data_base.stream_queue_size)
+            done = object()
+            stop = threading.Event()
+            errors = []
+
+            def put(item) -> bool:
+                # Gives up once the consumer has stopped, instead of blocking on a full queue
+                while not stop.is_set():
+                    try:
+                        batches.put(item, timeout=0.1)
+                        return True
+                    except queue.Full:
+                        continue
+                return False
+
+            def produce():
+                try:
+                    for batch in chunk_batches:
+                        if not put(batch):
+                            break
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    # Closes the parser generator, and with it the PDF
+                    if hasattr(chunk_batches, "close"):
+                        chunk_batches.close()
+                    put(done)
+
+            producer = threading.Thread(target=produce, name=f"ingest-{pipeline_id}", daemon=True)
+            producer.start()
+
+            inserted = 0
+            first_batch = True
+            try:
+                while True:
+                    batch = batches.get()
+                    if batch is done:
+                        break
+                    assign_chunk_ids(batch)
+                    batch = self.deduplicator.deduplicate(persist_path, batch, reset=first_batch)
+                    first_batch = False
+                    if not batch:
+                        continue
+                    store.add_documents(batch, ids=[doc.metadata["chunk_id"] for doc in batch])
+                    store.persist()
+                    if keyword_index is not None:
+                        keyword_index.add(batch)
+                    inserted += len(batch)
+                    logging.info(f"Streamed {inserted} chunks into pipeline {pipeline_id}")
+            finally:
+                stop.set()
+                while True:
+                    try:
+                        batches.get_nowait()
+                    except queue.Empty:
+                        break
+                producer.join()
+
+            if errors:
+                raise errors[0]
+            get_store_pool(self.data_base).put(
+                self._pool_location(pipeline_id), _embedding_namespace(embeddings), store, self._pool_footprint()
+            )
+            if hasattr(embeddings, "hits") and inserted:
+                # The batches above each logged their own ratio, report the total
+                logging.info(
+                    f"Embedding cache hit ratio for pipeline {pipeline_id}: "
+                    f"{embeddings.hits / (embeddings.hits + embeddings.misses):.2%}"
+                )
+            logging.info(f"Streaming ingestion complete for pipeline {pipeline_id}: {inserted} chunks")
+            return store
+
+        except Exception as e:
+            logging.error(f"Error in streaming ingestion: {str(e)}")
+            raise CustomException(e, sys)
+
     def load_database(self, pipeline_id: int, embeddings: Optional[HuggingFaceEmbeddings]):
         """
         Load an existing vector database
@@ -84,7 +765,7 @@ class DataBase:
             embeddings: Embedding model (optional)
 
         Returns:
-            Chroma: Loaded vector store
+            VectorStore: Loaded store of the backend the pipeline was created with
 
         Raises:
             CustomException: If database loading fails
@@ -92,12 +773,15 @@ class DataBase:
         """
         try:
             persist_path = self.get_persist_dir(pipeline_id)
-
+            if not os.path.isdir(persist_path):
+                raise FileNotFoundError(f"No database found for pipeline {pipeline_id} at {persist_path}")
 
             logging.info(f"Loading database for pipeline {pipeline_id}")
-            vector_store = Chroma(
-                persist_directory=persist_path,
-                embedding_function=embeddings
+            vector_store = get_store_pool(self.data_base).get(
+                self._pool_location(pipeline_id),
+                _embedding_namespace(embeddings),
+                lambda: self._open_store(pipeline_id, self._with_query_cache(embeddings)),
+                self._pool_footprint()
             )
             logging.info("Database loaded successfully")
             return vector_store
@@ -106,28 +790,92 @@ class DataBase:
             logging.error(f"Error in database loading: {str(e)}")
             raise CustomException(e, sys)
 
+    def load_keyword_index(self, pipeline_id: int, store=None) -> Optional[BM25Index]:
+        """
+        Open a pipeline's BM25 index, building it from the store if it predates keyword indexing
+
+        Args:
+            pipeline_id: Unique identifier for the pipeline
+            store: The pipeline's vector store, read to backfill a missing index
+
+        Returns:
+            BM25Index, or None when keyword indexing is disabled or nothing can be indexed
+        """
+        if not self.data_base.keyword_index:
+            return None
+        persist_path = self.get_persist_dir(pipeline_id)
+        if BM25Index.exists(persist_path):
+            return _get_keyword_index(persist_path)
+        if store is None or not os.path.isdir(persist_path):
+            return None
+
+        stored = store.get(include=["documents", "metadatas"])
+        docs = [
+            Document(page_content=text, metadata={**(metadata or {}), "chunk_id": (metadata or {}).get("chunk_id", chunk_id)})
+            for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        ]
+        keyword_index = _get_keyword_index(persist_path)
+        keyword_index.rebuild(docs)
+        return keyword_index
+
+    def list_sources(self, pipeline_id: int, store=None) -> List[str]:
+        """
+        Distinct sources stored in a pipeline
+
+        Read from the keyword index's source index when there is one,
+        otherwise from the metadata of the store.
+
+        Args:
+            pipeline_id: Unique identifier for the pipeline
+            store: The pipeline's vector store, read when there is no keyword index
+
+        Returns:
+            List of stored source paths
+        """
+        persist_path = self.get_persist_dir(pipeline_id)
+        if self.data_base.keyword_index and BM25Index.exists(persist_path):
+            return _get_keyword_index(persist_path).sources()
+        if store is None:
+            return []
+        stored = store.get(include=["metadatas"])
+        return sorted({metadata["source"] for metadata in stored["metadatas"] if metadata and metadata.get("source")})
+
     def add_data(self, additional_docs, pipeline_id: int, embeddings: Optional[HuggingFaceEmbeddings]):
         """
-        Add new documents to existing database
+        Add or re-sync documents in an existing database
+
+        Chunks get deterministic ids, so uploading a document again only
+        embeds the chunks that changed; see upsert_documents.
 
         Args:
-            additional_docs: New documents to add
+            additional_docs: Every chunk of the documents to add or re-sync
             pipeline_id: Unique identifier for the pipeline
             embeddings: Embedding model (optional)
 
         Returns:
-            Chroma: Updated vector store
+            Updated vector store; the added/updated/unchanged/removed/duplicates
+            counts of the sync are kept in last_add_counts
 
         Raises:
             CustomException: If data addition fails
         """
         try:
             store = self.load_database(pipeline_id, embeddings)
+            persist_path = self.get_persist_dir(pipeline_id)
             logging.info(f"Adding new documents to pipeline {pipeline_id}")
 
-            store.add_documents(additional_docs)
-            store.persist()  # Ensure changes are persisted
-            logging.info("Data addition successful")
+            counts = upsert_documents(
+                store,
+                additional_docs,
+                lambda docs, removed_ids: self.deduplicator.deduplicate(
+                    persist_path, docs, removed_ids=removed_ids
+                ),
+                self.load_keyword_index(pipeline_id, store)
+            )
+            if counts["added"] or counts["updated"]:
+                self._log_embedding_cache_stats(embeddings, pipeline_id)
+            logging.info(f"Data addition successful for pipeline {pipeline_id}: {counts}")
+            self.last_add_counts = counts
 
             return store
 
@@ -135,6 +883,71 @@ class DataBase:
             logging.error(f"Error in adding data: {str(e)}")
             raise CustomException(e, sys)
 
+    def clone_database(self, source_id: int, pipeline_id: int) -> Dict[str, int]:
+        """
+        Create a pipeline's database as a copy of another's, without re-embedding
+
+        In the per-pipeline layout the store directory is cloned by its
+        backend: files that are only ever replaced whole are hardlinked, and
+        SQLite files and Chroma's in-place segments are copied. In the shared
+        layout the stored vectors are copied into a new collection. The
+        keyword index and deduplication state are cloned alongside.
+
+        Args:
+            source_id: Pipeline to copy
+            pipeline_id: Identifier of the new pipeline
+
+        Returns:
+            Dict with the number of files linked and copied, and the bytes copied
+
+        Raises:
+            CustomException: If the source is missing, the target exists or the copy fails
+        """
+        try:
+            source_path = self.get_persist_dir(source_id)
+            target_path = self.get_persist_dir(pipeline_id)
+            if not os.path.isdir(source_path):
+                raise FileNotFoundError(f"No database found for pipeline {source_id} at {source_path}")
+            if os.path.exists(target_path):
+                raise FileExistsError(f"A database already exists for pipeline {pipeline_id} at {target_path}")
+
+            if self.shared:
+                stats = clone_directory(source_path, target_path)
+                stats["chunks"] = copy_collection(
+                    self._shared_store(source_id, None), self._shared_store(pipeline_id, None)
+                )
+            else:
+                backend = detect_backend(source_path, self.backends)
+                stats = backend.clone(source_path, target_path)
+            logging.info(f"Cloned database of pipeline {source_id} to pipeline {pipeline_id}: {stats}")
+            return stats
+
+        except Exception as e:
+            logging.error(f"Error in cloning database: {str(e)}")
+            raise CustomException(e, sys)
+
+    def rewrite_sources(self, pipeline_id: int, store, sources: Dict[str, str]) -> int:
+        """
+        Point a pipeline's chunks at moved source documents
+
+        Used after a clone, whose chunks still name the documents of the
+        pipeline they were copied from. The keyword index is updated alike.
+
+        Args:
+            pipeline_id: Unique identifier for the pipeline
+            store: The pipeline's vector store
+            sources: Old source path -> new source path
+
+        Returns:
+            int: Number of chunks rewritten
+        """
+        try:
+            return rewrite_sources(store, sources, self.load_keyword_index(pipeline_id, store))
+
+        except Exception as e:
+            logging.error(f"Error in rewriting sources: {str(e)}")
+            raise CustomException(e, sys)
+
     def remove_database(self, pipeline_id: int) -> bool:
         """
         Remove a database and its files
@@ -155,6 +968,10 @@ class DataBase:
                 logging.warning(f"No database found at {persist_path}")
                 return False
 
+            get_store_pool(self.data_base).discard(self._pool_location(pipeline_id))
+            _drop_keyword_index(persist_path)
+            if self.shared:
+                self._shared_store(pipeline_id, None).delete_collection()
             shutil.rmtree(persist_path)
             logging.info(f"Successfully removed database for pipeline {pipeline_id}")
             return True
@@ -0,0 +1,238 @@
+import hashlib
+import os
+import sqlite3
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.components.embedding_cache import normalize_text
+from src.logger import logging
+from src.exception import CustomException
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+@dataclass
+class DeduplicationConfig:
+    enabled: bool = True
+    threshold: float = 0.85  # Estimated Jaccard similarity at which a chunk is dropped
+    num_perm: int = 128  # MinHash signature length
+    bands: int = 32  # LSH bands; num_perm / bands rows per band
+    shingle_size: int = 5  # Words per shingle
+    seed: int = 1
+    state_file: str = "minhash_signatures.sqlite"  # Kept in the pipeline's persist directory
+
+
+class MinHashDeduplicator:
+    """
+    Drops chunks that are near-duplicates of chunks already kept.
+
+    Each chunk gets a MinHash signature over its word shingles; LSH banding
+    finds candidate matches in roughly constant time, and a candidate whose
+    estimated Jaccard similarity reaches the threshold causes the chunk to be
+    dropped. Signatures of a pipeline's kept chunks and their band index are
+    persisted next to its vector store, keyed by chunk id, so later additions
+    are checked across documents too and chunks removed from the store stop
+    matching.
+    """
+
+    def __init__(self, config: Optional[DeduplicationConfig] = None):
+        self.config = config or DeduplicationConfig()
+        if self.config.num_perm % self.config.bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.rows = self.config.num_perm // self.config.bands
+        rng = np.random.RandomState(self.config.seed)
+        self._a = rng.randint(1, np.int64(_MERSENNE_PRIME), size=self.config.num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, np.int64(_MERSENNE_PRIME), size=self.config.num_perm, dtype=np.int64).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text's word shingles."""
+        words = normalize_text(text).lower().split()
+        size = self.config.shingle_size
+        shingles = {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+             for shingle in shingles],
+            dtype=np.uint64
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[int]:
+        """One 63-bit key per LSH band, as stored in the band index."""
+        return [
+            int.from_bytes(
+                hashlib.blake2b(
+                    bytes([band]) + signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8
+                ).digest(),
+                "little"
+            ) >> 1
+            for band in range(self.config.bands)
+        ]
+
+    def filter(self, docs: List, existing: Optional[np.ndarray] = None) -> Tuple[List, np.ndarray, int]:
+        """
+        Remove near-duplicate chunks, within `docs` and against `existing`.
+
+        Args:
+            docs: Document chunks in insertion order; the first copy is kept
+            existing: Signatures of chunks already stored, shape (n, num_perm)
+
+        Returns:
+            Tuple of (kept documents, their signatures, number dropped)
+        """
+        try:
+            buckets: Dict[int, List[int]] = {}
+            signatures: List[np.ndarray] = list(existing) if existing is not None else []
+            for index, signature in enumerate(signatures):
+                for key in self._band_keys(signature):
+                    buckets.setdefault(key, []).append(index)
+
+            kept, kept_signatures = [], []
+            for doc in docs:
+                signature = self.signature(doc.page_content)
+                keys = self._band_keys(signature)
+                candidates = {index for key in keys for index in buckets.get(key, ())}
+                if any(np.mean(signatures[index] == signature) >= self.config.threshold for index in candidates):
+                    continue
+
+                for key in keys:
+                    buckets.setdefault(key, []).append(len(signatures))
+                signatures.append(signature)
+                kept.append(doc)
+                kept_signatures.append(signature)
+
+            new_signatures = (
+                np.vstack(kept_signatures) if kept_signatures
+                else np.zeros((0, self.config.num_perm), dtype=np.uint64)
+            )
+            return kept, new_signatures, len(docs) - len(kept)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _connect(self, persist_path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            os.path.join(persist_path, self.config.state_file), timeout=60, isolation_level=None
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures (row INTEGER PRIMARY KEY, id TEXT NOT NULL, signature BLOB NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS signatures_id ON signatures (id)")
+        # Rows of deleted signatures are left in the band index and skipped by the join
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, row INTEGER NOT NULL, "
+            "PRIMARY KEY (key, row)) WITHOUT ROWID"
+        )
+        # Dropped chunks and the signature row they matched, so a re-sync drops them without hashing
+        conn.execute("CREATE TABLE IF NOT EXISTS duplicates (id TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        return conn
+
+    def _candidates(self, conn: sqlite3.Connection, keys: List[int]) -> List[Tuple[int, np.ndarray]]:
+        placeholders = ",".join("?" * len(keys))
+        return [
+            (row, np.frombuffer(blob, dtype=np.uint32)) for row, blob in conn.execute(
+                f"SELECT s.row, s.signature FROM signatures s WHERE s.row IN "
+                f"(SELECT DISTINCT row FROM bands WHERE key IN ({placeholders}))",
+                keys
+            )
+        ]
+
+    @staticmethod
+    def _known_duplicates(conn: sqlite3.Connection, ids: List[str]) -> set:
+        """Ids dropped by an earlier call whose matching chunk is still stored."""
+        known = set()
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            known.update(row[0] for row in conn.execute(
+                f"SELECT d.id FROM duplicates d JOIN signatures s ON s.row = d.row "
+                f"WHERE d.id IN ({','.join('?' * len(batch))})",
+                batch
+            ))
+        return known
+
+    def deduplicate(
+        self, persist_path: str, docs: List, reset: bool = False, removed_ids: Iterable[str] = ()
+    ) -> List:
+        """
+        Filter chunks against a pipeline's stored signatures and record the kept ones.
+
+        Signatures and their LSH band index live in a SQLite file in the
+        persist directory, so a call only reads the buckets of its own chunks.
+        Dropped chunk ids are remembered with the chunk they matched, so
+        syncing the same document again drops them without hashing, until
+        that chunk is removed. The whole call is one immediate transaction,
+        which serialises concurrent additions to a pipeline, across processes
+        too.
+
+        Args:
+            persist_path: Persist directory of the pipeline
+            docs: Document chunks about to be embedded, with a chunk_id in their metadata
+            reset: Ignore stored signatures (used when the store is recreated)
+            removed_ids: Ids of chunks being deleted from the store, forgotten first
+
+        Returns:
+            List of chunks to embed and store
+        """
+        removed_ids = list(removed_ids)
+        if not self.config.enabled or not (docs or removed_ids or reset):
+            return docs
+        conn = self._connect(persist_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if reset:
+                conn.execute("DELETE FROM signatures")
+                conn.execute("DELETE FROM bands")
+                conn.execute("DELETE FROM duplicates")
+            for start in range(0, len(removed_ids), 500):
+                batch = removed_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                # Row numbers may be reused, so forget the duplicates of removed chunks first
+                conn.execute(
+                    f"DELETE FROM duplicates WHERE row IN (SELECT row FROM signatures WHERE id IN ({placeholders}))",
+                    batch
+                )
+                conn.execute(f"DELETE FROM signatures WHERE id IN ({placeholders})", batch)
+
+            known = self._known_duplicates(
+                conn, [doc.metadata["chunk_id"] for doc in docs if doc.metadata.get("chunk_id")]
+            )
+            kept = []
+            for doc in docs:
+                chunk_id = doc.metadata.get("chunk_id", "")
+                if chunk_id in known:
+                    continue
+                signature = self.signature(doc.page_content).astype(np.uint32)
+                keys = self._band_keys(signature)
+                match = next(
+                    (row for row, candidate in self._candidates(conn, keys)
+                     if np.mean(candidate == signature) >= self.config.threshold),
+                    None
+                )
+                if match is not None:
+                    if chunk_id:
+                        conn.execute("INSERT OR REPLACE INTO duplicates VALUES (?, ?)", (chunk_id, match))
+                    continue
+                row = conn.execute(
+                    "INSERT INTO signatures (id, signature) VALUES (?, ?)",
+                    (chunk_id, signature.tobytes())
+                ).lastrowid
+                conn.executemany("INSERT OR IGNORE INTO bands VALUES (?, ?)", [(key, row) for key in keys])
+                kept.append(doc)
+            conn.execute("COMMIT")
+
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise CustomException(e, sys)
+        finally:
+            conn.close()
+
+        logging.info(
+            f"Near-duplicate filter dropped {len(docs) - len(kept)}/{len(docs)} chunks "
+            f"(threshold {self.config.threshold})"
+        )
+        return kept
@@ -0,0 +1,276 @@
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from src.logger import logging
+from src.exception import CustomException
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so re-extracted copies of a chunk hash the same."""
+    return " ".join(text.split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed, content-addressed store of chunk vectors for one embedding model.
+
+    Vectors are appended to a flat float32 file that is read through a
+    memory map; a SQLite table maps each normalized text hash to its row.
+    Appends run inside an immediate SQLite transaction, which doubles as a
+    cross-process write lock for the vector file.
+    """
+
+    def __init__(self, namespace: str, cache_dir: str):
+        self.namespace = namespace
+        self.cache_path = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", namespace))
+        os.makedirs(self.cache_path, exist_ok=True)
+        self.vectors_path = os.path.join(self.cache_path, "vectors.f32")
+        self.index_path = os.path.join(self.cache_path, "index.sqlite")
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (hash TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+        self._mmap = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def _vectors(self, min_rows: int) -> np.ndarray:
+        """Memory map of the vector file, re-mapped when it has grown."""
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            rows = os.path.getsize(self.vectors_path) // (self.dim * 4)
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._mmap
+
+    def _lookup(self, hashes: Sequence[str]) -> Dict[str, int]:
+        rows = {}
+        unique = list(set(hashes))
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows.update(self._conn.execute(
+                f"SELECT hash, row FROM vectors WHERE hash IN ({placeholders})", batch
+            ).fetchall())
+        return rows
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Return the cached vectors for whichever hashes are present."""
+        if not hashes or self.dim is None:
+            return {}
+        with self._lock:
+            rows = self._lookup(hashes)
+            if not rows:
+                return {}
+            vectors = self._vectors(max(rows.values()) + 1)
+            return {key: np.array(vectors[row]) for key, row in rows.items()}
+
+    def put_many(self, hashes: Sequence[str], vectors: np.ndarray) -> None:
+        """Append vectors for new hashes; hashes already stored are skipped."""
+        if not len(hashes):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.dim is None:
+                    self.dim = int(vectors.shape[1])
+                    self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+                elif vectors.shape[1] != self.dim:
+                    raise ValueError(f"Vector dim {vectors.shape[1]} does not match cache dim {self.dim}")
+
+                existing = self._lookup(hashes)
+                keep = [i for i, key in enumerate(hashes) if key not in existing]
+                if keep:
+                    row_bytes = self.dim * 4
+                    size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+                    start_row = size // row_bytes
+                    with open(self.vectors_path, "ab") as file:
+                        # Drop a partial row left by an interrupted write
+                        file.truncate(start_row * row_bytes)
+                        file.write(vectors[keep].tobytes())
+                    self._conn.executemany(
+                        "INSERT INTO vectors VALUES (?, ?)",
+                        [(hashes[i], start_row + offset) for offset, i in enumerate(keep)]
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document vectors from an EmbeddingCache.
+
+    Only chunks whose normalized text has never been embedded by this model
+    reach the underlying model. Query embeddings pass straight through.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = getattr(embeddings, "model_name", cache.namespace)
+        self.cache_namespace = cache.namespace
+        self.hits = 0
+        self.misses = 0
+        self.last_stats: Dict[str, float] = {}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        try:
+            hashes = [text_hash(text) for text in texts]
+            found = self.cache.get_many(hashes)
+
+            missing: Dict[str, str] = {}
+            for key, text in zip(hashes, texts):
+                if key not in found and key not in missing:
+                    missing[key] = text
+            if missing:
+                new_vectors = np.asarray(
+                    self.embeddings.embed_documents(list(missing.values())), dtype=np.float32
+                )
+                self.cache.put_many(list(missing.keys()), new_vectors)
+                found.update(zip(missing.keys(), new_vectors))
+
+            served = len(texts) - len(missing)
+            self.hits += served
+            self.misses += len(missing)
+            self.last_stats = {
+                "chunks": len(texts),
+                "hits": served,
+                "misses": len(missing),
+                "hit_ratio": served / len(texts) if texts else 0.0,
+            }
+            logging.info(f"Embedding cache for {self.model_name}: {self.last_stats}")
+            return [found[key].tolist() for key in hashes]
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+def normalize_query(text: str, case_insensitive: bool = False) -> str:
+    """Whitespace-collapse (and optionally case-fold) a query for cache lookup."""
+    text = normalize_text(text)
+    return text.casefold() if case_insensitive else text
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache of query vectors with a time-to-live.
+
+    Keys combine the embedding model namespace with the normalized query,
+    so one cache can serve every pipeline and model in the process.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[float] = 3600.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, vector = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: Tuple[str, str], vector: List[float]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper serving repeated queries from a QueryEmbeddingCache.
+
+    The text embedded is the normalized text of the cache key, so a query's
+    vector never depends on which spelling of it was cached first.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: QueryEmbeddingCache, case_insensitive: bool = False):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.case_insensitive = case_insensitive
+        self.namespace = getattr(
+            embeddings, "cache_namespace", getattr(embeddings, "model_name", type(embeddings).__name__)
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = (self.namespace, normalize_query(text, self.case_insensitive))
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(key[1])
+            self.cache.put(key, vector)
+        return vector
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(namespace: str, cache_dir: str) -> EmbeddingCache:
+    """Get the process-wide EmbeddingCache for a namespace."""
+    key = os.path.join(cache_dir, namespace)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(namespace, cache_dir)
+        return _caches[key]
@@ -0,0 +1,122 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain.schema import BaseRetriever, Document
+
+from src.components.embedding_cache import text_hash
+from src.logger import logging
+
+
+@dataclass
+class HybridRetrieverConfig:
+    enabled: bool = True
+    fetch_k: int = 8  # Candidates taken from each of the dense and keyword searches
+    rrf_k: int = 60  # Reciprocal rank fusion constant
+    dense_weight: float = 1.0
+    keyword_weight: float = 1.0
+
+
+# Shared by every hybrid retriever in the process; searches are I/O and BLAS bound
+_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-search")
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing dense vector search with BM25 keyword search.
+
+    Both searches run concurrently for fetch_k candidates each, and the two
+    rankings are merged in one pass with reciprocal rank fusion: a chunk
+    scores weight / (rrf_k + rank) per list it appears in. A "filter" in
+    search_kwargs restricts both searches. Timings of the last query are
+    kept in last_timings.
+    """
+
+    vectorstore: Any
+    keyword_index: Any
+    k: int = 2
+    search_kwargs: Dict[str, Any] = {}
+    fusion_config: Any = None
+    last_timings: Dict[str, float] = {}
+
+    def _timed(self, search, *args, **kwargs):
+        start = time.perf_counter()
+        result = search(*args, **kwargs)
+        return result, 1000 * (time.perf_counter() - start)
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        config = self.fusion_config or HybridRetrieverConfig()
+        start = time.perf_counter()
+        dense_kwargs = {key: value for key, value in self.search_kwargs.items() if key != "k"}
+        dense = _search_executor.submit(
+            self._timed, self.vectorstore.similarity_search, query, k=max(config.fetch_k, self.k), **dense_kwargs
+        )
+        keyword = _search_executor.submit(
+            self._timed, self.keyword_index.search, query, max(config.fetch_k, self.k),
+            where=self.search_kwargs.get("filter")
+        )
+        dense_docs, dense_ms = dense.result()
+        keyword_hits, keyword_ms = keyword.result()
+
+        fusion_start = time.perf_counter()
+        scores: Dict[str, float] = {}
+        docs: Dict[str, Document] = {}
+        ranked = (
+            (config.dense_weight, dense_docs),
+            (config.keyword_weight, [doc for doc, _ in keyword_hits]),
+        )
+        for weight, ranking in ranked:
+            for rank, doc in enumerate(ranking, start=1):
+                # Keyed by text, since stores created before chunk ids carry none in metadata
+                key = text_hash(doc.page_content)
+                scores[key] = scores.get(key, 0.0) + weight / (config.rrf_k + rank)
+                docs.setdefault(key, doc)
+        top = sorted(scores, key=scores.get, reverse=True)[:self.k]
+        fused = [
+            Document(page_content=docs[key].page_content, metadata={**docs[key].metadata, "rrf_score": scores[key]})
+            for key in top
+        ]
+        fusion_ms = 1000 * (time.perf_counter() - fusion_start)
+
+        self.last_timings = {
+            "dense_ms": dense_ms,
+            "keyword_ms": keyword_ms,
+            "fusion_ms": fusion_ms,
+            "total_ms": 1000 * (time.perf_counter() - start),
+        }
+        logging.info(
+            f"Hybrid retrieval: {len(dense_docs)} dense + {len(keyword_hits)} keyword candidates "
+            f"fused to {len(fused)}, timings {self.last_timings}"
+        )
+        return fused
+
+
+def build_base_retriever(
+    vectorstore,
+    search_kwargs: Dict[str, Any],
+    keyword_index=None,
+    config: Optional[HybridRetrieverConfig] = None,
+) -> BaseRetriever:
+    """
+    Dense retriever of a store, fused with its keyword index when one is given.
+
+    Args:
+        vectorstore: Vector store of the pipeline
+        search_kwargs: Search arguments; k is the number of results, filter a metadata filter
+        keyword_index: BM25Index of the pipeline, or None for dense only
+        config: Fusion configuration
+
+    Returns:
+        BaseRetriever: A HybridRetriever, or the plain store retriever
+    """
+    config = config or HybridRetrieverConfig()
+    if keyword_index is None or not config.enabled:
+        return vectorstore.as_retriever(search_kwargs=search_kwargs)
+    return HybridRetriever(
+        vectorstore=vectorstore,
+        keyword_index=keyword_index,
+        k=search_kwargs.get("k", 4),
+        search_kwargs=search_kwargs,
+        fusion_config=config
+    )
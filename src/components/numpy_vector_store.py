@@ -0,0 +1,535 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+from langchain.vectorstores.base import VectorStore
+
+from src.components.vector_store import normalize_vectors
+from src.logger import logging
+from src.exception import CustomException
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialised within the process
+    fcntl = None
+
+META_FILE = "numpy_meta.json"
+VECTORS_FILE = "vectors.npy"
+TABLE_FILE = "docs.sqlite"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ORDER_FILE = "ivf_order.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+LOCK_FILE = "numpy.lock"
+
+# Rows the vector file is first allocated with; it doubles when full
+_MIN_CAPACITY = 1024
+# Rows copied at a time when the vector file grows
+_COPY_ROWS = 65536
+
+# Metadata keys stored as indexed columns of the side table
+_COLUMNS = ("source", "page")
+_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def where_to_sql(where: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    """
+    Translate a Chroma-style metadata filter into a SQL condition on the side table.
+
+    Supports equality, $eq/$ne/$gt/$gte/$lt/$lte, $in/$nin and $and/$or.
+    """
+    if not where:
+        return "1", []
+    clauses, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_to_sql(part) for part in value]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, part_params in parts for param in part_params)
+            continue
+
+        if not re.fullmatch(r"[A-Za-z0-9_]+", key):
+            raise ValueError(f"Unsupported filter key: {key}")
+        column = key if key in _COLUMNS else f"json_extract(metadata, '$.{key}')"
+        conditions = value if isinstance(value, dict) else {"$eq": value}
+        for operator, operand in conditions.items():
+            if operator in ("$in", "$nin"):
+                placeholders = ",".join("?" * len(operand))
+                clauses.append(f"{column} {'IN' if operator == '$in' else 'NOT IN'} ({placeholders})")
+                params.extend(operand)
+            elif operator in _OPERATORS:
+                clauses.append(f"{column} {_OPERATORS[operator]} ?")
+                params.append(operand)
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator}")
+    return " AND ".join(clauses), params
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Native vector store over a memory-mapped .npy file and a SQLite side table.
+
+    Opening a store only maps the vector file read-only, so loads are
+    near-instant and every process serving a pipeline shares its page cache.
+    Search is an exact dot product over the map (vectors are L2-normalized,
+    so scores are cosine similarity). Once a pipeline holds ivf_min_vectors
+    vectors, persist() builds an IVF index of k-means lists and search scans
+    only the nprobe closest lists plus rows added since the index was built.
+
+    Writes go straight to disk under a file lock shared by every process.
+    New vectors are appended in place past the stored count, and the file
+    doubles in capacity when full; growth writes a new file under a
+    temporary name and swaps it in, so existing maps stay valid. A delete
+    writes the compacted vectors to a new file, commits the row renumbering
+    and only then points the meta file at it. Readers in other processes
+    remap when the store's version changes.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_function: Optional[Embeddings],
+        ivf_min_vectors: int = 50000,
+        nprobe: int = 8
+    ):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.ivf_min_vectors = ivf_min_vectors
+        self.nprobe = nprobe
+
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._meta: Dict[str, Any] = {"version": 0, "count": 0, "dim": 0, "ivf_rows": 0, "vectors_file": VECTORS_FILE}
+        self._meta_mtime = None
+        self._vectors: Optional[np.ndarray] = None
+        self._ivf: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        if self.exists(persist_directory):
+            self._refresh()
+        else:
+            self._write_meta()
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    @staticmethod
+    def exists(persist_directory: str) -> bool:
+        return os.path.exists(os.path.join(persist_directory, META_FILE))
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Connection to the side table, reopened after close()."""
+        if self._db is None:
+            conn = sqlite3.connect(
+                os.path.join(self.persist_directory, TABLE_FILE), check_same_thread=False, isolation_level=None
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, "
+                "source TEXT, page INTEGER, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS docs_source_page ON docs (source, page)")
+            # Vector file the committed row numbers refer to, written by deletes
+            conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._db = conn
+        return self._db
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def _refresh(self) -> None:
+        """Remap the vector file and IVF lists if another writer changed the store."""
+        try:
+            mtime = os.stat(self._path(META_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._meta_mtime:
+            return
+        with open(self._path(META_FILE), "r") as file:
+            meta = json.load(file)
+        meta.setdefault("vectors_file", VECTORS_FILE)
+        if meta["version"] != self._meta["version"] or self._vectors is None:
+            self._vectors = np.load(self._path(meta["vectors_file"]), mmap_mode="r") if meta["count"] else None
+            self._ivf = None
+            if meta["ivf_rows"]:
+                self._ivf = (
+                    np.load(self._path(IVF_CENTROIDS_FILE)),
+                    np.load(self._path(IVF_ORDER_FILE), mmap_mode="r"),
+                    np.load(self._path(IVF_OFFSETS_FILE)),
+                )
+        self._meta, self._meta_mtime = meta, mtime
+
+    def _write_meta(self, **changes: Any) -> None:
+        meta = {**self._meta, **changes, "version": self._meta["version"] + 1}
+        tmp_path = self._path(f"{META_FILE}.tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, self._path(META_FILE))
+        self._meta_mtime = None
+        self._refresh()
+
+    @contextmanager
+    def _write_lock(self):
+        """Serialise writers of this store, across processes too, on a fresh view of it."""
+        with self._lock:
+            with open(self._path(LOCK_FILE), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # Another process may have written since the last refresh
+                    self._meta_mtime = None
+                    self._refresh()
+                    self._finish_interrupted_delete()
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _append_vectors(self, count: int, vectors: np.ndarray) -> None:
+        """
+        Write vectors as rows count onwards of the vector file.
+
+        Rows past count are ignored by readers until the meta file is
+        updated, so new rows are written in place and an append costs only
+        its own rows. A full file is copied once, chunk by chunk, into one
+        of twice the capacity.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        needed = count + len(vectors)
+        path = self._path(self._meta["vectors_file"])
+        target = np.load(path, mmap_mode="r+") if os.path.exists(path) else None
+        if target is not None and target.shape[0] >= needed and target.shape[1] == vectors.shape[1]:
+            target[count:needed] = vectors
+            target.flush()
+            return
+
+        capacity = max(needed, 2 * (target.shape[0] if target is not None else 0), _MIN_CAPACITY)
+        tmp_path = f"{path}.tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(capacity, vectors.shape[1]))
+        for start in range(0, count, _COPY_ROWS):
+            end = min(start + _COPY_ROWS, count)
+            grown[start:end] = target[start:end]
+        grown[count:needed] = vectors
+        grown.flush()
+        del grown, target
+        os.replace(tmp_path, path)
+        logging.info(f"Grew vector file of {self.persist_directory} to {capacity} rows")
+
+    def _write_vectors(self, vectors: np.ndarray) -> str:
+        """Write vectors to a new file, not yet referenced by the meta file, and return its name."""
+        name = f"vectors.{self._meta['version'] + 1}.npy"
+        tmp_path = self._path(f"{name}.tmp.npy")
+        np.save(tmp_path, np.ascontiguousarray(vectors, dtype=np.float32))
+        os.replace(tmp_path, self._path(name))
+        return name
+
+    def _publish_vectors(self, name: str, count: int) -> None:
+        """Point the meta file at a compacted vector file and remove the one it replaces."""
+        previous = self._meta["vectors_file"]
+        # Row numbers changed, so the IVF lists no longer apply
+        self._write_meta(count=count, ivf_rows=0, vectors_file=name)
+        if previous != name:
+            try:
+                # Maps of the old file stay valid until they are dropped
+                os.remove(self._path(previous))
+            except OSError:
+                pass
+
+    def _finish_interrupted_delete(self) -> None:
+        """Publish a delete whose renumbering committed but whose meta file was never written."""
+        committed = self._conn.execute("SELECT value FROM state WHERE key = 'vectors_file'").fetchone()
+        if committed and committed[0] != self._meta["vectors_file"] and os.path.exists(self._path(committed[0])):
+            count = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            logging.warning(f"Finishing an interrupted delete in {self.persist_directory}")
+            self._publish_vectors(committed[0], count)
+
+    def _stored_vectors(self) -> np.ndarray:
+        count = self._meta["count"]
+        if self._vectors is None:
+            return np.zeros((0, self._meta["dim"]), dtype=np.float32)
+        # Rows past count are left over from an interrupted write
+        return self._vectors[:count]
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._meta["count"]
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        vectors: np.ndarray,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """Add texts with precomputed vectors; ids already stored are skipped, as in Chroma."""
+        if not texts:
+            return []
+        vectors = normalize_vectors(vectors)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        try:
+            with self._write_lock():
+                stored = {
+                    row[0] for start in range(0, len(ids), 500)
+                    for row in self._conn.execute(
+                        f"SELECT id FROM docs WHERE id IN ({','.join('?' * len(ids[start:start + 500]))})",
+                        ids[start:start + 500]
+                    )
+                }
+                keep = [i for i, doc_id in enumerate(ids) if doc_id not in stored]
+                if not keep:
+                    return ids
+
+                count, dim = self._meta["count"], self._meta["dim"]
+                if count and dim != vectors.shape[1]:
+                    raise ValueError(f"Vector dim {vectors.shape[1]} does not match store dim {dim}")
+                self._append_vectors(count, vectors[keep])
+
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(
+                    "INSERT INTO docs VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (count + offset, ids[i], metadatas[i].get("source"), metadatas[i].get("page"),
+                         texts[i], json.dumps(metadatas[i]))
+                        for offset, i in enumerate(keep)
+                    ]
+                )
+                self._conn.execute("COMMIT")
+                self._write_meta(count=count + len(keep), dim=int(vectors.shape[1]))
+            return ids
+
+        except Exception as e:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise CustomException(e, sys)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding_function.embed_documents(texts), metadatas, ids)
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[dict] = None,
+        include: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> dict:
+        """Stored ids, texts and metadata (and embeddings if included), filtered like Chroma.get."""
+        condition, params = where_to_sql(where)
+        if ids is not None:
+            condition += f" AND id IN ({','.join('?' * len(ids))})" if ids else " AND 0"
+            params = params + list(ids)
+        with self._lock:
+            self._refresh()
+            rows = self._conn.execute(
+                f"SELECT row, id, text, metadata FROM docs WHERE {condition} ORDER BY row", params
+            ).fetchall()
+            result = {
+                "ids": [row[1] for row in rows],
+                "documents": [row[2] for row in rows],
+                "metadatas": [json.loads(row[3]) for row in rows],
+            }
+            if include and "embeddings" in include:
+                result["embeddings"] = self._stored_vectors()[[row[0] for row in rows]].tolist()
+        return result
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Delete chunks, compacting the vector file and renumbering rows."""
+        if not ids:
+            return False
+        try:
+            with self._write_lock():
+                placeholders = ",".join("?" * len(ids))
+                removed = [row[0] for row in self._conn.execute(
+                    f"SELECT row FROM docs WHERE id IN ({placeholders})", ids
+                )]
+                if not removed:
+                    return False
+
+                count = self._meta["count"]
+                keep = np.ones(count, dtype=bool)
+                keep[removed] = False
+                vectors_file = self._write_vectors(self._stored_vectors()[keep])
+
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", ids)
+                # Ascending order never moves a row onto one still in use
+                self._conn.executemany(
+                    "UPDATE docs SET row = ? WHERE row = ?",
+                    [(new_row, old_row) for new_row, old_row in enumerate(np.flatnonzero(keep).tolist())
+                     if new_row != old_row]
+                )
+                self._conn.execute("INSERT OR REPLACE INTO state VALUES ('vectors_file', ?)", (vectors_file,))
+                self._conn.execute("COMMIT")
+                # Readers switch to the new rows and vectors together, when the meta file is replaced
+                self._publish_vectors(vectors_file, int(keep.sum()))
+            return True
+
+        except Exception as e:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise CustomException(e, sys)
+
+    def update_metadatas(self, ids: List[str], metadatas: List[dict]) -> None:
+        """Replace the metadata of stored chunks in the side table; vectors and rows are untouched."""
+        try:
+            with self._write_lock():
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(
+                    "UPDATE docs SET source = ?, page = ?, metadata = ? WHERE id = ?",
+                    [
+                        (metadata.get("source"), metadata.get("page"), json.dumps(metadata), doc_id)
+                        for doc_id, metadata in zip(ids, metadatas)
+                    ]
+                )
+                self._conn.execute("COMMIT")
+
+        except Exception as e:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise CustomException(e, sys)
+
+    def persist(self) -> None:
+        """Build or refresh the IVF index when the store is large enough."""
+        with self._write_lock():
+            count, ivf_rows = self._meta["count"], self._meta["ivf_rows"]
+            # Rebuild once a tenth of the rows are outside the lists
+            if count and count >= self.ivf_min_vectors and count - ivf_rows > count // 10:
+                self._build_ivf()
+
+    def _build_ivf(self, iterations: int = 10, seed: int = 0) -> None:
+        """Spherical k-means over a sample, then assign every row to its closest list."""
+        vectors = self._stored_vectors()
+        count = len(vectors)
+        # Tiny stores get one list per vector at most
+        nlist = min(int(np.clip(np.sqrt(count), 16, 4096)), count)
+        rng = np.random.RandomState(seed)
+        sample = np.asarray(vectors[np.sort(rng.choice(count, size=min(count, nlist * 64), replace=False))])
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            sums[empty] = centroids[empty]
+            centroids = normalize_vectors(sums)
+
+        assign = np.concatenate([
+            np.argmax(np.asarray(vectors[start:start + 65536]) @ centroids.T, axis=1)
+            for start in range(0, count, 65536)
+        ])
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+
+        for name, array in ((IVF_CENTROIDS_FILE, centroids), (IVF_ORDER_FILE, order), (IVF_OFFSETS_FILE, offsets)):
+            tmp_path = self._path(f"{name}.tmp.npy")
+            np.save(tmp_path, array)
+            os.replace(tmp_path, self._path(name))
+        self._write_meta(ivf_rows=count)
+        logging.info(f"Built IVF index with {nlist} lists over {count} vectors in {self.persist_directory}")
+
+    def _candidate_rows(self, query: np.ndarray, where: Optional[dict]) -> Optional[np.ndarray]:
+        """Rows to score exactly, or None for every row."""
+        if where:
+            condition, params = where_to_sql(where)
+            return np.array(
+                [row[0] for row in self._conn.execute(f"SELECT row FROM docs WHERE {condition}", params)],
+                dtype=np.int64
+            )
+        if self._ivf is None:
+            return None
+        centroids, order, offsets = self._ivf
+        probes = np.argsort(-(centroids @ query))[:self.nprobe]
+        lists = [np.asarray(order[offsets[probe]:offsets[probe + 1]]) for probe in probes]
+        tail = np.arange(self._meta["ivf_rows"], self._meta["count"])
+        return np.sort(np.concatenate(lists + [tail]))
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Top-k documents by cosine similarity, optionally restricted by a metadata filter."""
+        query = normalize_vectors(embedding)
+        with self._lock:
+            self._refresh()
+            if not self._meta["count"]:
+                return []
+            vectors = self._stored_vectors()
+            rows = self._candidate_rows(query, filter)
+            scores = (vectors @ query) if rows is None else (np.asarray(vectors[rows]) @ query)
+            if not len(scores):
+                return []
+
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            top_rows = top if rows is None else rows[top]
+            records = {
+                row: (text, metadata) for row, text, metadata in self._conn.execute(
+                    f"SELECT row, text, metadata FROM docs WHERE row IN ({','.join('?' * len(top_rows))})",
+                    [int(row) for row in top_rows]
+                )
+            }
+        return [
+            (Document(page_content=records[int(row)][0], metadata=json.loads(records[int(row)][1])), float(score))
+            for row, score in zip(top_rows, scores[top])
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k, filter=filter, **kwargs)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter=filter, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter=filter, **kwargs)]
+
+    def _similarity_search_with_relevance_scores(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score(query, k, **kwargs)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        persist_directory: str = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> "NumpyVectorStore":
+        store = cls(persist_directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        store.persist()
+        return store
+
+    def close(self) -> None:
+        """Drop the memory maps and the side table connection; they are reopened on next use."""
+        with self._lock:
+            self._vectors = None
+            self._ivf = None
+            self._meta_mtime = None
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,168 @@
+import json
+import os
+import re
+import sys
+import threading
+from typing import List, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from transformers import AutoTokenizer
+
+from src.logger import logging
+from src.exception import CustomException
+
+# Minimum cosine similarity to the PyTorch vectors, per graph precision
+DEFAULT_TOLERANCE = {"fp32": 1e-4, "int8": 2e-2}
+
+VERIFY_SENTENCES = [
+    "Attention is all you need.",
+    "The encoder maps an input sequence of symbol representations to continuous representations.",
+    "Error code E-4012: pump pressure below threshold, check valve PV-17.",
+    "What is the summary of this document?",
+]
+
+# Exported graphs are shared on disk by every instance of a model
+_export_lock = threading.Lock()
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformers style embeddings served by onnxruntime on CPU.
+
+    The transformer is exported to ONNX once (optionally int8 dynamically
+    quantized) and cached on disk; mean pooling and normalization run in
+    NumPy. On first export the graph is checked against the PyTorch model
+    and rejected if any test vector drifts beyond the tolerance.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: str,
+        quantize: bool = True,
+        normalize: bool = True,
+        batch_size: int = 32,
+        max_seq_length: int = 256,
+        tolerance: Optional[float] = None,
+        num_threads: Optional[int] = None
+    ):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise CustomException(
+                ImportError("The onnx embedding backend needs `pip install onnx onnxruntime`"), sys
+            ) from e
+
+        self.model_name = model_name
+        self.normalize = normalize
+        self.batch_size = batch_size
+        self.max_seq_length = max_seq_length
+        self.precision = "int8" if quantize else "fp32"
+        self.cache_namespace = f"{model_name}-onnx-{self.precision}" + ("-normalized" if normalize else "")
+        self.tolerance = DEFAULT_TOLERANCE[self.precision] if tolerance is None else tolerance
+        self.export_dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # A fast tokenizer cannot set padding and truncation from two threads at once;
+        # InferenceSession.run is thread-safe and runs outside this lock
+        self._tokenizer_lock = threading.Lock()
+
+        with _export_lock:
+            graph_path = self._export()
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            graph_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {graph_input.name for graph_input in self.session.get_inputs()}
+        self._verify(graph_path)
+
+    def _export(self) -> str:
+        """Export (and quantize) the model once, returning the graph to serve."""
+        os.makedirs(self.export_dir, exist_ok=True)
+        fp32_path = os.path.join(self.export_dir, "model.onnx")
+        int8_path = os.path.join(self.export_dir, "model.int8.onnx")
+
+        if not os.path.exists(fp32_path):
+            import torch
+            from transformers import AutoModel
+
+            logging.info(f"exporting {self.model_name} to ONNX")
+            model = AutoModel.from_pretrained(self.model_name).eval()
+            sample = self.tokenizer(["export sample"], return_tensors="pt")
+            input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+            dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+            dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+            with torch.no_grad():
+                torch.onnx.export(
+                    model,
+                    tuple(sample[name] for name in input_names),
+                    fp32_path,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=dynamic_axes,
+                    opset_version=14
+                )
+
+        if self.precision == "fp32":
+            return fp32_path
+
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logging.info(f"quantizing ONNX graph of {self.model_name} to int8")
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        return int8_path
+
+    def _verify(self, graph_path: str) -> None:
+        """Compare against the PyTorch model once per exported graph."""
+        marker = f"{graph_path}.verified.json"
+        if os.path.exists(marker):
+            return
+
+        from sentence_transformers import SentenceTransformer
+
+        reference = SentenceTransformer(self.model_name, device="cpu").encode(
+            VERIFY_SENTENCES, normalize_embeddings=True
+        )
+        vectors = self._encode(VERIFY_SENTENCES, normalize=True)
+        min_cosine = float(np.min(np.sum(reference * vectors, axis=1)))
+        if min_cosine < 1 - self.tolerance:
+            raise CustomException(ValueError(
+                f"ONNX {self.precision} embeddings deviate from PyTorch: "
+                f"min cosine {min_cosine:.6f} < {1 - self.tolerance:.6f}"
+            ), sys)
+
+        with open(marker, "w") as file:
+            json.dump({"min_cosine": min_cosine, "tolerance": self.tolerance}, file)
+        logging.info(f"ONNX {self.precision} embeddings verified, min cosine {min_cosine:.6f}")
+
+    def _encode(self, texts: List[str], normalize: bool) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            with self._tokenizer_lock:
+                batch = self.tokenizer(
+                    texts[start:start + self.batch_size],
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_seq_length,
+                    return_tensors="np"
+                )
+            feed = {name: value.astype(np.int64) for name, value in batch.items() if name in self._input_names}
+            hidden = self.session.run(["last_hidden_state"], feed)[0]
+            # Mean pooling over real tokens, as sentence-transformers does
+            mask = batch["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            vectors.append(pooled)
+        vectors = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        if normalize and len(vectors):
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [text.replace("\n", " ") for text in texts]
+        return self._encode(texts, self.normalize).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -1,16 +1,52 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+from transformers import AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer, pipeline
+from transformers.generation.streamers import BaseStreamer
 from huggingface_hub import login, snapshot_download
 from langchain.llms import HuggingFacePipeline
-from dataclasses import dataclass
+from langchain.llms.base import LLM
+from langchain.llms.utils import enforce_stop_tokens
+from langchain.chains.retrieval_qa.prompt import PROMPT as STUFF_QA_PROMPT
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import copy
+import hashlib
+import json
+import queue
+import threading
+import time
 import torch
 import sys
 import os
 from src.logger import logging
 from src.exception import CustomException
 
-# Set up authentication with Hugging Face
-hugging_face_token = "enter your key"
-login(token=hugging_face_token)
+# Authentication with Hugging Face happens lazily, only when a download is needed
+_login_lock = threading.Lock()
+_logged_in = False
+
+
+def ensure_hf_login(token: Optional[str]) -> bool:
+    """
+    Log in to the Hugging Face hub once per process, if a token is available.
+
+    Args:
+        token: Hugging Face access token, or None to skip login
+
+    Returns:
+        bool: True if the process is logged in
+    """
+    global _logged_in
+    if not token:
+        return _logged_in
+    with _login_lock:
+        if not _logged_in:
+            login(token=token)
+            _logged_in = True
+            logging.info("Logged in to Hugging Face hub")
+    return _logged_in
+
 
 @dataclass
 class ModelConfig:
@@ -18,38 +54,926 @@ class ModelConfig:
     max_new_tokens: int = 512
     temperature: float = 0.75
     cache_dir: str = "model_cache"  # Directory for storing downloaded models
+    do_sample: bool = False
+    top_k: Optional[int] = None
+    registry_memory_budget_mb: Optional[int] = None  # None means no eviction
+    revision: str = "main"
+    # Never touch the network; resolve models from the local manifest only
+    offline: bool = field(default_factory=lambda: os.environ.get("HF_HUB_OFFLINE", "0") == "1")
+    hf_token: Optional[str] = field(default_factory=lambda: os.environ.get("HF_TOKEN"))
+    manifest_file: str = "manifest.json"  # Stored under cache_dir
+    verify_hashes: bool = False  # Re-hash cached files on every load
+    # CPU-only reduced precision: "int8" (dynamic quantization) or "bf16"
+    quantization: Optional[str] = None
+    # Dynamic batching of concurrent generation requests on the shared model
+    enable_batching: bool = False
+    max_batch_size: int = 8
+    max_batch_wait_ms: float = 20.0
+    # Reuse precomputed past-key-values for the static RetrievalQA prompt prefix
+    enable_prefix_cache: bool = False
+    # Assisted (speculative) generation: a small draft model proposes tokens
+    # that the main model verifies; it must share the main model's tokenizer
+    draft_model_name: Optional[str] = None
+    enable_assisted_generation: bool = False
+
+
+def _iterate_streamer(streamer: TextIteratorStreamer, generate: Callable[[], Any]) -> Iterator[str]:
+    """Run generate on a worker thread and yield the streamer's text pieces."""
+    errors = []
+
+    def _generate():
+        try:
+            generate()
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=_generate, daemon=True)
+    thread.start()
+    for text in streamer:
+        if text:
+            yield text
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+def stream_generate(llm: HuggingFacePipeline, prompt: str) -> Iterator[str]:
+    """
+    Generate text for a prompt, yielding decoded pieces as they are produced.
+
+    A BatchedLLM streams through its scheduler, so the prompt joins a batch
+    instead of running on the shared pipeline next to the scheduler thread;
+    a PrefixCachedLLM streams through its prefix cache with its own
+    generation arguments.
+
+    Args:
+        llm: Loaded HuggingFacePipeline, or one of the LLM wrappers around it
+        prompt: Fully formatted prompt
+
+    Yields:
+        str: Newly generated text, excluding the prompt
+    """
+    if isinstance(llm, BatchedLLM):
+        yield from llm.scheduler.stream(prompt)
+        return
+    if isinstance(llm, PrefixCachedLLM):
+        yield from llm.prefix_cache.stream(prompt, **dict(llm.generation_kwargs))
+        return
+
+    pipe = llm.pipeline
+    streamer = TextIteratorStreamer(pipe.tokenizer, skip_prompt=True, skip_special_tokens=True)
+    yield from _iterate_streamer(streamer, lambda: pipe(prompt, streamer=streamer))
+
+
+@dataclass
+class _PendingPrompt:
+    prompt: str
+    future: Future
+    # Receives generated text pieces, then None, for streamed requests
+    pieces: Optional["queue.Queue[Optional[str]]"] = None
+
+
+class _BatchStreamer(BaseStreamer):
+    """
+    Streams each row of a batched generate call to its own request.
+
+    generate() first puts the prompt ids, then one token per row per step.
+    Each row's tokens are decoded incrementally and new text is handed to
+    that request's queue; rows of non-streamed requests are ignored.
+    """
+
+    def __init__(self, tokenizer, batch: List[_PendingPrompt]):
+        self.tokenizer = tokenizer
+        self.batch = batch
+        self.tokens: List[List[int]] = [[] for _ in batch]
+        self.emitted = [0] * len(batch)
+        self.prompt_seen = False
+
+    def put(self, value) -> None:
+        if not self.prompt_seen:
+            self.prompt_seen = True
+            return
+        rows = value.reshape(len(self.batch), -1).tolist()
+        for row, (pending, new_tokens) in enumerate(zip(self.batch, rows)):
+            if pending.pieces is None:
+                continue
+            self.tokens[row].extend(new_tokens)
+            text = self.tokenizer.decode(self.tokens[row], skip_special_tokens=True)
+            # Hold back a trailing partial character until its remaining bytes arrive
+            if len(text) > self.emitted[row] and not text.endswith("\ufffd"):
+                pending.pieces.put(text[self.emitted[row]:])
+                self.emitted[row] = len(text)
+
+    def end(self) -> None:
+        pass
+
+
+class GenerationScheduler:
+    """
+    Collects prompts from concurrent callers and generates them as one batch.
+
+    A worker thread waits for the first prompt, keeps collecting for up to
+    max_wait_ms or until max_batch_size prompts are queued, runs them through
+    the pipeline as a single left-padded batch and fans the results back out
+    to each caller's future. Streamed requests join the same batches, and
+    receive their text piece by piece as it is generated.
+    """
+
+    def __init__(self, llm: HuggingFacePipeline, max_batch_size: int = 8, max_wait_ms: float = 20.0):
+        self.pipe = llm.pipeline
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        # Batched decoder-only generation needs a pad token and left padding
+        tokenizer = self.pipe.tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
+
+        self._queue: "queue.Queue[Optional[_PendingPrompt]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.failed_batches = 0
+        self._thread = threading.Thread(target=self._run, name="generation-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str) -> Future:
+        """Queue a prompt; the returned future resolves to the generated text."""
+        future = Future()
+        self._queue.put(_PendingPrompt(prompt=prompt, future=future))
+        return future
+
+    def generate(self, prompt: str) -> str:
+        """Queue a prompt and block until its batch has been generated."""
+        return self.submit(prompt).result()
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Queue a prompt and yield its generated text pieces as its batch runs."""
+        pieces: "queue.Queue[Optional[str]]" = queue.Queue()
+        future = Future()
+        self._queue.put(_PendingPrompt(prompt=prompt, future=future, pieces=pieces))
+        while True:
+            piece = pieces.get()
+            if piece is None:
+                break
+            yield piece
+        # Raises the batch's error, if it failed
+        future.result()
+
+    def stats(self) -> Dict[str, float]:
+        """Return batch counters, including the average batch fill rate."""
+        with self._stats_lock:
+            fill_rate = self.requests / (self.batches * self.max_batch_size) if self.batches else 0.0
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "failed_batches": self.failed_batches,
+                "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "batch_fill_rate": fill_rate,
+                "queued": self._queue.qsize(),
+            }
+
+    def close(self) -> None:
+        """Stop the worker thread after the batch in flight."""
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _collect_batch(self, first: _PendingPrompt) -> List[_PendingPrompt]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch, then let the run loop see the stop signal
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            self._run_batch(self._collect_batch(first))
+
+    def _run_batch(self, batch: List[_PendingPrompt]) -> None:
+        prompts = [pending.prompt for pending in batch]
+        stream_kwargs = {}
+        if any(pending.pieces is not None for pending in batch):
+            stream_kwargs["streamer"] = _BatchStreamer(self.pipe.tokenizer, batch)
+        try:
+            outputs = self.pipe(prompts, batch_size=len(prompts), return_full_text=False, **stream_kwargs)
+            for pending, output in zip(batch, outputs):
+                pending.future.set_result(output[0]["generated_text"])
+        except Exception as e:
+            logging.error(f"Error generating batch of {len(batch)} prompts: {str(e)}")
+            with self._stats_lock:
+                self.failed_batches += 1
+            for pending in batch:
+                pending.future.set_exception(e)
+        for pending in batch:
+            if pending.pieces is not None:
+                pending.pieces.put(None)
+        with self._stats_lock:
+            self.batches += 1
+            self.requests += len(batch)
+        logging.info(f"Generated batch of {len(batch)}/{self.max_batch_size} prompts")
+
+
+class BatchedLLM(LLM):
+    """LangChain LLM that routes every call through a GenerationScheduler."""
+
+    scheduler: Any
+    pipeline: Any  # Underlying HF pipeline, used for its tokenizer and streaming
+
+    @property
+    def _llm_type(self) -> str:
+        return "batched_huggingface_pipeline"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        text = self.scheduler.generate(prompt)
+        if stop:
+            text = enforce_stop_tokens(text, stop)
+        return text
+
+
+def prompt_prefix(template: str, first_variable: str = "context") -> str:
+    """Return the static part of a prompt template before its first variable."""
+    return template.split("{" + first_variable + "}")[0]
+
+
+class PrefixCache:
+    """
+    Holds past-key-values for static prompt prefixes of one loaded model.
+
+    The prefix is prefilled once; each generation deep-copies its cache and
+    only runs prefill over the remaining context and question tokens. When a
+    prompt diverges from a cached prefix part-way (tokenizer merges across the
+    boundary), the cache is cropped to the common token prefix instead.
+    """
+
+    def __init__(self, llm: HuggingFacePipeline):
+        self.model = llm.pipeline.model
+        self.tokenizer = llm.pipeline.tokenizer
+        self._prefixes: Dict[str, Tuple[torch.Tensor, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+
+    def register(self, prefix: str) -> None:
+        """Prefill a prefix now so the first query does not pay for it."""
+        self._get(prefix)
+
+    def _get(self, prefix: str) -> Tuple[torch.Tensor, Any]:
+        with self._lock:
+            if prefix not in self._prefixes:
+                prefix_ids = self.tokenizer(prefix, return_tensors="pt").input_ids.to(self.model.device)
+                with torch.no_grad():
+                    output = self.model(prefix_ids, use_cache=True)
+                self._prefixes[prefix] = (prefix_ids, output.past_key_values)
+                logging.info(f"Cached past-key-values for a {prefix_ids.shape[1]}-token prompt prefix")
+            return self._prefixes[prefix]
+
+    def _match(self, input_ids: torch.Tensor) -> Tuple[int, Any]:
+        """Find the cached prefix sharing the most leading tokens with input_ids."""
+        best_length, best_cache = 0, None
+        with self._lock:
+            prefixes = list(self._prefixes.values())
+        for prefix_ids, past_key_values in prefixes:
+            length = min(prefix_ids.shape[1], input_ids.shape[1] - 1)
+            if length <= 0:
+                continue
+            matches = (prefix_ids[0, :length] == input_ids[0, :length]).long()
+            common = int(matches.cumprod(0).sum())
+            if common == prefix_ids.shape[1] or (common > 0 and hasattr(past_key_values, "crop")):
+                if common > best_length:
+                    best_length, best_cache = common, past_key_values
+        return best_length, best_cache
+
+    def _prepare(self, prompt: str, generation_kwargs: Dict[str, Any]) -> Tuple[torch.Tensor, Dict[str, Any]]:
+        """Tokenize a prompt and add a copy of its best cached prefix to the generate arguments."""
+        input_ids = self.tokenizer(prompt, return_tensors="pt").input_ids.to(self.model.device)
+        common, past_key_values = self._match(input_ids)
+
+        if past_key_values is not None:
+            past_key_values = copy.deepcopy(past_key_values)
+            if hasattr(past_key_values, "crop"):
+                past_key_values.crop(common)
+            generation_kwargs["past_key_values"] = past_key_values
+            with self._lock:
+                self.hits += 1
+                self.reused_tokens += common
+        else:
+            with self._lock:
+                self.misses += 1
+
+        generation_kwargs.update(
+            attention_mask=torch.ones_like(input_ids),
+            pad_token_id=self.tokenizer.pad_token_id or self.tokenizer.eos_token_id
+        )
+        return input_ids, generation_kwargs
+
+    def generate(self, prompt: str, **generation_kwargs: Any) -> str:
+        """
+        Generate a completion, reusing the cached prefix when the prompt starts with one.
+
+        Args:
+            prompt: Fully formatted prompt
+            generation_kwargs: Arguments for model.generate
+
+        Returns:
+            str: Generated text without the prompt
+        """
+        input_ids, generation_kwargs = self._prepare(prompt, generation_kwargs)
+        with torch.no_grad():
+            output = self.model.generate(input_ids, **generation_kwargs)
+        return self.tokenizer.decode(output[0, input_ids.shape[1]:], skip_special_tokens=True)
+
+    def stream(self, prompt: str, **generation_kwargs: Any) -> Iterator[str]:
+        """
+        Like generate, but yield decoded pieces as they are produced.
+
+        Args:
+            prompt: Fully formatted prompt
+            generation_kwargs: Arguments for model.generate
+
+        Yields:
+            str: Newly generated text, excluding the prompt
+        """
+        input_ids, generation_kwargs = self._prepare(prompt, generation_kwargs)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+        def _generate():
+            with torch.no_grad():
+                self.model.generate(input_ids, streamer=streamer, **generation_kwargs)
+
+        yield from _iterate_streamer(streamer, _generate)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "prefixes": len(self._prefixes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "reused_tokens": self.reused_tokens,
+            }
+
+
+class PrefixCachedLLM(LLM):
+    """LangChain LLM that generates through a PrefixCache."""
+
+    prefix_cache: Any
+    pipeline: Any  # Underlying HF pipeline, used for its tokenizer and streaming
+    generation_kwargs: Dict[str, Any] = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "prefix_cached_huggingface_pipeline"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        text = self.prefix_cache.generate(prompt, **dict(self.generation_kwargs))
+        if stop:
+            text = enforce_stop_tokens(text, stop)
+        return text
+
+
+class AssistedGenerationStats:
+    """
+    Counts forward passes of the main and draft models during assisted generation.
+
+    Every main-model forward verifies one round of drafted tokens and emits
+    the accepted ones plus one of its own, so accepted = generated - main
+    forwards, and each draft forward proposes one token. The acceptance rate
+    is therefore (generated - main forwards) / draft forwards, aggregated over
+    all calls.
+    """
+
+    def __init__(self, model, draft_model):
+        self._lock = threading.Lock()
+        self.main_forwards = 0
+        self.draft_forwards = 0
+        self.generated_tokens = 0
+        self.generation_seconds = 0.0
+        self.calls = 0
+        model.register_forward_hook(self._count_main)
+        draft_model.register_forward_hook(self._count_draft)
+
+    def _count_main(self, module, inputs, output) -> None:
+        with self._lock:
+            self.main_forwards += 1
+
+    def _count_draft(self, module, inputs, output) -> None:
+        with self._lock:
+            self.draft_forwards += 1
+
+    def record(self, generated_tokens: int, seconds: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.generated_tokens += generated_tokens
+            self.generation_seconds += seconds
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            accepted = max(self.generated_tokens - self.main_forwards, 0)
+            return {
+                "calls": self.calls,
+                "generated_tokens": self.generated_tokens,
+                "main_forwards": self.main_forwards,
+                "draft_forwards": self.draft_forwards,
+                "acceptance_rate": accepted / self.draft_forwards if self.draft_forwards else 0.0,
+                "tokens_per_main_forward": (
+                    self.generated_tokens / self.main_forwards if self.main_forwards else 0.0
+                ),
+                "tokens_per_sec": (
+                    self.generated_tokens / self.generation_seconds if self.generation_seconds else 0.0
+                ),
+            }
+
+
+class AssistedLLM(LLM):
+    """LangChain LLM over a pipeline built with a draft assistant model."""
+
+    pipeline: Any
+    assisted_stats: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "assisted_huggingface_pipeline"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        start = time.perf_counter()
+        text = self.pipeline(prompt, return_full_text=False)[0]["generated_text"]
+        generated_tokens = len(self.pipeline.tokenizer(text, add_special_tokens=False)["input_ids"])
+        self.assisted_stats.record(generated_tokens, time.perf_counter() - start)
+        if stop:
+            text = enforce_stop_tokens(text, stop)
+        return text
+
+
+def cpu_supports_bf16() -> bool:
+    """Check whether the CPU has native bf16 kernels (AVX512-BF16 / AMX)."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def _file_sha256(file_path: str) -> str:
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+@dataclass
+class _RegistryEntry:
+    llm: HuggingFacePipeline
+    size_bytes: int
+    ref_count: int = 0
+    scheduler: Optional[GenerationScheduler] = None
+    prefix_cache: Optional[PrefixCache] = None
+
+
+class ModelRegistry:
+    """
+    Process-wide, reference-counted cache of loaded LLM pipelines.
+
+    One HuggingFacePipeline is kept per registry key (model name, dtype and
+    generation config), so every pipeline that asks for the same model shares
+    a single copy of the weights. Entries nobody holds a reference to are
+    evicted least-recently-used first once the memory budget is exceeded.
+    """
+
+    def __init__(self, memory_budget_bytes: Optional[int] = None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._entries: "OrderedDict[Tuple, _RegistryEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, key: Tuple, loader: Callable[[], HuggingFacePipeline]) -> HuggingFacePipeline:
+        """
+        Get the LLM for a key, loading it with `loader` on first use.
+
+        Args:
+            key: Registry key identifying model and generation config
+            loader: Callable building the HuggingFacePipeline on a miss
+
+        Returns:
+            HuggingFacePipeline: Shared model instance
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.ref_count += 1
+                self._entries.move_to_end(key)
+                self.hits += 1
+                logging.info(f"Model registry hit for {key} (refs={entry.ref_count})")
+                return entry.llm
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other keys are not blocked
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.ref_count += 1
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.llm
+
+            logging.info(f"Model registry miss for {key}, loading model")
+            llm = loader()
+            size_bytes = self._estimate_size(llm)
+
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = _RegistryEntry(llm=llm, size_bytes=size_bytes, ref_count=1)
+                self._evict_if_needed()
+                return llm
+
+    def get_scheduler(self, key: Tuple, max_batch_size: int, max_wait_ms: float) -> GenerationScheduler:
+        """
+        Get the batching scheduler for a loaded model, creating it on first use.
+
+        Args:
+            key: Registry key of an acquired model
+            max_batch_size: Largest batch the scheduler generates at once
+            max_wait_ms: How long to wait for a batch to fill
+
+        Returns:
+            GenerationScheduler: Scheduler shared by all users of the model; it
+            keeps the batch settings of the caller that created it
+        """
+        with self._lock:
+            entry = self._entries[key]
+            if entry.scheduler is None:
+                entry.scheduler = GenerationScheduler(entry.llm, max_batch_size, max_wait_ms)
+                logging.info(f"Started generation scheduler for {key}")
+            elif (entry.scheduler.max_batch_size, entry.scheduler.max_wait_ms) != (max_batch_size, max_wait_ms):
+                logging.warning(
+                    f"Generation scheduler for {key} already runs with max_batch_size="
+                    f"{entry.scheduler.max_batch_size}, max_wait_ms={entry.scheduler.max_wait_ms}; "
+                    f"ignoring max_batch_size={max_batch_size}, max_wait_ms={max_wait_ms}"
+                )
+            return entry.scheduler
+
+    def assisted_stats(self) -> Dict[Tuple, Dict[str, float]]:
+        """Return assisted generation metrics for every model with a draft model."""
+        with self._lock:
+            return {
+                key: entry.llm.pipeline.assisted_generation_stats.stats()
+                for key, entry in self._entries.items()
+                if getattr(entry.llm.pipeline, "assisted_generation_stats", None) is not None
+            }
+
+    def get_prefix_cache(self, key: Tuple) -> PrefixCache:
+        """Get the prompt prefix cache for a loaded model, creating it on first use."""
+        with self._lock:
+            entry = self._entries[key]
+            if entry.prefix_cache is None:
+                entry.prefix_cache = PrefixCache(entry.llm)
+            return entry.prefix_cache
+
+    def scheduler_stats(self) -> Dict[Tuple, Dict[str, float]]:
+        """Return batching metrics for every model with a scheduler."""
+        with self._lock:
+            return {
+                key: entry.scheduler.stats()
+                for key, entry in self._entries.items()
+                if entry.scheduler is not None
+            }
+
+    def release(self, key: Tuple) -> None:
+        """Drop one reference to a key, making it evictable at zero."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.ref_count = max(entry.ref_count - 1, 0)
+            logging.info(f"Released model {key} (refs={entry.ref_count})")
+            self._evict_if_needed()
+
+    def set_memory_budget(self, memory_budget_bytes: Optional[int]) -> None:
+        """Change the memory budget and evict idle models if now over it."""
+        with self._lock:
+            self.memory_budget_bytes = memory_budget_bytes
+            self._evict_if_needed()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.size_bytes for entry in self._entries.values())
+
+    def stats(self) -> Dict[str, int]:
+        """Return registry counters for monitoring."""
+        with self._lock:
+            return {
+                "models": len(self._entries),
+                "total_bytes": sum(entry.size_bytes for entry in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self) -> None:
+        """Drop every cached model regardless of reference counts."""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.scheduler is not None:
+                    entry.scheduler.close()
+            self._entries.clear()
+            self._key_locks.clear()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _evict_if_needed(self) -> None:
+        if self.memory_budget_bytes is None:
+            return
+        total = sum(entry.size_bytes for entry in self._entries.values())
+        for key in list(self._entries.keys()):
+            if total <= self.memory_budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry.ref_count > 0:
+                continue
+            del self._entries[key]
+            if entry.scheduler is not None:
+                entry.scheduler.close()
+            total -= entry.size_bytes
+            self.evictions += 1
+            logging.info(f"Evicted model {key} from registry ({entry.size_bytes} bytes)")
+        if total > self.memory_budget_bytes:
+            logging.warning(
+                f"Model registry holds {total} bytes, above budget {self.memory_budget_bytes}; "
+                f"all remaining models are in use"
+            )
+
+    @staticmethod
+    def _estimate_size(llm: HuggingFacePipeline) -> int:
+        try:
+            model = llm.pipeline.model
+            size_bytes = int(model.get_memory_footprint())
+            # Dynamically quantized Linear layers keep their int8 weights in packed
+            # params, which are neither parameters nor buffers
+            for module in model.modules():
+                if isinstance(module, torch.ao.nn.quantized.dynamic.Linear):
+                    for tensor in module._weight_bias():
+                        if tensor is not None:
+                            size_bytes += tensor.numel() * tensor.element_size()
+            return size_bytes
+        except Exception:
+            return 0
+
+
+# Shared by every RagModel in the process
+model_registry = ModelRegistry()
+
 
 class RagModel:
-    def __init__(self):
-        self.model_config = ModelConfig()
+    def __init__(self, model_config: Optional[ModelConfig] = None):
+        self.model_config = model_config or ModelConfig()
+        if self.model_config.quantization not in (None, "int8", "bf16"):
+            raise ValueError(f"Unsupported quantization: {self.model_config.quantization}")
         os.makedirs(self.model_config.cache_dir, exist_ok=True)
+        if self.model_config.registry_memory_budget_mb is not None:
+            model_registry.set_memory_budget(self.model_config.registry_memory_budget_mb * 1024 * 1024)
         
     def download_model(self, model_name: str) -> str:
-        """Download the model files to local cache directory."""
+        """
+        Resolve a model to a local snapshot, downloading it only when needed.
+
+        The manifest under cache_dir is checked first, so a model that was
+        downloaded before resolves without any network access. In offline
+        mode the hub is never contacted.
+
+        Args:
+            model_name: Hub repo id or a local model directory
+
+        Returns:
+            str: Local path of the model snapshot
+
+        Raises:
+            CustomException: If the model cannot be resolved or downloaded
+        """
         try:
-            logging.info(f"Downloading model to local cache: {model_name}")
-            local_path = snapshot_download(
-                repo_id=model_name,
-                cache_dir=self.model_config.cache_dir,
-                use_auth_token=True
-            )
-            logging.info(f"Model downloaded successfully to: {local_path}")
+            if os.path.isdir(model_name):
+                logging.info(f"Using local model directory: {model_name}")
+                return model_name
+
+            local_path = self._resolve_from_manifest(model_name)
+            if local_path:
+                logging.info(f"Resolved model {model_name} from local manifest: {local_path}")
+                return local_path
+
+            if self.model_config.offline:
+                # Fall back to a snapshot already in the hub cache, without network
+                local_path = snapshot_download(
+                    repo_id=model_name,
+                    revision=self.model_config.revision,
+                    cache_dir=self.model_config.cache_dir,
+                    local_files_only=True
+                )
+            else:
+                ensure_hf_login(self.model_config.hf_token)
+                logging.info(f"Downloading model to local cache: {model_name}")
+                local_path = snapshot_download(
+                    repo_id=model_name,
+                    revision=self.model_config.revision,
+                    cache_dir=self.model_config.cache_dir,
+                    token=self.model_config.hf_token
+                )
+            self._record_in_manifest(model_name, local_path)
+            logging.info(f"Model available at: {local_path}")
             return local_path
         except Exception as e:
             logging.error(f"Error downloading model: {str(e)}")
             raise CustomException(e, sys)
 
+    def _manifest_path(self) -> str:
+        return os.path.join(self.model_config.cache_dir, self.model_config.manifest_file)
+
+    def _manifest_key(self, model_name: str) -> str:
+        return f"{model_name}@{self.model_config.revision}"
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        manifest_path = self._manifest_path()
+        if not os.path.exists(manifest_path):
+            return {}
+        try:
+            with open(manifest_path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable model manifest {manifest_path}: {str(e)}")
+            return {}
+
+    def _resolve_from_manifest(self, model_name: str) -> Optional[str]:
+        """Return the cached snapshot path if the manifest entry is intact."""
+        entry = self._read_manifest().get(self._manifest_key(model_name))
+        if not entry:
+            return None
+
+        local_path = os.path.join(self.model_config.cache_dir, entry["local_path"])
+        for relative_path, file_info in entry["files"].items():
+            file_path = os.path.join(local_path, relative_path)
+            if not os.path.exists(file_path) or os.path.getsize(file_path) != file_info["size"]:
+                logging.warning(f"Cached file {file_path} is missing or changed, manifest entry is stale")
+                return None
+            if self.model_config.verify_hashes and _file_sha256(file_path) != file_info["sha256"]:
+                logging.warning(f"Hash mismatch for cached file {file_path}")
+                return None
+        return local_path
+
+    def _record_in_manifest(self, model_name: str, local_path: str) -> None:
+        """Write the snapshot's revision and file hashes to the manifest."""
+        files = {}
+        for root, _, file_names in os.walk(local_path):
+            for file_name in file_names:
+                file_path = os.path.join(root, file_name)
+                files[os.path.relpath(file_path, local_path)] = {
+                    "size": os.path.getsize(file_path),
+                    "sha256": _file_sha256(file_path)
+                }
+
+        manifest = self._read_manifest()
+        manifest[self._manifest_key(model_name)] = {
+            "model_name": model_name,
+            "revision": self.model_config.revision,
+            "commit": os.path.basename(os.path.normpath(local_path)),
+            "local_path": os.path.relpath(local_path, self.model_config.cache_dir),
+            "recorded_at": datetime.now().isoformat(),
+            "files": files
+        }
+
+        manifest_path = self._manifest_path()
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(tmp_path, manifest_path)
+        logging.info(f"Recorded {model_name} in model manifest ({len(files)} files)")
+
+    def _torch_dtype(self):
+        if torch.cuda.is_available():
+            return torch.float16
+        if self.model_config.quantization == "bf16" and cpu_supports_bf16():
+            return torch.bfloat16
+        return torch.float32
+
+    def precision(self) -> str:
+        """Name of the precision the model is served in on this machine."""
+        if not torch.cuda.is_available() and self.model_config.quantization == "int8":
+            return "int8"
+        return str(self._torch_dtype()).replace("torch.", "")
+
+    def registry_key(self, model_name: str = None) -> Tuple:
+        """
+        Build the model registry key for a model and this generation config.
+
+        Args:
+            model_name: Model to key, defaults to the configured model
+
+        Returns:
+            Tuple identifying the loaded pipeline
+        """
+        model_name = model_name or self.model_config.model_name
+        return (
+            model_name,
+            self.model_config.revision,
+            self.precision(),
+            self.model_config.max_new_tokens,
+            self.model_config.temperature,
+            self.model_config.do_sample,
+            self.model_config.top_k,
+            self._draft_model_name(),
+        )
+
+    def _draft_model_name(self) -> Optional[str]:
+        if self.model_config.enable_assisted_generation:
+            return self.model_config.draft_model_name
+        return None
+
     def load_model(self, model_name: str = None):
+        """
+        Get the shared LLM for a model, loading it only on the first request.
+
+        Args:
+            model_name: Model to load, defaults to the configured model
+
+        Returns:
+            HuggingFacePipeline: Shared model instance from the registry, or a
+            BatchedLLM / PrefixCachedLLM in front of it when enabled
+        """
         try:
             model_name = model_name or self.model_config.model_name
-            
+            key = self.registry_key(model_name)
+            llm = model_registry.acquire(key, lambda: self._build_model(model_name))
+
+            assisted_stats = getattr(llm.pipeline, "assisted_generation_stats", None)
+            if assisted_stats is not None:
+                if self.model_config.enable_batching or self.model_config.enable_prefix_cache:
+                    logging.warning("Assisted generation runs unbatched and without the prefix cache")
+                return AssistedLLM(pipeline=llm.pipeline, assisted_stats=assisted_stats)
+
+            if self.model_config.enable_batching:
+                if self.model_config.enable_prefix_cache:
+                    logging.warning("Prefix cache is not used for batched generation")
+                scheduler = model_registry.get_scheduler(
+                    key,
+                    self.model_config.max_batch_size,
+                    self.model_config.max_batch_wait_ms
+                )
+                return BatchedLLM(scheduler=scheduler, pipeline=llm.pipeline)
+
+            if self.model_config.enable_prefix_cache:
+                prefix_cache = model_registry.get_prefix_cache(key)
+                prefix_cache.register(prompt_prefix(STUFF_QA_PROMPT.template))
+                return PrefixCachedLLM(
+                    prefix_cache=prefix_cache,
+                    pipeline=llm.pipeline,
+                    generation_kwargs=self._generation_kwargs()
+                )
+
+            return llm
+        except Exception as e:
+            logging.error(f"Error in loading model: {str(e)}")
+            raise CustomException(e, sys)
+
+    def _generation_kwargs(self) -> Dict[str, Any]:
+        # Always explicit: a model's generation_config may default to sampling
+        generation_kwargs = {
+            "max_new_tokens": self.model_config.max_new_tokens,
+            "do_sample": self.model_config.do_sample,
+        }
+        if self.model_config.do_sample:
+            generation_kwargs["temperature"] = self.model_config.temperature
+            if self.model_config.top_k is not None:
+                generation_kwargs["top_k"] = self.model_config.top_k
+        return generation_kwargs
+
+    def release_model(self, model_name: str = None) -> None:
+        """Release a reference taken with load_model."""
+        model_registry.release(self.registry_key(model_name))
+
+    def _build_model(self, model_name: str):
+        try:
             # Download model to local cache if not already present
             local_model_path = self.download_model(model_name)
             
             logging.info(f"Loading model and tokenizer from local cache: {local_model_path}")
             tokenizer = AutoTokenizer.from_pretrained(
                 local_model_path,
-                use_auth_token=True,
                 local_files_only=True  # Only use local files
             )
 
@@ -58,21 +982,41 @@ class RagModel:
 
             model = AutoModelForCausalLM.from_pretrained(
                 local_model_path,
-                torch_dtype=torch.float16 if device == "cuda" else torch.float32,
+                torch_dtype=self._torch_dtype(),
                 device_map="auto" if device == "cuda" else None,
-                use_auth_token=True,
                 local_files_only=True  # Only use local files
             )
 
+            if self.model_config.quantization and device == "cuda":
+                logging.warning("Quantization setting only applies on CPU, ignoring it on GPU")
+            elif self.model_config.quantization == "int8":
+                # Swap Linear layers for int8 dynamically quantized versions
+                model = torch.ao.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+                logging.info("Applied int8 dynamic quantization to linear layers")
+            elif self.model_config.quantization == "bf16" and model.dtype != torch.bfloat16:
+                logging.warning("CPU lacks native bf16 support, serving in float32")
+
             logging.info("Model and tokenizer loaded successfully from local cache.")
 
+            generation_kwargs = self._generation_kwargs()
+            assisted_stats = None
+            draft_model_name = self._draft_model_name()
+            if self.model_config.enable_assisted_generation and not draft_model_name:
+                logging.warning("Assisted generation enabled without a draft_model_name, ignoring it")
+            elif draft_model_name:
+                draft_model = self._load_draft_model(draft_model_name, model)
+                generation_kwargs["assistant_model"] = draft_model
+                assisted_stats = AssistedGenerationStats(model, draft_model)
+
             pipe = pipeline(
                 model=model,
                 tokenizer=tokenizer,
                 task="text-generation",
-                max_new_tokens=self.model_config.max_new_tokens,
-                temperature=self.model_config.temperature
+                **generation_kwargs
             )
+            pipe.assisted_generation_stats = assisted_stats
 
             logging.info("Pipeline loaded successfully, model creation is complete.")
             return HuggingFacePipeline(pipeline=pipe)
@@ -81,10 +1025,28 @@ class RagModel:
             logging.error(f"Error in loading model: {str(e)}")
             raise CustomException(e, sys)
 
+    def _load_draft_model(self, draft_model_name: str, model):
+        """Load the draft model used to propose tokens for assisted generation."""
+        local_draft_path = self.download_model(draft_model_name)
+        logging.info(f"Loading draft model from local cache: {local_draft_path}")
+        draft_model = AutoModelForCausalLM.from_pretrained(
+            local_draft_path,
+            torch_dtype=model.dtype,
+            local_files_only=True
+        ).to(model.device)
+
+        if draft_model.config.vocab_size != model.config.vocab_size:
+            logging.warning(
+                f"Draft model vocab size {draft_model.config.vocab_size} differs from "
+                f"main model {model.config.vocab_size}; they must share a tokenizer"
+            )
+        return draft_model
+
     def clear_cache(self):
         """Clear the local model cache directory."""
         try:
             import shutil
+            # The manifest lives inside cache_dir, so it is cleared as well
             if os.path.exists(self.model_config.cache_dir):
                 shutil.rmtree(self.model_config.cache_dir)
                 os.makedirs(self.model_config.cache_dir)
@@ -0,0 +1,168 @@
+import os
+import shutil
+import sqlite3
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain.embeddings.base import Embeddings
+from langchain.vectorstores import Chroma
+from langchain.vectorstores.base import VectorStore
+
+from src.components.numpy_vector_store import NumpyVectorStore
+from src.components.vector_store import CompactVectorStore
+from src.logger import logging
+
+# SQLite files are copied through the backup API, which reads a consistent snapshot
+_SQLITE_SUFFIXES = (".sqlite", ".sqlite3")
+# SQLite journals, rebuilt by the copy
+_JOURNAL_SUFFIXES = ("-wal", "-shm", "-journal")
+
+
+def clone_directory(source_path: str, target_path: str, linkable_suffixes: Iterable[str] = ()) -> Dict[str, int]:
+    """
+    Copy a store directory without re-embedding anything.
+
+    Files with a linkable suffix are only ever replaced whole by their
+    writers (os.replace of a temporary file), so they are hardlinked and the
+    two directories share their bytes until one side rewrites a file. SQLite
+    databases are copied through the backup API and any other file is copied.
+
+    Args:
+        source_path: Existing store directory
+        target_path: New directory, which must not exist yet
+        linkable_suffixes: Suffixes of the files safe to hardlink
+
+    Returns:
+        Dict with the number of files linked and copied, and the bytes copied
+    """
+    linkable_suffixes = tuple(linkable_suffixes)
+    stats = {"linked": 0, "copied": 0, "copied_bytes": 0}
+    os.makedirs(os.path.dirname(os.path.abspath(target_path)), exist_ok=True)
+    os.makedirs(target_path)
+    for root, _, files in os.walk(source_path):
+        target_root = os.path.join(target_path, os.path.relpath(root, source_path))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            source_file, target_file = os.path.join(root, name), os.path.join(target_root, name)
+            if name.endswith(_JOURNAL_SUFFIXES) or ".tmp" in name:
+                continue
+            if name.endswith(_SQLITE_SUFFIXES):
+                source_conn, target_conn = sqlite3.connect(source_file), sqlite3.connect(target_file)
+                try:
+                    source_conn.backup(target_conn)
+                finally:
+                    target_conn.close()
+                    source_conn.close()
+            elif name.endswith(linkable_suffixes):
+                try:
+                    os.link(source_file, target_file)
+                    stats["linked"] += 1
+                    continue
+                except OSError:
+                    # Another filesystem, or no hardlink support
+                    shutil.copy2(source_file, target_file)
+            else:
+                shutil.copy2(source_file, target_file)
+            stats["copied"] += 1
+            stats["copied_bytes"] += os.path.getsize(target_file)
+    logging.info(f"Cloned {source_path} to {target_path}: {stats}")
+    return stats
+
+
+class VectorBackend(ABC):
+    """Creates and opens the vector store of one pipeline directory."""
+
+    name: str = ""
+    # Files the store only replaces atomically, shared by hardlink between clones
+    linkable_suffixes: Tuple[str, ...] = ()
+
+    @abstractmethod
+    def exists(self, persist_path: str) -> bool:
+        """Whether persist_path holds a store of this backend."""
+
+    @abstractmethod
+    def create(self, persist_path: str, embeddings: Optional[Embeddings]) -> VectorStore:
+        """New, empty store in persist_path."""
+
+    @abstractmethod
+    def open(self, persist_path: str, embeddings: Optional[Embeddings]) -> VectorStore:
+        """Existing store in persist_path."""
+
+    def clone(self, source_path: str, target_path: str, linkable_suffixes: Iterable[str] = ()) -> Dict[str, int]:
+        """Copy of the store in source_path at target_path, see clone_directory."""
+        return clone_directory(source_path, target_path, self.linkable_suffixes + tuple(linkable_suffixes))
+
+
+class ChromaBackend(VectorBackend):
+    # HNSW segment files are updated in place, so a clone copies them
+    name = "chroma"
+
+    def exists(self, persist_path: str) -> bool:
+        # chromadb >= 0.4 keeps one SQLite file, older versions duckdb/parquet files
+        return any(
+            os.path.exists(os.path.join(persist_path, name))
+            for name in ("chroma.sqlite3", "chroma-collections.parquet")
+        )
+
+    def create(self, persist_path: str, embeddings: Optional[Embeddings]) -> VectorStore:
+        return Chroma(persist_directory=persist_path, embedding_function=embeddings)
+
+    def open(self, persist_path: str, embeddings: Optional[Embeddings]) -> VectorStore:
+        return Chroma(persist_directory=persist_path, embedding_function=embeddings)
+
+
+class CompactBackend(VectorBackend):
+    linkable_suffixes = (".npy", ".jsonl", ".json")
+
+    def __init__(self, dtype: str, rescore_factor: int = 4, rescore_dtype: Optional[str] = "float16"):
+        self.name = dtype
+        self.rescore_factor = rescore_factor
+        self.rescore_dtype = rescore_dtype
+
+    def exists(self, persist_path: str) -> bool:
+        return CompactVectorStore.exists(persist_path)
+
+    def create(self, persist_path: str, embeddings: Optional[Embeddings]) -> VectorStore:
+        return CompactVectorStore(persist_path, embeddings, self.name, self.rescore_factor, self.rescore_dtype)
+
+    def open(self, persist_path: str, embeddings: Optional[Embeddings]) -> VectorStore:
+        return CompactVectorStore.load(persist_path, embeddings)
+
+
+class NumpyBackend(VectorBackend):
+    name = "numpy"
+    # The vector file is appended to in place, so a clone copies it
+    linkable_suffixes = ("ivf_centroids.npy", "ivf_order.npy", "ivf_offsets.npy", ".json")
+
+    def __init__(self, ivf_min_vectors: int = 50000, nprobe: int = 8):
+        self.ivf_min_vectors = ivf_min_vectors
+        self.nprobe = nprobe
+
+    def exists(self, persist_path: str) -> bool:
+        return NumpyVectorStore.exists(persist_path)
+
+    def create(self, persist_path: str, embeddings: Optional[Embeddings]) -> VectorStore:
+        return NumpyVectorStore(persist_path, embeddings, self.ivf_min_vectors, self.nprobe)
+
+    def open(self, persist_path: str, embeddings: Optional[Embeddings]) -> VectorStore:
+        return NumpyVectorStore(persist_path, embeddings, self.ivf_min_vectors, self.nprobe)
+
+
+def build_backends(config) -> Dict[str, VectorBackend]:
+    """Every backend, configured from a DataBaseConfig and keyed by its vector_storage name."""
+    backends: List[VectorBackend] = [
+        ChromaBackend(),
+        NumpyBackend(config.ivf_min_vectors, config.ivf_nprobe),
+        CompactBackend("float16", config.rescore_factor, config.compact_rescore_dtype),
+        CompactBackend("int8", config.rescore_factor, config.compact_rescore_dtype),
+    ]
+    return {backend.name: backend for backend in backends}
+
+
+def detect_backend(persist_path: str, backends: Dict[str, VectorBackend]) -> VectorBackend:
+    """Backend of an existing pipeline directory, whatever the configured one is."""
+    for backend in backends.values():
+        if backend.exists(persist_path):
+            return backend
+    # Directories from before the backend interface hold Chroma stores
+    return backends["chroma"]
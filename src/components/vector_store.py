@@ -0,0 +1,540 @@
+import json
+import os
+import sys
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+from langchain.vectorstores.base import VectorStore
+
+from src.logger import logging
+from src.exception import CustomException
+
+META_FILE = "compact_meta.json"
+CODES_FILE = "codes.npy"
+SCALES_FILE = "scales.npy"
+RESCORE_FILES = {"float32": "vectors.f32.npy", "float16": "vectors.f16.npy"}
+DOCS_FILE = "docs.jsonl"
+
+# Rows the in-memory arrays are first allocated with; they double when full
+_MIN_CAPACITY = 1024
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Compress float32 vectors to float16, or to int8 with one scale per vector.
+
+    Args:
+        vectors: Array of shape (n, dim)
+        dtype: "float16" or "int8"
+
+    Returns:
+        Tuple of (codes, per-vector scales or None)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unsupported compact dtype: {dtype}")
+
+
+_COMPARISONS = {
+    "$eq": lambda value, operand: value == operand,
+    # As in Chroma and SQL, a chunk without the key matches no comparison
+    "$ne": lambda value, operand: value is not None and value != operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value is not None and value not in operand,
+}
+
+
+def matches_where(metadata: dict, where: Optional[dict]) -> bool:
+    """Evaluate a Chroma-style metadata filter against one chunk's metadata."""
+    if not where:
+        return True
+    for key, value in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, part) for part in value):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, part) for part in value):
+                return False
+        else:
+            conditions = value if isinstance(value, dict) else {"$eq": value}
+            for operator, operand in conditions.items():
+                if operator not in _COMPARISONS:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+                if not _COMPARISONS[operator](metadata.get(key), operand):
+                    return False
+    return True
+
+
+def _key_conditions(where: dict, key: str) -> List[dict]:
+    """Conditions a filter places on one key, at its top level or in a top-level $and."""
+    found = []
+    for name, value in where.items():
+        if name == "$and":
+            for part in value:
+                found.extend(_key_conditions(part, key))
+        elif name == key:
+            found.append(value if isinstance(value, dict) else {"$eq": value})
+    return found
+
+
+def _append_rows(array: Optional[np.ndarray], count: int, rows: np.ndarray) -> np.ndarray:
+    """
+    Write rows after the first count rows of array, doubling its capacity when full.
+
+    Rows below count are never modified, so a reader holding the old array
+    and count still sees consistent data. Memory maps are copied first.
+    """
+    needed = count + len(rows)
+    if array is None or len(array) < needed or isinstance(array, np.memmap):
+        grown = np.empty((max(needed, 2 * count, _MIN_CAPACITY),) + rows.shape[1:], dtype=rows.dtype)
+        if count:
+            grown[:count] = array[:count]
+        array = grown
+    array[count:needed] = rows
+    return array
+
+
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize vectors along the last axis."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+class _Snapshot(NamedTuple):
+    count: int
+    codes: Optional[np.ndarray]
+    scales: Optional[np.ndarray]
+    rescore: Optional[np.ndarray]
+    ids: List[str]
+    texts: List[str]
+    metadatas: List[dict]
+    rows: Optional[np.ndarray]
+
+
+class CompactVectorStore(VectorStore):
+    """
+    Vector store keeping a scalar-quantized index with exact rescoring.
+
+    Search scores the float query against the compact codes for
+    rescore_factor * k candidates, then rescores just those candidates with
+    a copy of their vectors in rescore_dtype. The copy lives in a side file,
+    memory-mapped once loaded, and is only kept when it is wider than the
+    codes: the default, int8 codes rescored from float16, takes 3 bytes per
+    dimension against 4 for float32, and float16 codes need no side file.
+    With rescore_dtype None the scores against the codes are final.
+    Vectors are L2-normalized on the way in, so scores are cosine similarity.
+    A source -> page -> rows index narrows filtered searches to the rows of
+    the matching sources and pages before any metadata is evaluated.
+    Writers hold a lock and only append past the published row count or
+    swap in new arrays, so a search works on a consistent snapshot.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_function: Optional[Embeddings],
+        dtype: str = "int8",
+        rescore_factor: int = 4,
+        rescore_dtype: Optional[str] = "float16"
+    ):
+        if rescore_dtype is not None and rescore_dtype not in RESCORE_FILES:
+            raise ValueError(f"Unsupported rescore dtype: {rescore_dtype}")
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.dtype = dtype
+        self.rescore_factor = rescore_factor
+        self.rescore_dtype = rescore_dtype
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self._lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        self._count = 0
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._rescore: Optional[np.ndarray] = None
+        self._source_rows: Dict[Any, Dict[Any, List[int]]] = {}
+        # Whether the vector files differ from memory; metadata-only changes rewrite just the docs file
+        self._vectors_dirty = True
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    @property
+    def keeps_rescore_vectors(self) -> bool:
+        """Whether a side file of wider vectors than the codes is kept for rescoring."""
+        return (
+            self.rescore_dtype is not None
+            and np.dtype(self.rescore_dtype).itemsize > np.dtype(self.dtype).itemsize
+        )
+
+    @staticmethod
+    def exists(persist_directory: str) -> bool:
+        return os.path.exists(os.path.join(persist_directory, META_FILE))
+
+    @classmethod
+    def load(cls, persist_directory: str, embedding_function: Optional[Embeddings]) -> "CompactVectorStore":
+        """Open a persisted compact store; rescore vectors stay memory-mapped."""
+        with open(os.path.join(persist_directory, META_FILE), "r") as file:
+            meta = json.load(file)
+        rescore_dtype = meta["rescore_dtype"]
+        store = cls(
+            persist_directory,
+            embedding_function,
+            dtype=meta["dtype"],
+            rescore_factor=meta["rescore_factor"],
+            rescore_dtype=rescore_dtype
+        )
+        if meta["count"]:
+            store._codes = np.load(os.path.join(persist_directory, CODES_FILE))
+            if meta["dtype"] == "int8":
+                store._scales = np.load(os.path.join(persist_directory, SCALES_FILE))
+            if store.keeps_rescore_vectors:
+                store._rescore = np.load(os.path.join(persist_directory, RESCORE_FILES[rescore_dtype]), mmap_mode="r")
+        with open(os.path.join(persist_directory, DOCS_FILE), "r") as file:
+            for line in file:
+                record = json.loads(line)
+                store.ids.append(record["id"])
+                store.texts.append(record["text"])
+                store.metadatas.append(record["metadata"])
+        store._count = len(store.ids)
+        store._index_rows(0)
+        store._vectors_dirty = False
+        return store
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _index_rows(self, start: int) -> None:
+        """Add rows from start onwards to the source/page index."""
+        for row in range(start, len(self.metadatas)):
+            metadata = self.metadatas[row]
+            pages = self._source_rows.setdefault(metadata.get("source"), {})
+            pages.setdefault(metadata.get("page"), []).append(row)
+
+    def _filtered_rows(self, where: dict) -> np.ndarray:
+        """
+        Rows matching a metadata filter; called with the lock held.
+
+        Source and page conditions select rows through the index; only
+        those rows are checked against the full filter.
+        """
+        source_conditions = _key_conditions(where, "source")
+        page_conditions = _key_conditions(where, "page")
+        rows = [
+            row
+            for source, pages in self._source_rows.items()
+            if all(matches_where({"source": source}, {"source": condition}) for condition in source_conditions)
+            for page, page_rows in pages.items()
+            if all(matches_where({"page": page}, {"page": condition}) for condition in page_conditions)
+            for row in page_rows
+        ]
+        rows.sort()
+        return np.array([row for row in rows if matches_where(self.metadatas[row], where)], dtype=np.int64)
+
+    def _rescore_vectors(self) -> Optional[np.ndarray]:
+        """Rescore vectors, reopening the memory map after close(); called with the lock held."""
+        if self._rescore is None and self.keeps_rescore_vectors and self._count:
+            self._rescore = np.load(
+                os.path.join(self.persist_directory, RESCORE_FILES[self.rescore_dtype]), mmap_mode="r"
+            )
+        return self._rescore
+
+    def _snapshot_locked(self, where: Optional[dict] = None) -> _Snapshot:
+        return _Snapshot(
+            self._count, self._codes, self._scales, self._rescore_vectors(),
+            self.ids, self.texts, self.metadatas,
+            self._filtered_rows(where) if where else None
+        )
+
+    def _snapshot(self, where: Optional[dict] = None) -> _Snapshot:
+        """Consistent view of the store for a reader, with the rows matching where if given."""
+        with self._lock:
+            return self._snapshot_locked(where)
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        vectors: np.ndarray,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """Add texts with precomputed vectors, without calling the embedding model."""
+        if not texts:
+            return []
+        vectors = normalize_vectors(vectors)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        codes, scales = quantize(vectors, self.dtype)
+
+        with self._lock:
+            count = self._count
+            if count and vectors.shape[1] != self._codes.shape[1]:
+                raise ValueError(f"Vector dim {vectors.shape[1]} does not match store dim {self._codes.shape[1]}")
+            self._codes = _append_rows(self._codes, count, codes)
+            if scales is not None:
+                self._scales = _append_rows(self._scales, count, scales)
+            if self.keeps_rescore_vectors:
+                self._rescore = _append_rows(self._rescore_vectors(), count, vectors.astype(self.rescore_dtype))
+            self.ids.extend(ids)
+            self.texts.extend(texts)
+            self.metadatas.extend(metadatas)
+            self._index_rows(count)
+            # Publish the rows only once every array holds them
+            self._count = count + len(ids)
+            self._vectors_dirty = True
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        texts = list(texts)
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas, ids)
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[dict] = None,
+        include: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> dict:
+        """Stored ids, texts and metadata, filtered like Chroma.get by ids and metadata."""
+        snapshot = self._snapshot(where)
+        wanted = set(ids) if ids is not None else None
+        rows = snapshot.rows.tolist() if where else range(snapshot.count)
+        rows = [row for row in rows if wanted is None or snapshot.ids[row] in wanted]
+        result = {
+            "ids": [snapshot.ids[row] for row in rows],
+            "documents": [snapshot.texts[row] for row in rows],
+            "metadatas": [snapshot.metadatas[row] for row in rows],
+        }
+        if include and "embeddings" in include:
+            result["embeddings"] = self._row_vectors(snapshot, rows).tolist()
+        return result
+
+    @staticmethod
+    def _row_vectors(snapshot: _Snapshot, rows) -> np.ndarray:
+        """Float vectors of rows, from the rescore copy or dequantized from the codes."""
+        if snapshot.rescore is not None:
+            return np.asarray(snapshot.rescore[rows], dtype=np.float32)
+        if not len(rows):
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = snapshot.codes[rows].astype(np.float32)
+        return vectors * snapshot.scales[rows][:, None] if snapshot.scales is not None else vectors
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        remove = set(ids)
+        with self._lock:
+            count = self._count
+            if not count:
+                return False
+            keep = np.array([doc_id not in remove for doc_id in self.ids[:count]], dtype=bool)
+            if keep.all():
+                return False
+            # New arrays and lists, so snapshots taken before stay valid
+            self._codes = self._codes[:count][keep]
+            if self._scales is not None:
+                self._scales = self._scales[:count][keep]
+            rescore = self._rescore_vectors()
+            if rescore is not None:
+                self._rescore = np.asarray(rescore[:count])[keep]
+            self.ids = [value for value, flag in zip(self.ids, keep) if flag]
+            self.texts = [value for value, flag in zip(self.texts, keep) if flag]
+            self.metadatas = [value for value, flag in zip(self.metadatas, keep) if flag]
+            self._count = len(self.ids)
+            self._vectors_dirty = True
+            # Rows were renumbered
+            self._source_rows = {}
+            self._index_rows(0)
+        return True
+
+    def update_metadatas(self, ids: List[str], metadatas: List[dict]) -> None:
+        """Replace the metadata of stored chunks; persist() then rewrites only the docs file."""
+        with self._lock:
+            rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+            updated = list(self.metadatas)
+            for doc_id, metadata in zip(ids, metadatas):
+                if doc_id in rows:
+                    updated[rows[doc_id]] = metadata
+            self.metadatas = updated
+            self._source_rows = {}
+            self._index_rows(0)
+
+    def persist(self) -> None:
+        """
+        Write changed files to temporary names, then swap them into place.
+
+        The vector files and meta file are left alone when only metadata
+        changed, so they stay shared with any hardlinked clone. Searches and
+        additions continue while the files are written.
+        """
+        with self._persist_lock:
+            with self._lock:
+                snapshot = self._snapshot_locked()
+                vectors_changed = self._vectors_dirty or not self.exists(self.persist_directory)
+                self._vectors_dirty = False
+            try:
+                self._write_files(snapshot, vectors_changed)
+            except Exception as e:
+                with self._lock:
+                    self._vectors_dirty = self._vectors_dirty or vectors_changed
+                raise CustomException(e, sys)
+
+    def _write_files(self, snapshot: _Snapshot, vectors_changed: bool) -> None:
+        os.makedirs(self.persist_directory, exist_ok=True)
+        count = snapshot.count
+        written = []
+
+        def save_array(name: str, array: np.ndarray) -> None:
+            tmp_path = os.path.join(self.persist_directory, f"{name}.tmp.npy")
+            np.save(tmp_path, array)
+            written.append((tmp_path, os.path.join(self.persist_directory, name)))
+
+        dim = snapshot.codes.shape[1] if snapshot.codes is not None else 0
+        if vectors_changed:
+            code_dtype = np.float16 if self.dtype == "float16" else np.int8
+            save_array(CODES_FILE, snapshot.codes[:count] if count else np.zeros((0, dim), dtype=code_dtype))
+            if self.dtype == "int8":
+                save_array(SCALES_FILE, snapshot.scales[:count] if count else np.zeros(0, dtype=np.float32))
+            if self.keeps_rescore_vectors:
+                save_array(
+                    RESCORE_FILES[self.rescore_dtype],
+                    np.asarray(snapshot.rescore[:count]) if count else np.zeros((0, dim), dtype=self.rescore_dtype)
+                )
+
+        docs_tmp = os.path.join(self.persist_directory, f"{DOCS_FILE}.tmp")
+        with open(docs_tmp, "w") as file:
+            for row in range(count):
+                file.write(json.dumps({
+                    "id": snapshot.ids[row], "text": snapshot.texts[row], "metadata": snapshot.metadatas[row]
+                }) + "\n")
+        written.append((docs_tmp, os.path.join(self.persist_directory, DOCS_FILE)))
+
+        if vectors_changed:
+            meta_tmp = os.path.join(self.persist_directory, f"{META_FILE}.tmp")
+            with open(meta_tmp, "w") as file:
+                json.dump({
+                    "dtype": self.dtype,
+                    "rescore_factor": self.rescore_factor,
+                    "rescore_dtype": self.rescore_dtype,
+                    "count": count,
+                    "dim": int(dim)
+                }, file)
+            written.append((meta_tmp, os.path.join(self.persist_directory, META_FILE)))
+
+        # Replacing (not rewriting) files keeps existing memory maps valid
+        for tmp_path, final_path in written:
+            os.replace(tmp_path, final_path)
+
+    def _approximate_scores(self, snapshot: _Snapshot, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Scores of the float query against the codes of rows, or of every row."""
+        codes = snapshot.codes[:snapshot.count] if rows is None else snapshot.codes[rows]
+        scores = codes.astype(np.float32) @ query
+        if self.dtype == "int8":
+            scores *= snapshot.scales[:snapshot.count] if rows is None else snapshot.scales[rows]
+        return scores
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Top-k documents by cosine similarity, rescored exactly, optionally within a metadata filter."""
+        # Filtered rows are selected before scoring, so only they are scanned
+        snapshot = self._snapshot(filter)
+        rows = snapshot.rows if filter else np.arange(snapshot.count)
+        if not len(rows):
+            return []
+        query = normalize_vectors(embedding)
+        approximate = self._approximate_scores(snapshot, query, rows if filter else None)
+
+        n_candidates = min(len(rows), max(k, k * self.rescore_factor))
+        if n_candidates < len(rows):
+            chosen = np.argpartition(-approximate, n_candidates - 1)[:n_candidates]
+        else:
+            chosen = np.arange(len(rows))
+        candidates = rows[chosen]
+
+        if snapshot.rescore is not None:
+            scores = np.asarray(snapshot.rescore[candidates], dtype=np.float32) @ query
+        else:
+            scores = approximate[chosen]
+        order = np.argsort(-scores)[:k]
+        return [
+            (Document(page_content=snapshot.texts[candidates[i]], metadata=snapshot.metadatas[candidates[i]]),
+             float(scores[i]))
+            for i in order
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k, filter=filter, **kwargs)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter=filter, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter=filter, **kwargs)]
+
+    def _similarity_search_with_relevance_scores(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score(query, k, **kwargs)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        persist_directory: str = None,
+        dtype: str = "int8",
+        rescore_factor: int = 4,
+        rescore_dtype: Optional[str] = "float16",
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> "CompactVectorStore":
+        store = cls(persist_directory, embedding, dtype, rescore_factor, rescore_dtype)
+        store.add_texts(texts, metadatas, ids)
+        logging.info(f"Built {dtype} compact store with {len(store)} vectors")
+        return store
+
+    def close(self) -> None:
+        """Release the rescore vector memory map; it is reopened if the store is searched again."""
+        with self._lock:
+            if isinstance(self._rescore, np.memmap):
+                self._rescore = None
+
+    def disk_bytes(self) -> int:
+        """Bytes this store occupies in its persist directory."""
+        names = [CODES_FILE, SCALES_FILE, *RESCORE_FILES.values(), DOCS_FILE, META_FILE]
+        return sum(
+            os.path.getsize(os.path.join(self.persist_directory, name))
+            for name in names
+            if os.path.exists(os.path.join(self.persist_directory, name))
+        )
@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Dict
+
+from langchain.vectorstores import Chroma
+
+from src.components.database import DataBase, DataBaseConfig, copy_collection
+from src.components.deduplication import DeduplicationConfig
+from src.components.vector_backends import ChromaBackend
+from src.logger import logging
+from src.exception import CustomException
+
+
+def migrate_to_shared_layout(
+    persist_dir: str = None,
+    shared_dir: str = None,
+    remove_source: bool = False,
+    batch_size: int = 1000,
+) -> Dict[str, Dict]:
+    """
+    Copy per-pipeline Chroma directories into collections of the shared store.
+
+    Stored vectors, texts, metadata and chunk ids are copied as they are, so
+    nothing is re-embedded. Copies are upserts, so an interrupted migration
+    can simply be run again. A source directory is only removed once its
+    collection holds the same number of chunks. Stores of other backends stay
+    in the per-pipeline layout and are reported as skipped.
+
+    Args:
+        persist_dir: Per-pipeline layout root, defaults to DataBaseConfig.PERSIST_DIR
+        shared_dir: Shared store directory, defaults to DataBaseConfig.SHARED_DIR
+        remove_source: Delete each pipeline directory after a verified copy
+        batch_size: Chunks read and written per batch
+
+    Returns:
+        Dict mapping pipeline id to status, chunk count and seconds
+    """
+    try:
+        defaults = DataBaseConfig()
+        persist_dir = persist_dir or defaults.PERSIST_DIR
+        shared_dir = shared_dir or defaults.SHARED_DIR
+        remove_source = str(remove_source).lower() in ("1", "true", "yes")
+        batch_size = int(batch_size)
+        shared = DataBase(DataBaseConfig(PERSIST_DIR=persist_dir, SHARED_DIR=shared_dir, storage_layout="shared"))
+        state_file = DeduplicationConfig().state_file
+        results = {}
+
+        for pipeline_id in sorted(os.listdir(persist_dir)):
+            source_path = os.path.join(persist_dir, pipeline_id)
+            if not os.path.isdir(source_path) or os.path.abspath(source_path) == os.path.abspath(shared_dir):
+                continue
+            if not ChromaBackend().exists(source_path):
+                results[pipeline_id] = {"status": "skipped", "reason": "not a Chroma store"}
+                continue
+
+            start = time.perf_counter()
+            source = Chroma(persist_directory=source_path)
+            target = shared._shared_store(pipeline_id, None)
+            total = copy_collection(source, target, batch_size)
+
+            state_path = shared.get_persist_dir(pipeline_id)
+            os.makedirs(state_path, exist_ok=True)
+            if os.path.exists(os.path.join(source_path, state_file)):
+                shutil.copy2(os.path.join(source_path, state_file), os.path.join(state_path, state_file))
+
+            copied = target._collection.count()
+            if copied != total:
+                results[pipeline_id] = {"status": "mismatch", "chunks": total, "copied": copied}
+                logging.error(f"Migration of pipeline {pipeline_id} copied {copied}/{total} chunks")
+                continue
+            if remove_source:
+                shutil.rmtree(source_path)
+            results[pipeline_id] = {"status": "migrated", "chunks": total, "seconds": time.perf_counter() - start}
+            logging.info(f"Migrated pipeline {pipeline_id} to the shared store: {results[pipeline_id]}")
+
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+if __name__ == "__main__":
+    print(json.dumps(migrate_to_shared_layout(*sys.argv[1:]), indent=2, default=str))
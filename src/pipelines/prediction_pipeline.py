@@ -1,24 +1,104 @@
 import os
 import sys
-from typing import Union, Dict, Any
+from typing import Union, Dict, Any, Iterator, List, Optional, Tuple
 
 from langchain.chains import RetrievalQA
 from src.logger import logging
 from src.exception import CustomException
 from src.components.data_transformation import DataTransformation
-from src.components.database import DataBase
-from src.components.rag_model import RagModel
+from src.components.database import DataBase, metadata_filter
+from src.components.context_packer import ContextPackerConfig, build_retriever
+from src.components.hybrid_retriever import HybridRetrieverConfig
+from src.components.rag_model import ModelConfig, RagModel, stream_generate
 from src.utils import pipeline_exists
 
 
+def stream_retrieval_qa(chain: RetrievalQA, query: str) -> Iterator[Dict[str, Any]]:
+    """
+    Run a "stuff" RetrievalQA chain as a stream of events.
+
+    Retrieval runs first and its sources are yielded before any generation
+    starts, followed by one event per generated text piece.
+
+    Args:
+        chain: RetrievalQA chain built with chain_type="stuff"
+        query: Question to ask
+
+    Yields:
+        Dict with "event" ("sources", "token" or "done") and "data"
+    """
+    docs = chain.retriever.get_relevant_documents(query)
+    yield {"event": "sources", "data": [doc.page_content for doc in docs]}
+
+    combine_chain = chain.combine_documents_chain
+    llm_chain = combine_chain.llm_chain
+    inputs = combine_chain._get_inputs(docs, question=query)
+    prompt = llm_chain.prompt.format(
+        **{key: value for key, value in inputs.items() if key in llm_chain.prompt.input_variables}
+    )
+
+    answer = []
+    for text in stream_generate(llm_chain.llm, prompt):
+        answer.append(text)
+        yield {"event": "token", "data": text}
+    yield {"event": "done", "data": "".join(answer)}
+
+
 class PredictPipeline:
-    def __init__(self):
+    def __init__(self, model_config: Optional[ModelConfig] = None):
         self.data_transform = DataTransformation()
         self.data_base = DataBase()
-        self.model = RagModel()
+        self.model = RagModel(model_config)
         self.search_kwargs = {"k": 2}
+        self.packer_config = ContextPackerConfig()
+        self.hybrid_config = HybridRetrieverConfig()
         self.pipelines: Dict[int, Any] = {}
 
+    def _build_chain(self, vectorstore, llm, keyword_index, search_kwargs: Dict[str, Any]) -> RetrievalQA:
+        return RetrievalQA.from_chain_type(
+            llm=llm,
+            chain_type="stuff",
+            retriever=build_retriever(
+                vectorstore, llm, search_kwargs, self.packer_config, keyword_index, self.hybrid_config
+            ),
+            return_source_documents=True,
+            verbose=True
+        )
+
+    def _filtered_chain(
+        self,
+        pipeline_id: int,
+        pipeline_data: Dict[str, Any],
+        sources: Optional[List[str]],
+        pages: Optional[Tuple[Optional[int], Optional[int]]],
+    ) -> RetrievalQA:
+        """
+        Chain of a loaded pipeline restricted to sources and a page range
+
+        Args:
+            pipeline_id: Unique identifier for the pipeline
+            pipeline_data: The loaded pipeline
+            sources: Source documents to search, by path or file name
+            pages: (first, last) page range, 1-based and inclusive
+
+        Returns:
+            RetrievalQA: The pipeline's chain when nothing is restricted, else
+            a chain sharing its model and stores with a filtered retriever
+        """
+        known_sources = (
+            self.data_base.list_sources(pipeline_id, pipeline_data["vectorstore"]) if sources else None
+        )
+        search_filter = metadata_filter(sources, pages, known_sources)
+        if search_filter is None:
+            return pipeline_data["chain"]
+        logging.info(f"Filtering pipeline {pipeline_id} search with {search_filter}")
+        return self._build_chain(
+            pipeline_data["vectorstore"],
+            pipeline_data["llm"],
+            pipeline_data["keyword_index"],
+            {**self.search_kwargs, "filter": search_filter}
+        )
+
     def _load_pipeline(self, pipeline_id: int) -> Dict[str, Any]:
         """
         Load or get an existing pipeline
@@ -43,22 +123,23 @@ class PredictPipeline:
             # Get embeddings from data transformation
             embeddings = self.data_transform.transform_data()
 
-            # Load the vector store
+            # Load the vector store and its keyword index
             vectorstore = self.data_base.load_database(pipeline_id, embeddings)
-
-            # Create the chain
-            chain = RetrievalQA.from_chain_type(
-                llm=self.model.load_model(),
-                chain_type="stuff",
-                retriever=vectorstore.as_retriever(search_kwargs=self.search_kwargs),
-                return_source_documents=True,
-                verbose=True
+            keyword_index = (
+                self.data_base.load_keyword_index(pipeline_id, vectorstore) if self.hybrid_config.enabled else None
             )
 
+            # Create the chain, sharing the process-wide model instance
+            llm = self.model.load_model()
+            chain = self._build_chain(vectorstore, llm, keyword_index, self.search_kwargs)
+
             # Store in memory
             pipeline_data = {
                 "chain": chain,
-                "vectorstore": vectorstore
+                "vectorstore": vectorstore,
+                "keyword_index": keyword_index,
+                "llm": llm,
+                "model_key": self.model.registry_key()
             }
             self.pipelines[pipeline_id] = pipeline_data
 
@@ -69,13 +150,21 @@ class PredictPipeline:
             logging.error(f"Error loading pipeline {pipeline_id}: {str(e)}")
             raise CustomException(e, sys)
 
-    def query_pipeline(self, pipeline_id: int, query: str) -> Union[Dict[str, Any], int]:
+    def query_pipeline(
+        self,
+        pipeline_id: int,
+        query: str,
+        sources: Optional[List[str]] = None,
+        pages: Optional[Tuple[Optional[int], Optional[int]]] = None,
+    ) -> Union[Dict[str, Any], int]:
         """
         Query a specific pipeline with a question
 
         Args:
             pipeline_id: Unique identifier for the pipeline
             query: Question to ask
+            sources: Only search these source documents, by path or file name
+            pages: Only search this (first, last) page range, 1-based and inclusive
 
         Returns:
             Dict containing answer and sources, or -1 if pipeline doesn't exist
@@ -94,7 +183,8 @@ class PredictPipeline:
 
             # Process query
             logging.info(f"Processing query for pipeline {pipeline_id}")
-            result = pipeline_data["chain"]({"query": query})
+            chain = self._filtered_chain(pipeline_id, pipeline_data, sources, pages)
+            result = chain({"query": query})
 
             # Format response
             response = {
@@ -107,4 +197,58 @@ class PredictPipeline:
 
         except Exception as e:
             logging.error(f"Error processing query: {str(e)}")
-            raise CustomException(e, sys)
\ No newline at end of file
+            raise CustomException(e, sys)
+
+    def stream_query(
+        self,
+        pipeline_id: int,
+        query: str,
+        sources: Optional[List[str]] = None,
+        pages: Optional[Tuple[Optional[int], Optional[int]]] = None,
+    ) -> Union[Iterator[Dict[str, Any]], int]:
+        """
+        Query a specific pipeline, streaming the answer as it is generated
+
+        Args:
+            pipeline_id: Unique identifier for the pipeline
+            query: Question to ask
+            sources: Only search these source documents, by path or file name
+            pages: Only search this (first, last) page range, 1-based and inclusive
+
+        Returns:
+            Iterator of events (sources first, then tokens, then done),
+            or -1 if pipeline doesn't exist
+
+        Raises:
+            CustomException: If loading the pipeline fails
+        """
+        try:
+            if not pipeline_exists(str(pipeline_id)):
+                logging.warning(f"Pipeline {pipeline_id} does not exist")
+                return -1
+
+            pipeline_data = self._load_pipeline(pipeline_id)
+            logging.info(f"Streaming query for pipeline {pipeline_id}")
+            chain = self._filtered_chain(pipeline_id, pipeline_data, sources, pages)
+            return stream_retrieval_qa(chain, query)
+
+        except Exception as e:
+            logging.error(f"Error processing streaming query: {str(e)}")
+            raise CustomException(e, sys)
+
+    def unload_pipeline(self, pipeline_id: int) -> bool:
+        """
+        Drop a loaded pipeline from memory and release its model reference
+
+        Args:
+            pipeline_id: Unique identifier for the pipeline
+
+        Returns:
+            bool: True if the pipeline was loaded
+        """
+        pipeline_data = self.pipelines.pop(pipeline_id, None)
+        if pipeline_data is None:
+            return False
+        self.model.release_model()
+        logging.info(f"Unloaded pipeline {pipeline_id}")
+        return True
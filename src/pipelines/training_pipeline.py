@@ -1,8 +1,9 @@
 import os
 import sys
+import time
 import torch
-from typing import Dict, Any
-from src.components.rag_model import RagModel
+from typing import Dict, Any, List
+from src.components.rag_model import RagModel, model_registry
 from src.logger import logging
 from src.exception import CustomException
 from src.utils import pipeline_exists
@@ -11,6 +12,8 @@ from dataclasses import dataclass
 from src.components.data_ingestion import DataIngestion
 from src.components.data_transformation import DataTransformation
 from src.components.database import DataBase
+from src.components.context_packer import ContextPackerConfig, build_retriever
+from src.components.hybrid_retriever import HybridRetrieverConfig
 
 
 @dataclass
@@ -19,8 +22,11 @@ class TrainConfig:
         os.getcwd(),"RAG_BUILDER", "artifacts", "keys.txt"
     )
     search_kwargs = {"k": 2}
+    packer_config = ContextPackerConfig()
+    hybrid_config = HybridRetrieverConfig()
     verbose: bool = True
     return_source_documents: bool = False
+    streaming_ingestion: bool = False  # Parse, embed and insert page batches with bounded memory
 
 class Pipeline:
     def __init__(self):
@@ -67,39 +73,145 @@ class Pipeline:
                 logging.error("Document storage failed")
                 return -2
 
-            chunks, embeddings = data_transform.process_pdf(storage_path)
-
             # Create database and chain
             db = DataBase()
-            vector_store = db.create_database(pipeline_id, chunks, embeddings)
-
-            chain = RetrievalQA.from_chain_type(
-                llm=model.load_model(),
-                chain_type="stuff",
-                retriever=vector_store.as_retriever(
-                    search_kwargs=self.train_config.search_kwargs
-                ),
-                return_source_documents=self.train_config.return_source_documents,
-                verbose=self.train_config.verbose
-            )
+            if self.train_config.streaming_ingestion:
+                chunk_batches, embeddings = data_transform.stream_pdf(storage_path)
+                vector_store = db.ingest_stream(pipeline_id, chunk_batches, embeddings)
+            else:
+                chunks, embeddings = data_transform.process_pdf(storage_path)
+                vector_store = db.create_database(pipeline_id, chunks, embeddings)
+
+            self._register_pipeline(pipeline_id, vector_store, model, db.load_keyword_index(pipeline_id))
+            return 1
 
-            # Save pipeline
-            self.pipeline_dict[pipeline_id] = {
-                "chain": chain,
-                "vectorstore": vector_store
-            }
+        except Exception as e:
+            logging.error(f"Error creating pipeline: {str(e)}")
+            raise CustomException(e, sys)
 
-            # Persist pipeline ID
-            with open(self.train_config.key_path, "a") as file_key:
-                file_key.write(f"\n{pipeline_id}\n")
+    def create_pipeline_bulk(self, pipeline_id: int, docs_files: List) -> Dict[str, Any]:
+        """
+        Create a new pipeline from many documents at once
 
-            logging.info(f"Successfully created pipeline {pipeline_id}")
-            return 1
+        The PDFs are parsed and split in parallel worker processes, then all
+        chunks are written to the vector store in a single bulk insert.
+
+        Args:
+            pipeline_id: Unique identifier for the pipeline
+            docs_files: Document files to process
+
+        Returns:
+            Dict with "status" (1 if successful, -1 if pipeline already exists,
+            -2 for other errors) and the parsing stats
+        """
+        try:
+            if not pipeline_id or not docs_files:
+                logging.error("Invalid pipeline_id or docs_files")
+                return {"status": -2}
+
+            if pipeline_exists(str(pipeline_id)):
+                logging.warning(f"Pipeline {pipeline_id} already exists")
+                return {"status": -1}
+
+            data_ingestion = DataIngestion()
+            data_transform = DataTransformation()
+            model = RagModel()
+
+            storage_paths = data_ingestion.batch_process_files(docs_files, pipeline_id)
+            chunks, stats = data_transform.parallel_load_data(storage_paths)
+            if not chunks:
+                logging.error(f"No documents could be parsed for pipeline {pipeline_id}")
+                return {"status": -2, "stats": stats}
+
+            db = DataBase()
+            vector_store = db.create_database(pipeline_id, chunks, data_transform.transform_data())
+
+            self._register_pipeline(pipeline_id, vector_store, model, db.load_keyword_index(pipeline_id))
+            return {"status": 1, "stats": stats}
 
         except Exception as e:
             logging.error(f"Error creating pipeline: {str(e)}")
             raise CustomException(e, sys)
 
+    def clone_pipeline(self, src_id: int, dst_id: int) -> Dict[str, Any]:
+        """
+        Create a new pipeline serving the same documents as an existing one
+
+        The source's vector store, keyword index and deduplication state are
+        cloned on disk, sharing immutable files by hardlink, so nothing is
+        parsed or embedded again. The cloned chunks are then pointed at the
+        new pipeline's links to the documents, so they stay valid when the
+        source pipeline is deleted.
+
+        Args:
+            src_id: Pipeline to copy
+            dst_id: Unique identifier for the new pipeline
+
+        Returns:
+            Dict with "status" (1 if successful, -1 if dst_id already exists,
+            -2 if src_id does not exist or other errors) and the clone stats
+        """
+        try:
+            if not src_id or not dst_id:
+                logging.error("Invalid src_id or dst_id")
+                return {"status": -2}
+
+            if pipeline_exists(str(dst_id)):
+                logging.warning(f"Pipeline {dst_id} already exists")
+                return {"status": -1}
+
+            if not pipeline_exists(str(src_id)):
+                logging.warning(f"Pipeline {src_id} does not exist")
+                return {"status": -2}
+
+            start = time.perf_counter()
+            db = DataBase()
+            stats = db.clone_database(src_id, dst_id)
+            linked = DataIngestion().link_files(src_id, dst_id)
+            stats["documents"] = len(linked)
+
+            vector_store = db.load_database(dst_id, DataTransformation().transform_data())
+            stats["rewritten_chunks"] = db.rewrite_sources(dst_id, vector_store, linked)
+            self._register_pipeline(dst_id, vector_store, RagModel(), db.load_keyword_index(dst_id, vector_store))
+            stats["seconds"] = time.perf_counter() - start
+
+            logging.info(f"Cloned pipeline {src_id} to {dst_id}: {stats}")
+            return {"status": 1, "stats": stats}
+
+        except Exception as e:
+            logging.error(f"Error cloning pipeline: {str(e)}")
+            raise CustomException(e, sys)
+
+    def _register_pipeline(self, pipeline_id: int, vector_store, model: RagModel, keyword_index=None) -> None:
+        """Build the QA chain for a new store and persist the pipeline ID"""
+        llm = model.load_model()
+        chain = RetrievalQA.from_chain_type(
+            llm=llm,
+            chain_type="stuff",
+            retriever=build_retriever(
+                vector_store, llm,
+                self.train_config.search_kwargs,
+                self.train_config.packer_config,
+                keyword_index,
+                self.train_config.hybrid_config
+            ),
+            return_source_documents=self.train_config.return_source_documents,
+            verbose=self.train_config.verbose
+        )
+
+        # Save pipeline
+        self.pipeline_dict[pipeline_id] = {
+            "chain": chain,
+            "vectorstore": vector_store,
+            "model_key": model.registry_key()
+        }
+
+        # Persist pipeline ID
+        with open(self.train_config.key_path, "a") as file_key:
+            file_key.write(f"\n{pipeline_id}\n")
+
+        logging.info(f"Successfully created pipeline {pipeline_id}")
+
     def delete_pipeline(self, pipeline_id: int) -> int:
         """
         Delete an existing pipeline
@@ -118,7 +230,8 @@ class Pipeline:
 
             # Remove from pipeline dictionary if present
             if pipeline_id in self.pipeline_dict:
-                del self.pipeline_dict[pipeline_id]
+                pipeline_data = self.pipeline_dict.pop(pipeline_id)
+                model_registry.release(pipeline_data["model_key"])
 
             # Remove from keys file
             with open(self.train_config.key_path, 'r') as file:
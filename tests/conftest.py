@@ -0,0 +1,30 @@
+import hashlib
+from typing import List
+
+import numpy as np
+import pytest
+from langchain.embeddings.base import Embeddings
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic pseudo-random vectors per text, counting the texts embedded."""
+
+    def __init__(self, dim: int = 16):
+        self.dim = dim
+        self.embedded = 0
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+        return np.random.RandomState(seed).randn(self.dim).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+@pytest.fixture
+def embeddings() -> HashEmbeddings:
+    return HashEmbeddings()
@@ -0,0 +1,59 @@
+import pytest
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+from src.components.rag_model import AssistedLLM, ModelConfig, RagModel, model_registry
+
+WORDS = "the a transformer attention model layer encoder decoder uses is of and to".split()
+PROMPT = "the transformer uses attention"
+
+
+def _save_checkpoint(path, n_layer: int, seed: int) -> str:
+    vocab = {token: i for i, token in enumerate(["<unk>", "<eos>"] + WORDS)}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, unk_token="<unk>", eos_token="<eos>", pad_token="<eos>"
+    ).save_pretrained(path)
+
+    torch.manual_seed(seed)
+    config = GPT2Config(
+        vocab_size=len(vocab), n_positions=64, n_embd=32, n_layer=n_layer, n_head=2,
+        bos_token_id=1, eos_token_id=1
+    )
+    GPT2LMHeadModel(config).save_pretrained(path)
+    return str(path)
+
+
+@pytest.fixture
+def checkpoints(tmp_path):
+    main = _save_checkpoint(tmp_path / "main", n_layer=2, seed=0)
+    draft = _save_checkpoint(tmp_path / "draft", n_layer=1, seed=1)
+    yield main, draft
+    model_registry.clear()
+
+
+def test_assisted_output_matches_greedy_and_records_stats(checkpoints, tmp_path):
+    main, draft = checkpoints
+    cache_dir = str(tmp_path / "cache")
+
+    greedy = RagModel(ModelConfig(model_name=main, max_new_tokens=12, cache_dir=cache_dir)).load_model()
+    expected = greedy.pipeline(PROMPT, return_full_text=False)[0]["generated_text"]
+
+    assisted = RagModel(ModelConfig(
+        model_name=main,
+        max_new_tokens=12,
+        cache_dir=cache_dir,
+        draft_model_name=draft,
+        enable_assisted_generation=True
+    )).load_model()
+    assert isinstance(assisted, AssistedLLM)
+    assert assisted(PROMPT) == expected
+
+    stats = assisted.assisted_stats.stats()
+    assert stats["calls"] == 1
+    assert stats["generated_tokens"] > 0
+    assert stats["main_forwards"] > 0
+    assert stats["draft_forwards"] > 0
+    assert 0.0 <= stats["acceptance_rate"] <= 1.0
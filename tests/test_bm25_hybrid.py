@@ -0,0 +1,88 @@
+from langchain.schema import Document
+
+from src.components.bm25 import BM25Index, tokenize
+from src.components.hybrid_retriever import HybridRetriever, HybridRetrieverConfig
+
+CHUNKS = [
+    ("c1", "Replace filter F-220 every 500 operating hours.", "manual.pdf", 3),
+    ("c2", "Record the pressure of valve PV-17 after each filter change.", "manual.pdf", 4),
+    ("c3", "The encoder stacks six identical attention layers.", "paper.pdf", 1),
+    ("c4", "Each decoder layer adds attention over the encoder output.", "paper.pdf", 2),
+]
+
+
+def _doc(chunk_id: str, text: str, source: str, page: int) -> Document:
+    return Document(page_content=text, metadata={"chunk_id": chunk_id, "source": source, "page": page})
+
+
+def _index(tmp_path) -> BM25Index:
+    index = BM25Index(str(tmp_path))
+    index.add(_doc(*chunk) for chunk in CHUNKS)
+    return index
+
+
+def test_codes_are_indexed_whole_and_as_parts():
+    assert tokenize("Valve PV-17 (see v2.1)") == ["valve", "pv-17", "pv", "17", "see", "v2.1", "v2", "1"]
+
+
+def test_search_ranks_matching_chunks(tmp_path):
+    index = _index(tmp_path)
+    assert [doc.metadata["chunk_id"] for doc, _ in index.search("PV-17 pressure", k=4)] == ["c2"]
+    hits = index.search("attention encoder", k=4)
+    assert {doc.metadata["chunk_id"] for doc, _ in hits} == {"c3", "c4"}
+    assert hits[0][1] >= hits[1][1] > 0
+
+
+def test_add_is_idempotent_and_delete_removes_postings(tmp_path):
+    index = _index(tmp_path)
+    assert index.add([_doc(*CHUNKS[0])]) == 0
+    assert len(index) == 4
+
+    index.delete(["c2"])
+    assert len(index) == 3
+    assert index.search("PV-17", k=4) == []
+    # Postings persist across reopening
+    assert len(BM25Index(str(tmp_path))) == 3
+
+
+def test_where_filter_and_sources(tmp_path):
+    index = _index(tmp_path)
+    assert index.sources() == ["manual.pdf", "paper.pdf"]
+
+    hits = index.search("filter attention", k=4, where={"source": "paper.pdf"})
+    assert {doc.metadata["chunk_id"] for doc, _ in hits} == {"c3", "c4"}
+    hits = index.search("attention", k=4, where={"$and": [{"source": "paper.pdf"}, {"page": {"$gte": 2}}]})
+    assert [doc.metadata["chunk_id"] for doc, _ in hits] == ["c4"]
+
+
+class FixedStore:
+    """Dense stand-in returning a fixed ranking and recording its search arguments."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = []
+
+    def similarity_search(self, query, k=4, **kwargs):
+        self.calls.append((k, kwargs))
+        return self.docs[:k]
+
+
+def test_reciprocal_rank_fusion(tmp_path):
+    index = _index(tmp_path)
+    # Dense ranks c4 first; keyword search for "valve PV-17" finds only c2
+    store = FixedStore([_doc(*CHUNKS[3]), _doc(*CHUNKS[1]), _doc(*CHUNKS[0])])
+    retriever = HybridRetriever(
+        vectorstore=store,
+        keyword_index=index,
+        k=3,
+        search_kwargs={"k": 3, "filter": {"source": {"$in": ["manual.pdf", "paper.pdf"]}}},
+        fusion_config=HybridRetrieverConfig(fetch_k=3, rrf_k=60)
+    )
+
+    fused = retriever.get_relevant_documents("valve PV-17")
+    # c2 is in both rankings and overtakes c4, which only dense search returned
+    assert [doc.metadata["chunk_id"] for doc in fused] == ["c2", "c4", "c1"]
+    assert fused[0].metadata["rrf_score"] == 1 / 62 + 1 / 61
+    assert fused[1].metadata["rrf_score"] == 1 / 61
+    assert store.calls == [(3, {"filter": {"source": {"$in": ["manual.pdf", "paper.pdf"]}}})]
+    assert set(retriever.last_timings) == {"dense_ms", "keyword_ms", "fusion_ms", "total_ms"}
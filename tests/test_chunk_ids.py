@@ -0,0 +1,74 @@
+from langchain.schema import Document
+
+from src.components.database import assign_chunk_ids, upsert_documents
+from src.components.deduplication import MinHashDeduplicator
+from src.components.vector_store import CompactVectorStore
+
+
+def _chunks(texts, source="manual.pdf"):
+    return [
+        Document(page_content=text, metadata={"source": source, "page": 0, "start_index": 100 * i})
+        for i, text in enumerate(texts)
+    ]
+
+
+def test_chunk_ids_are_deterministic_and_keep_their_slot():
+    first = assign_chunk_ids(_chunks(["alpha", "beta"]))
+    assert first == assign_chunk_ids(_chunks(["alpha", "beta"]))
+
+    changed = assign_chunk_ids(_chunks(["alpha", "gamma"]))
+    assert changed[0] == first[0]
+    assert changed[1] != first[1]
+    assert changed[1].rsplit("-", 1)[0] == first[1].rsplit("-", 1)[0]
+
+
+def test_chunk_ids_fall_back_to_page_ordinals():
+    docs = [Document(page_content=text, metadata={"source": "a.pdf", "page": 2}) for text in ("x", "y")]
+    ids = assign_chunk_ids(docs)
+    assert ":n0-" in ids[0] and ":n1-" in ids[1]
+    assert docs[0].metadata["chunk_id"] == ids[0]
+
+
+def test_upsert_only_embeds_changed_chunks(tmp_path, embeddings):
+    store = CompactVectorStore(str(tmp_path), embeddings, dtype="float16")
+
+    counts = upsert_documents(store, _chunks(["alpha", "beta", "gamma"]))
+    assert counts["added"] == 3 and embeddings.embedded == 3
+
+    counts = upsert_documents(store, _chunks(["alpha", "beta", "gamma"]))
+    assert counts == {"added": 0, "updated": 0, "unchanged": 3, "removed": 0, "duplicates": 0}
+    assert embeddings.embedded == 3
+
+    counts = upsert_documents(store, _chunks(["alpha", "BETA"]))
+    assert counts == {"added": 0, "updated": 1, "unchanged": 1, "removed": 1, "duplicates": 0}
+    assert embeddings.embedded == 4
+    assert sorted(store.get()["documents"]) == ["BETA", "alpha"]
+
+
+def test_upsert_leaves_other_sources_alone(tmp_path, embeddings):
+    store = CompactVectorStore(str(tmp_path), embeddings, dtype="float16")
+    upsert_documents(store, _chunks(["alpha"], source="a.pdf"))
+    upsert_documents(store, _chunks(["beta"], source="b.pdf"))
+    assert len(store.get()["ids"]) == 2
+
+
+def test_dropped_duplicates_are_not_counted_or_hashed_again(tmp_path, embeddings):
+    store = CompactVectorStore(str(tmp_path / "store"), embeddings, dtype="float16")
+    deduplicator = MinHashDeduplicator()
+    hashed = []
+    signature = deduplicator.signature
+    deduplicator.signature = lambda text: hashed.append(text) or signature(text)
+
+    def deduplicate(docs, removed_ids):
+        return deduplicator.deduplicate(str(tmp_path), docs, removed_ids=removed_ids)
+
+    text = "Replace filter F-220 every 500 operating hours and record the pressure of valve PV-17 afterwards."
+    texts = [text, text + " ", "The encoder stacks six identical layers of self-attention and feed-forward networks."]
+
+    counts = upsert_documents(store, _chunks(texts), deduplicate)
+    assert counts == {"added": 2, "updated": 0, "unchanged": 0, "removed": 0, "duplicates": 1}
+    assert embeddings.embedded == 2 and len(hashed) == 3
+
+    counts = upsert_documents(store, _chunks(texts), deduplicate)
+    assert counts == {"added": 0, "updated": 0, "unchanged": 2, "removed": 0, "duplicates": 1}
+    assert embeddings.embedded == 2 and len(hashed) == 3
@@ -0,0 +1,111 @@
+import os
+import sqlite3
+
+from types import SimpleNamespace
+
+from langchain.schema import Document
+
+from src.components import database
+from src.components.bm25 import BM25Index
+from src.components.data_ingestion import DataIngestionConfig
+from src.components.database import DataBase, DataBaseConfig, assign_chunk_ids, rewrite_sources
+from src.components.vector_backends import clone_directory
+from src.components.vector_store import CompactVectorStore
+from src.pipelines import training_pipeline
+from src.pipelines.training_pipeline import Pipeline
+
+
+def _write(path, content: bytes) -> None:
+    with open(path, "wb") as file:
+        file.write(content)
+
+
+def test_clone_links_copies_and_skips(tmp_path):
+    source = tmp_path / "source"
+    (source / "segment").mkdir(parents=True)
+    _write(source / "codes.npy", b"codes")
+    _write(source / "segment" / "data.bin", b"segment")
+    _write(source / "codes.npy.tmp.npy", b"half written")
+    _write(source / "index.sqlite-journal", b"journal")
+    conn = sqlite3.connect(source / "index.sqlite")
+    conn.execute("CREATE TABLE chunks (id TEXT)")
+    conn.execute("INSERT INTO chunks VALUES ('a')")
+    conn.commit()
+
+    target = tmp_path / "target"
+    stats = clone_directory(str(source), str(target), linkable_suffixes=(".npy",))
+
+    assert os.path.samefile(source / "codes.npy", target / "codes.npy")
+    assert (target / "segment" / "data.bin").read_bytes() == b"segment"
+    assert not os.path.samefile(source / "segment" / "data.bin", target / "segment" / "data.bin")
+    assert not (target / "codes.npy.tmp.npy").exists()
+    assert not (target / "index.sqlite-journal").exists()
+    # Read while the source connection is still open
+    assert sqlite3.connect(target / "index.sqlite").execute("SELECT id FROM chunks").fetchall() == [("a",)]
+    conn.close()
+
+    assert stats["linked"] == 1
+    assert stats["copied"] == 2
+    assert stats["copied_bytes"] == len(b"segment") + os.path.getsize(target / "index.sqlite")
+
+
+def test_rewrite_sources_updates_metadata_in_place(tmp_path, embeddings):
+    docs = [
+        Document(page_content=f"chunk {i} about valve PV-{i}", metadata={"source": "src/a.pdf", "page": i})
+        for i in range(3)
+    ] + [Document(page_content="other document", metadata={"source": "src/b.pdf", "page": 0})]
+    ids = assign_chunk_ids(docs)
+    store = CompactVectorStore(str(tmp_path), embeddings)
+    store.add_texts([doc.page_content for doc in docs], [doc.metadata for doc in docs], ids)
+    store.persist()
+    keyword_index = BM25Index(str(tmp_path))
+    keyword_index.add(docs)
+    codes_inode = os.stat(tmp_path / "codes.npy").st_ino
+    embedded = embeddings.embedded
+
+    assert rewrite_sources(store, {"src/a.pdf": "dst/a.pdf", "src/missing.pdf": "dst/missing.pdf"}, keyword_index) == 3
+
+    assert embeddings.embedded == embedded
+    assert store.get()["ids"] == ids
+    assert store.get(where={"source": "dst/a.pdf"})["ids"] == ids[:3]
+    assert store.get(where={"source": "src/b.pdf"})["ids"] == [ids[3]]
+    # Only the docs file was rewritten
+    assert os.stat(tmp_path / "codes.npy").st_ino == codes_inode
+    assert CompactVectorStore.load(str(tmp_path), embeddings).get(where={"source": "dst/a.pdf"})["ids"] == ids[:3]
+
+    assert keyword_index.sources() == ["dst/a.pdf", "src/b.pdf"]
+    hit = keyword_index.search("PV-1", k=1)[0][0]
+    assert hit.metadata == {**docs[1].metadata, "source": "dst/a.pdf"}
+
+
+def test_clone_pipeline_keeps_vector_files_linked(tmp_path, monkeypatch, embeddings):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(database, "DataBaseConfig", lambda: DataBaseConfig(vector_storage="int8"))
+    monkeypatch.setattr(training_pipeline, "pipeline_exists", lambda pipeline_id: pipeline_id == "1")
+    monkeypatch.setattr(
+        training_pipeline, "DataTransformation", lambda: SimpleNamespace(transform_data=lambda: embeddings)
+    )
+    monkeypatch.setattr(Pipeline, "_register_pipeline", lambda self, *args: None)
+
+    document = os.path.join(DataIngestionConfig().base_path, "1", "manual.pdf")
+    os.makedirs(os.path.dirname(document))
+    _write(document, b"%PDF")
+    texts = [
+        "Replace filter F-220 every 500 operating hours.",
+        "Record the pressure of valve PV-17 after each filter change.",
+        "The encoder stacks six identical attention layers.",
+    ]
+    docs = [Document(page_content=text, metadata={"source": document, "page": i}) for i, text in enumerate(texts)]
+    DataBase().create_database(1, docs, embeddings)
+
+    result = Pipeline().clone_pipeline(1, 2)
+
+    assert result["status"] == 1
+    assert result["stats"]["documents"] == 1 and result["stats"]["rewritten_chunks"] == 3
+    source_dir, clone_dir = DataBase().get_persist_dir(1), DataBase().get_persist_dir(2)
+    for name in ("codes.npy", "scales.npy"):
+        assert os.path.samefile(os.path.join(source_dir, name), os.path.join(clone_dir, name))
+    cloned_document = os.path.join(DataIngestionConfig().base_path, "2", "manual.pdf")
+    assert os.path.samefile(document, cloned_document)
+    clone = CompactVectorStore.load(clone_dir, embeddings)
+    assert {metadata["source"] for metadata in clone.get()["metadatas"]} == {cloned_document}
@@ -0,0 +1,77 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from src.components.vector_store import CODES_FILE, RESCORE_FILES, CompactVectorStore
+
+
+def _vectors(count: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    return np.random.RandomState(seed).randn(count, dim).astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_default_layout_is_smaller_than_float32(tmp_path, dtype):
+    vectors = _vectors(2000)
+    store = CompactVectorStore(str(tmp_path), None, dtype)
+    store.add_embeddings([f"t{i}" for i in range(len(vectors))], vectors)
+    store.persist()
+
+    vector_files = [CODES_FILE, "scales.npy", *RESCORE_FILES.values()]
+    vector_bytes = sum(
+        os.path.getsize(tmp_path / name) for name in vector_files if os.path.exists(tmp_path / name)
+    )
+    assert vector_bytes < vectors.nbytes * 0.8
+    assert os.path.exists(tmp_path / RESCORE_FILES["float16"]) == (dtype == "int8")
+
+    reloaded = CompactVectorStore.load(str(tmp_path), None)
+    for row in (0, 777, 1999):
+        doc, score = reloaded.similarity_search_by_vector_with_score(vectors[row].tolist(), k=1)[0]
+        assert doc.page_content == f"t{row}" and score > 0.999
+
+
+def test_appends_past_capacity_keep_rows_aligned(tmp_path):
+    vectors = _vectors(2500)
+    store = CompactVectorStore(str(tmp_path), None)
+    for start in range(0, 2500, 700):
+        rows = list(range(start, min(start + 700, 2500)))
+        store.add_embeddings([f"t{i}" for i in rows], vectors[rows], ids=[f"id{i}" for i in rows])
+    store.persist()
+    store.add_embeddings(["last"], _vectors(1, seed=1), ids=["last"])
+
+    assert len(store) == 2501
+    for row in (0, 1400, 2499):
+        doc = store.similarity_search_by_vector(vectors[row].tolist(), k=1)[0]
+        assert doc.page_content == f"t{row}"
+    stored = store.get(ids=["id0", "id2499"], include=["embeddings"])
+    expected = vectors[[0, 2499]] / np.linalg.norm(vectors[[0, 2499]], axis=1, keepdims=True)
+    assert np.allclose(stored["embeddings"], expected, atol=1e-2)
+
+
+def test_searches_during_appends_see_consistent_rows(tmp_path):
+    vectors = _vectors(3000)
+    store = CompactVectorStore(str(tmp_path), None)
+    store.add_embeddings(["t0"], vectors[:1], ids=["id0"])
+    errors = []
+
+    def search():
+        try:
+            for row in range(0, 3000, 7):
+                for doc, _ in store.similarity_search_by_vector_with_score(vectors[row].tolist(), k=3):
+                    assert doc.page_content.startswith("t")
+                # A stored row always comes back as its own text
+                doc = store.similarity_search_by_vector(vectors[0].tolist(), k=1)[0]
+                assert doc.page_content == "t0"
+        except Exception as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=search)
+    reader.start()
+    for start in range(1, 3000, 50):
+        rows = list(range(start, min(start + 50, 3000)))
+        store.add_embeddings([f"t{i}" for i in rows], vectors[rows], ids=[f"id{i}" for i in rows])
+    reader.join()
+
+    assert errors == []
+    assert len(store) == 3000
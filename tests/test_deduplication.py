@@ -0,0 +1,38 @@
+from langchain.schema import Document
+
+from src.components.deduplication import MinHashDeduplicator
+
+TEXT = (
+    "The encoder is composed of a stack of six identical layers. Each layer has two sub-layers: "
+    "a multi-head self-attention mechanism and a simple position-wise fully connected feed-forward network."
+)
+OTHER = "Replace filter F-220 every 500 operating hours and record the pressure reading of valve PV-17 afterwards."
+
+
+def _doc(text: str, chunk_id: str) -> Document:
+    return Document(page_content=text, metadata={"chunk_id": chunk_id})
+
+
+def test_near_duplicates_are_dropped_within_and_across_calls(tmp_path):
+    deduplicator = MinHashDeduplicator()
+    kept = deduplicator.deduplicate(
+        str(tmp_path), [_doc(TEXT, "a"), _doc(TEXT + " ", "b"), _doc(OTHER, "c")], reset=True
+    )
+    assert [doc.metadata["chunk_id"] for doc in kept] == ["a", "c"]
+
+    # A later batch is checked against the persisted band index
+    assert MinHashDeduplicator().deduplicate(str(tmp_path), [_doc(TEXT, "d")]) == []
+
+
+def test_removed_chunks_stop_matching(tmp_path):
+    deduplicator = MinHashDeduplicator()
+    deduplicator.deduplicate(str(tmp_path), [_doc(TEXT, "a")], reset=True)
+
+    kept = deduplicator.deduplicate(str(tmp_path), [_doc(TEXT, "b")], removed_ids=["a"])
+    assert [doc.metadata["chunk_id"] for doc in kept] == ["b"]
+
+
+def test_reset_forgets_stored_signatures(tmp_path):
+    deduplicator = MinHashDeduplicator()
+    deduplicator.deduplicate(str(tmp_path), [_doc(TEXT, "a")], reset=True)
+    assert len(deduplicator.deduplicate(str(tmp_path), [_doc(TEXT, "a")], reset=True)) == 1
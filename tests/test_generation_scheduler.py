@@ -0,0 +1,70 @@
+import threading
+from types import SimpleNamespace
+
+import torch
+
+from src.components.rag_model import BatchedLLM, GenerationScheduler, stream_generate
+
+
+class FakeTokenizer:
+    pad_token = None
+    eos_token = "<eos>"
+    padding_side = "right"
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(ord("a") + i) for i in ids)
+
+
+class FakePipe:
+    """Answers every prompt with "abc", one token per step, recording batch sizes."""
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.batch_sizes = []
+        self.release = threading.Event()
+
+    def __call__(self, prompts, batch_size=1, return_full_text=False, streamer=None):
+        self.release.wait(timeout=5)
+        self.batch_sizes.append(len(prompts))
+        if streamer is not None:
+            streamer.put(torch.zeros((len(prompts), 4), dtype=torch.long))
+            for token in range(3):
+                streamer.put(torch.full((len(prompts),), token, dtype=torch.long))
+            streamer.end()
+        return [[{"generated_text": f"{prompt}:abc"}] for prompt in prompts]
+
+
+def _scheduler(max_batch_size=4, max_wait_ms=200.0):
+    pipe = FakePipe()
+    return pipe, GenerationScheduler(SimpleNamespace(pipeline=pipe), max_batch_size, max_wait_ms)
+
+
+def test_concurrent_requests_are_batched():
+    pipe, scheduler = _scheduler()
+    try:
+        futures = [scheduler.submit(f"q{i}") for i in range(4)]
+        pipe.release.set()
+        assert [future.result(timeout=5) for future in futures] == [f"q{i}:abc" for i in range(4)]
+        assert pipe.batch_sizes == [4]
+        assert scheduler.stats()["batches"] == 1
+        assert scheduler.stats()["avg_batch_size"] == 4
+    finally:
+        scheduler.close()
+
+
+def test_streamed_requests_share_a_batch_with_plain_ones():
+    pipe, scheduler = _scheduler()
+    try:
+        llm = BatchedLLM(scheduler=scheduler, pipeline=pipe)
+        plain = scheduler.submit("plain")
+        streamed = []
+        consumer = threading.Thread(target=lambda: streamed.extend(stream_generate(llm, "streamed")))
+        consumer.start()
+        pipe.release.set()
+        consumer.join(timeout=5)
+
+        assert plain.result(timeout=5) == "plain:abc"
+        assert streamed == ["a", "b", "c"]
+        assert pipe.batch_sizes == [2]
+    finally:
+        scheduler.close()
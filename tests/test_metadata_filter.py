@@ -0,0 +1,106 @@
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+from src.components.database import metadata_filter
+from src.components.numpy_vector_store import NumpyVectorStore, where_to_sql
+from src.components.vector_store import CompactVectorStore, matches_where
+
+METADATAS = [
+    {"source": "data/manual.pdf", "page": 0, "lang": "en"},
+    {"source": "data/manual.pdf", "page": 4, "lang": "de"},
+    {"source": "data/paper.pdf", "page": 2, "lang": "en"},
+    {"source": "data/paper.pdf", "page": 7, "lang": "en"},
+    {"page": 1},
+]
+
+WHERES = [
+    {"source": "data/manual.pdf"},
+    {"source": {"$in": ["data/paper.pdf", "missing.pdf"]}},
+    {"source": {"$nin": ["data/paper.pdf"]}},
+    {"page": {"$gte": 2}},
+    {"$and": [{"source": "data/paper.pdf"}, {"page": {"$lte": 2}}]},
+    {"$or": [{"lang": "de"}, {"page": {"$gt": 6}}]},
+    {"source": {"$ne": "data/manual.pdf"}, "lang": "en"},
+]
+
+
+def _sql_matches(where):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE docs (row INTEGER, source TEXT, page INTEGER, metadata TEXT)")
+    conn.executemany(
+        "INSERT INTO docs VALUES (?, ?, ?, json(?))",
+        [(row, m.get("source"), m.get("page"), json.dumps(m)) for row, m in enumerate(METADATAS)]
+    )
+    condition, params = where_to_sql(where)
+    return [row[0] for row in conn.execute(f"SELECT row FROM docs WHERE {condition} ORDER BY row", params)]
+
+
+@pytest.mark.parametrize("where", WHERES)
+def test_sql_and_python_filters_agree(where):
+    expected = [row for row, metadata in enumerate(METADATAS) if matches_where(metadata, where)]
+    assert expected
+    assert _sql_matches(where) == expected
+
+
+def test_chunks_without_the_key_match_no_comparison():
+    assert not matches_where({"page": 1}, {"source": {"$ne": "data/manual.pdf"}})
+    assert not matches_where({"page": 1}, {"source": {"$nin": ["data/manual.pdf"]}})
+
+
+def test_unsupported_filters_are_rejected():
+    with pytest.raises(ValueError):
+        where_to_sql({"page": {"$like": 1}})
+    with pytest.raises(ValueError):
+        where_to_sql({"page; DROP TABLE docs": 1})
+    with pytest.raises(ValueError):
+        matches_where({"page": 1}, {"page": {"$like": 1}})
+
+
+def test_metadata_filter_resolves_names_and_pages():
+    known = ["data/manual.pdf", "data/paper.pdf"]
+    assert metadata_filter() is None
+    assert metadata_filter(["Manual.PDF"], known_sources=known) == {"source": "data/manual.pdf"}
+    assert metadata_filter(["paper.pdf", "data/manual.pdf"], (2, None), known) == {
+        "$and": [{"source": {"$in": ["data/paper.pdf", "data/manual.pdf"]}}, {"page": {"$gte": 1}}]
+    }
+    assert metadata_filter(pages=(None, 3)) == {"page": {"$lte": 2}}
+
+
+@pytest.fixture(params=["compact", "numpy"])
+def store(request, tmp_path, embeddings):
+    vectors = np.random.RandomState(0).randn(len(METADATAS), embeddings.dim)
+    texts = [f"chunk {row}" for row in range(len(METADATAS))]
+    ids = [f"id{row}" for row in range(len(METADATAS))]
+    if request.param == "compact":
+        store = CompactVectorStore(str(tmp_path), embeddings)
+    else:
+        store = NumpyVectorStore(str(tmp_path), embeddings)
+    store.add_embeddings(texts, vectors, METADATAS, ids)
+    return store, vectors
+
+
+@pytest.mark.parametrize("where", WHERES)
+def test_filtered_search_only_returns_matching_chunks(store, where):
+    store, vectors = store
+    expected = {f"chunk {row}" for row, metadata in enumerate(METADATAS) if matches_where(metadata, where)}
+    found = store.similarity_search_by_vector(vectors[3].tolist(), k=10, filter=where)
+    assert {doc.page_content for doc in found} == expected
+
+
+def test_compact_index_follows_deletes_and_reloads(tmp_path, embeddings):
+    vectors = np.random.RandomState(0).randn(len(METADATAS), embeddings.dim)
+    store = CompactVectorStore(str(tmp_path), embeddings)
+    store.add_embeddings([f"chunk {row}" for row in range(5)], vectors, METADATAS, [f"id{row}" for row in range(5)])
+    store.delete(["id0", "id2"])
+    where = {"source": {"$in": ["data/manual.pdf", "data/paper.pdf"]}}
+
+    assert store.get(where=where)["ids"] == ["id1", "id3"]
+    found = store.similarity_search_by_vector(vectors[3].tolist(), k=10, filter={"source": "data/paper.pdf"})
+    assert [doc.page_content for doc in found] == ["chunk 3"]
+
+    store.persist()
+    reloaded = CompactVectorStore.load(str(tmp_path), embeddings)
+    assert reloaded.get(where=where)["ids"] == ["id1", "id3"]
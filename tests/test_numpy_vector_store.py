@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.components.numpy_vector_store import META_FILE, NumpyVectorStore
+from src.exception import CustomException
+
+
+def _vectors(count: int, dim: int = 8, seed: int = 0) -> np.ndarray:
+    vectors = np.random.RandomState(seed).randn(count, dim).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_appends_grow_the_file_and_keep_every_row(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), None)
+    vectors = _vectors(2500)
+    for start in range(0, 2500, 600):
+        batch = range(start, min(start + 600, 2500))
+        store.add_embeddings([f"t{i}" for i in batch], vectors[list(batch)], ids=[f"id{i}" for i in batch])
+
+    assert len(store) == 2500
+    assert np.load(tmp_path / "vectors.npy", mmap_mode="r").shape[0] >= 2500
+    stored = store.get(ids=["id0", "id1234", "id2499"], include=["embeddings"])
+    assert np.allclose(stored["embeddings"], vectors[[0, 1234, 2499]], atol=1e-6)
+
+    reopened = NumpyVectorStore(str(tmp_path), None)
+    doc, score = reopened.similarity_search_by_vector_with_score(vectors[1234].tolist(), k=1)[0]
+    assert doc.page_content == "t1234" and score > 0.999
+
+
+def test_ivf_on_a_tiny_store(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), None, ivf_min_vectors=0, nprobe=2)
+    vectors = _vectors(5)
+    store.add_embeddings([f"t{i}" for i in range(5)], vectors)
+    store.persist()
+
+    assert (tmp_path / "ivf_centroids.npy").exists()
+    assert store.similarity_search_by_vector(vectors[3].tolist(), k=1)[0].page_content == "t3"
+
+
+def test_delete_then_append(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), None)
+    vectors = _vectors(4)
+    store.add_embeddings(["a", "b", "c"], vectors[:3], ids=["a", "b", "c"])
+    store.delete(ids=["b"])
+    store.add_embeddings(["d"], vectors[3:], ids=["d"])
+
+    stored = store.get(include=["embeddings"])
+    assert stored["ids"] == ["a", "c", "d"]
+    assert np.allclose(stored["embeddings"], vectors[[0, 2, 3]], atol=1e-6)
+
+
+def test_delete_publishes_a_new_vector_file_and_close_reopens(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), None)
+    vectors = _vectors(3)
+    store.add_embeddings(["a", "b", "c"], vectors, ids=["a", "b", "c"])
+    store.delete(ids=["b"])
+
+    vectors_file = json.loads((tmp_path / META_FILE).read_text())["vectors_file"]
+    assert vectors_file != "vectors.npy"
+    assert sorted(path.name for path in tmp_path.glob("vectors*")) == [vectors_file]
+
+    store.close()
+    assert store.similarity_search_by_vector(vectors[2].tolist(), k=1)[0].page_content == "c"
+    assert store.get()["ids"] == ["a", "c"]
+
+
+def test_interrupted_delete_is_finished_by_the_next_writer(tmp_path, monkeypatch):
+    store = NumpyVectorStore(str(tmp_path), None)
+    vectors = _vectors(4)
+    store.add_embeddings(["a", "b", "c"], vectors[:3], ids=["a", "b", "c"])
+
+    def crash(self, name, count):
+        raise RuntimeError("killed before the meta file was written")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(NumpyVectorStore, "_publish_vectors", crash)
+        with pytest.raises(CustomException):
+            store.delete(ids=["b"])
+
+    reopened = NumpyVectorStore(str(tmp_path), None)
+    reopened.add_embeddings(["d"], vectors[3:], ids=["d"])
+
+    stored = reopened.get(include=["embeddings"])
+    assert stored["ids"] == ["a", "c", "d"]
+    assert np.allclose(stored["embeddings"], vectors[[0, 2, 3]], atol=1e-6)
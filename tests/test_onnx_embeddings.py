@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+from sentence_transformers import SentenceTransformer
+
+from src.components.onnx_embeddings import DEFAULT_TOLERANCE, OnnxEmbeddings
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+SENTENCES = [
+    "Multi-head attention lets the model attend to information from different subspaces.",
+    "Positional encodings inject information about the order of the tokens.",
+    "Replace filter F-220 every 500 operating hours.",
+    "The training pipeline splits each PDF into overlapping chunks.",
+    "short",
+    "Residual dropout is applied to the output of each sub-layer before it is added to the input. " * 8,
+]
+
+
+@pytest.fixture(scope="module")
+def reference():
+    model = SentenceTransformer(MODEL_NAME, device="cpu")
+    return model.encode(SENTENCES, normalize_embeddings=True)
+
+
+@pytest.mark.parametrize("quantize", [False, True], ids=["fp32", "int8"])
+def test_onnx_embeddings_match_sentence_transformers(reference, tmp_path, quantize):
+    embeddings = OnnxEmbeddings(MODEL_NAME, str(tmp_path), quantize=quantize, normalize=True)
+    vectors = np.array(embeddings.embed_documents(SENTENCES))
+
+    assert vectors.shape == reference.shape
+    cosines = np.sum(vectors * reference, axis=1)
+    assert cosines.min() >= 1 - DEFAULT_TOLERANCE[embeddings.precision]
+    assert np.array(embeddings.embed_query(SENTENCES[0])) == pytest.approx(vectors[0], abs=1e-5)
+
+
+def test_concurrent_encodes_match_serial(tmp_path):
+    embeddings = OnnxEmbeddings(MODEL_NAME, str(tmp_path), quantize=False, batch_size=2)
+    serial = [embeddings.embed_documents(SENTENCES[i:] + SENTENCES[:i]) for i in range(len(SENTENCES))]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        concurrent = list(pool.map(
+            lambda i: embeddings.embed_documents(SENTENCES[i:] + SENTENCES[:i]), range(len(SENTENCES))
+        ))
+
+    assert np.allclose(concurrent, serial, atol=1e-6)
@@ -0,0 +1,30 @@
+import pytest
+
+from src.components.rag_model import ModelConfig, PrefixCachedLLM, RagModel, model_registry, stream_generate
+from tests.test_assisted_generation import _save_checkpoint
+
+PREFIX = "the transformer uses attention and the encoder"
+PROMPT = PREFIX + " layer of the decoder is"
+
+
+@pytest.fixture
+def prefix_llm(tmp_path):
+    checkpoint = _save_checkpoint(tmp_path / "model", n_layer=2, seed=0)
+    llm = RagModel(ModelConfig(
+        model_name=checkpoint, max_new_tokens=6, cache_dir=str(tmp_path / "cache"), enable_prefix_cache=True
+    )).load_model()
+    llm.prefix_cache.register(PREFIX)
+    yield llm
+    model_registry.clear()
+
+
+def test_stream_generate_uses_the_prefix_cache(prefix_llm):
+    assert isinstance(prefix_llm, PrefixCachedLLM)
+    expected = prefix_llm(PROMPT)
+    hits = prefix_llm.prefix_cache.stats()["hits"]
+
+    streamed = "".join(stream_generate(prefix_llm, PROMPT))
+
+    assert streamed.strip() == expected.strip()
+    assert len(streamed.split()) <= 6
+    assert prefix_llm.prefix_cache.stats()["hits"] == hits + 1